@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+
+from config import Config
+from database import Database
+from services.snapshots import SnapshotManager
+from storage import get_backend
+
+# Резервные копии рабочей БД SQLite.
+# backup - снять копию (бот может работать), list - список копий,
+# restore FILE - восстановить базу из копии (бот должен быть остановлен).
+
+
+def restore(manager: SnapshotManager, snapshot: str):
+    """Перезаписывает рабочую БД копией; текущее состояние сначала тоже копируется"""
+    safety = manager.take()
+    if safety is None:
+        print("❌ Не удалось сохранить текущее состояние базы, восстановление отменено")
+        sys.exit(1)
+    print(f"💾 Текущее состояние сохранено в {safety}")
+
+    get_backend(snapshot).backup(manager.db.backend.path)
+    print(f"✅ База восстановлена из {snapshot}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Резервные копии базы SQLite")
+    parser.add_argument('--database', default=Config.DATABASE_URL, help="файл рабочей БД")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('backup', help="снять копию сейчас")
+    subparsers.add_parser('list', help="показать копии")
+    restore_parser = subparsers.add_parser('restore', help="восстановить базу из копии (бот должен быть остановлен)")
+    restore_parser.add_argument('file', help="файл копии")
+    args = parser.parse_args()
+
+    manager = SnapshotManager(Database(args.database))
+    if not manager.enabled:
+        print(f"❌ Копии поддерживаются только для SQLite, а не для {manager.db.backend.name}")
+        sys.exit(2)
+
+    if args.command == 'backup':
+        path = manager.take()
+        if path is None:
+            sys.exit(1)
+        print(f"✅ {path} ({manager.last_duration:.1f} сек)")
+    elif args.command == 'list':
+        for path in manager.snapshots():
+            print(f"{path}\t{os.path.getsize(path) // 1024} КБ")
+    else:
+        if not os.path.exists(args.file):
+            print(f"❌ Файл {args.file} не найден")
+            sys.exit(1)
+        restore(manager, args.file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from database import Database
+from services.matcher import MatchMaker
+
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск', 'Екатеринбург']
+INTERESTS = [f'интерес{i}' for i in range(60)]
+GOALS = ['новые знакомства', 'бизнес-контакты', 'друзья', 'менторство', 'нетворкинг', 'коллаборации']
+
+
+def generate_users(count: int, seed: int = 42) -> list:
+    """Синтетические профили для замеров"""
+    rng = random.Random(seed)
+    return [
+        {
+            'user_id': user_id,
+            'name': f'User {user_id}',
+            'age': rng.randint(20, 50),
+            'city': rng.choice(CITIES),
+            'interests': ', '.join(rng.sample(INTERESTS, rng.randint(2, 6))),
+            'goals': ', '.join(rng.sample(GOALS, rng.randint(1, 3))),
+        }
+        for user_id in range(1, count + 1)
+    ]
+
+
+def measure_recall(match_maker: MatchMaker, users: list, k: int, sample: int) -> dict:
+    """Recall@k приближенного поиска относительно точного calculate_match_score"""
+    started = time.perf_counter()
+    index = match_maker.build_lsh_index(users)
+    index_time = time.perf_counter() - started
+
+    users_by_id = {u['user_id']: u for u in users}
+    probes = random.Random(0).sample(users, min(sample, len(users)))
+
+    exact_time = approx_time = 0.0
+    hits = total = 0
+    for user in probes:
+        started = time.perf_counter()
+        scored = [
+            (other['user_id'], match_maker.calculate_match_score(user, other)[0])
+            for other in users if other['user_id'] != user['user_id']
+        ]
+        scored.sort(key=lambda x: x[1], reverse=True)
+        # Все пользователи с баллом не ниже k-го считаются верным ответом
+        threshold = scored[k - 1][1]
+        exact = {user_id for user_id, score in scored if score >= threshold}
+        exact_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        approximate = match_maker.find_approximate_matches(user, users_by_id, index, set(), max_matches=k)
+        approx_time += time.perf_counter() - started
+
+        hits += sum(1 for partner, _, _ in approximate if partner['user_id'] in exact)
+        total += k
+
+    return {
+        'recall': hits / total if total else 0.0,
+        'index_time': index_time,
+        'exact_ms': exact_time / len(probes) * 1000,
+        'approx_ms': approx_time / len(probes) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение точного и LSH-поиска кандидатов")
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--sample', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        match_maker = MatchMaker(Database(os.path.join(tmp_dir, 'benchmark.db')))
+        users = generate_users(args.users)
+        result = measure_recall(match_maker, users, args.k, args.sample)
+
+    print(f"Пользователей: {args.users}, k={args.k}, выборка: {args.sample}")
+    print(f"Построение индекса: {result['index_time']:.2f} с")
+    print(f"Точный поиск: {result['exact_ms']:.2f} мс на пользователя")
+    print(f"LSH поиск: {result['approx_ms']:.2f} мс на пользователя")
+    print(f"Recall@{args.k}: {result['recall']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+
+from config import Config
+from database import Database
+from services.matcher import MatchMaker
+
+# Набор проверок, который должен одинаково проходить на любом бэкенде хранилища.
+# Запуск: python check_storage.py [postgresql://.../пустая_база]; без адреса - временный файл SQLite.
+
+PROFILES = {
+    101: {'name': 'Иван Петров', 'city': 'Москва', 'profession': 'Разработчик', 'age': 30,
+          'interests': 'python, стартапы, бег', 'goals': 'новые знакомства'},
+    102: {'name': 'Мария', 'city': 'москва ', 'profession': 'Дизайнер', 'age': 28,
+          'interests': 'дизайн, стартапы, бег', 'goals': 'новые знакомства'},
+    103: {'name': 'Олег', 'city': 'Казань', 'profession': 'Маркетолог', 'age': 35,
+          'interests': 'маркетинг, python', 'goals': 'бизнес-контакты'},
+    104: {'name': 'Анна', 'city': 'Казань', 'profession': 'Аналитик', 'age': 26,
+          'interests': 'данные, python, бег', 'goals': 'бизнес-контакты'},
+}
+
+
+def fill_users(db: Database):
+    for user_id, profile in PROFILES.items():
+        assert db.add_user(user_id, f"user{user_id}")
+        assert db.update_user_profile(user_id, **profile)
+
+
+def check_users(db: Database):
+    user = db.get_user(101)
+    assert user['name'] == 'Иван Петров' and user['profile_completed']
+    assert db.get_user(999) is None
+    assert db.count_active_users() == len(PROFILES)
+    # Поиск в админке не зависит от регистра, в том числе для кириллицы
+    assert db.count_active_users('иван') == 1
+    page = db.get_active_users_page(limit=3)
+    assert [u['user_id'] for u in page['items']] == [101, 102, 103] and page['has_next']
+    page = db.get_active_users_page(after_id=103, limit=3)
+    assert [u['user_id'] for u in page['items']] == [104] and not page['has_next']
+    page = db.get_active_users_page(before_id=104, limit=2)
+    assert [u['user_id'] for u in page['items']] == [102, 103] and page['has_prev']
+    assert db.count_segment('city', 'Москва') == 2
+
+
+def check_search(db: Database):
+    assert [u['user_id'] for u in db.search_users('ив моск')] == [101]
+    assert {u['user_id'] for u in db.search_users('казань')} == {103, 104}
+    assert db.search_users('!!!') == []
+    # Индекс следует за изменением профиля
+    db.update_user_profile(103, name='Олег Смирнов')
+    assert [u['user_id'] for u in db.search_users('смирн')] == [103]
+
+
+def check_matches(db: Database):
+    assert db.create_match(101, 102, 80, ['стартапы', 'бег'])
+    assert not db.create_match(102, 101, 80, ['стартапы', 'бег'])
+    assert db.have_met(102, 101) and (101, 102) in db.get_match_pairs()
+    inbox = db.get_match_inbox(101)
+    assert len(inbox) == 1 and inbox[0]['partner']['name'] == 'Мария' and not inbox[0]['is_forced']
+    assert db.get_users_with_pending_matches() == {101, 102}
+    match_id = inbox[0]['match_id']
+
+    first = db.update_match_acceptance(match_id, 101, True)
+    assert first and not first['both_accepted']
+    second = db.update_match_acceptance(match_id, 102, True)
+    assert second and second['both_accepted'] and second['status'] == 'accepted'
+    assert db.update_match_acceptance(match_id, 102, True) is None
+    assert db.get_match_inbox(101) == []
+
+    assert db.set_match_success(match_id, True)
+    assert not db.set_match_success(match_id, False)
+    user = db.get_user(101)
+    assert (user['matches_count'], user['matches_accepted'], user['matches_successful']) == (1, 1, 1)
+    assert db.get_user_stats()['successful_matches'] == 1
+    assert db.get_match(match_id)['user2_name'] == 'Мария'
+
+
+def check_rejection(db: Database):
+    assert db.create_match(103, 104, 60, ['python'], is_forced=True)
+    match_id = db.get_match_inbox(104)[0]['match_id']
+    assert db.update_match_status(match_id, 'rejected', 104)
+    assert not db.update_match_status(match_id, 'accepted')
+    user = db.get_user(104)
+    assert user['matches_rejected'] == 1 and user['fatigue_score'] > 0
+    fatigue = {u.user_id: u.fatigue for u in db.get_matching_snapshot()}
+    assert fatigue[104] > fatigue[101] > 0
+
+
+def check_deactivation(db: Database):
+    assert db.create_match(102, 103, 50, [])
+    assert db.get_pending_matches_page()['items']
+    assert db.deactivate_user(103) == 1
+    assert db.count_pending_matches() == 0 and db.get_match_inbox(102) == []
+    assert db.record_delivery_failure(102, unreachable=False) is None
+    assert db.get_user(102)['delivery_failures'] == 1
+    assert db.record_delivery_success([101, 102]) and db.record_delivery_success([])
+    assert db.get_user(102)['delivery_failures'] == 0
+    assert db.set_user_active(103, True)
+
+
+def check_matching_round(db: Database):
+    db.cleanup_matches()
+    match_maker = MatchMaker(db)
+    created = match_maker.run_matching_round(force_all=True)
+    assert created >= 1 and db.count_pending_matches() == created
+    assert match_maker.run_incremental_round() >= 0
+
+
+def check_broadcasts(db: Database):
+    broadcast_id = db.create_broadcast('Привет', 'city', 'казань', created_by=101)
+    broadcast = db.get_broadcast(broadcast_id)
+    assert broadcast['total'] == 2 and broadcast['status'] == 'running'
+    assert db.get_broadcast_recipients(broadcast) == [103, 104]
+    assert db.advance_broadcast(broadcast_id, 103, 'sent')
+    broadcast = db.get_broadcast(broadcast_id)
+    assert db.get_broadcast_recipients(broadcast) == [104] and broadcast['sent'] == 1
+    assert [b['id'] for b in db.get_running_broadcasts()] == [broadcast_id]
+    assert db.set_broadcast_status(broadcast_id, 'finished')
+    assert not db.set_broadcast_status(broadcast_id, 'cancelled')
+
+
+def check_activity_and_log(db: Database):
+    moment = datetime.datetime(2030, 1, 1).isoformat()
+    assert db.update_last_active({101: moment, 102: moment})
+    assert db.get_user(102)['last_active'] == moment
+    for _ in range(3):
+        db.log_user_action(101, 'check', 102)
+    assert db.action_log.flush() >= 3
+
+
+def check_scheduled(db: Database):
+    first = db.create_scheduled_match('2030-01-01T10:00:00')
+    second = db.create_scheduled_match('2030-01-08T10:00:00')
+    assert second > first > 0
+    assert db.update_scheduled_match_status(first, 'completed')
+    assert [m['id'] for m in db.get_scheduled_matches()] == [second, first]
+
+
+def check_archive(db: Database):
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    old = (datetime.datetime.now() - datetime.timedelta(days=400)).isoformat()
+    cursor.execute("UPDATE matches SET status = 'rejected', created_date = ?", (old,))
+    cursor.execute("UPDATE user_actions SET action_date = ?", (old,))
+    conn.commit()
+    conn.close()
+
+    result = db.archive_old_data()
+    assert result['matches_archived'] >= 1 and result['actions_archived'] >= 3
+    assert db.archive_old_data()['matches_archived'] == 0
+    # История пар остается: повторные пары по-прежнему исключены
+    assert db.get_match_pairs()
+
+
+def check_pools(db: Database):
+    assert db.set_user_pool(104, 'other')
+    assert [u.user_id for u in db.get_matching_snapshot('other')] == [104]
+    assert 104 not in {u.user_id for u in db.get_matching_snapshot(Config.DEFAULT_POOL)}
+    assert db.get_pool_sizes()['other'] == 1
+    assert not MatchMaker(db).create_specific_match(101, 104)
+    assert db.set_user_pool(104, Config.DEFAULT_POOL)
+
+
+def check_maintenance(db: Database):
+    report = db.run_maintenance()
+    assert report and report['integrity'] in ('ok', 'n/a') and report['size_after'] > 0
+    assert db.get_last_maintenance()['run_date'] == report['run_date']
+
+
+CHECKS = [
+    check_users, check_search, check_matches, check_rejection, check_deactivation,
+    check_matching_round, check_broadcasts, check_activity_and_log, check_scheduled, check_archive,
+    check_pools, check_maintenance,
+]
+
+
+def run_checks(db: Database) -> int:
+    fill_users(db)
+    failed = 0
+    for check in CHECKS:
+        try:
+            check(db)
+            print(f"✅ {check.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {check.__name__}: {e!r}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка бэкенда хранилища на пустой базе")
+    parser.add_argument('url', nargs='?', help="postgresql://... (по умолчанию временный файл SQLite)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Архив SQLite тоже во временном каталоге
+        Config.ARCHIVE_DB_PATH = os.path.join(tmp_dir, 'archive.db')
+
+        db = Database(args.url or os.path.join(tmp_dir, 'check.db'))
+        if db.get_user_stats().get('total_users'):
+            print("База не пустая: проверки нужно запускать на отдельной базе")
+            sys.exit(2)
+
+        print(f"Бэкенд: {db.backend.name}")
+        failed = run_checks(db)
+        db.backend.shutdown()
+
+    print("Все проверки пройдены" if not failed else f"Не пройдено проверок: {failed}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
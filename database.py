@@ -1,26 +1,74 @@
-import sqlite3
 import datetime
 import logging
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional
 import json
+import re
+
+from config import Config
+from services.action_log import ActionLogWriter
+from services.snapshot import MatchingSnapshot, UserRecord
+from utils.proposals import render_match_proposal
+from storage import get_backend
+from storage.base import dict_row, query_metrics
 
 logger = logging.getLogger(__name__)
 
+
 class Database:
-    def __init__(self, db_path: str = "random_coffee.db"):
-        self.db_path = db_path
-        self.init_db()
+    def __init__(self, db_path: str = None, read_only: bool = False):
+        # Путь к файлу SQLite или postgresql://... (см. storage)
+        self.db_path = db_path or Config.DATABASE_URL
+        self.backend = get_backend(self.db_path)
+        # Снимок только для чтения: схему не трогаем, журнал действий не пишем
+        self.action_log = None
+        if not read_only:
+            self.init_db()
+            self.action_log = ActionLogWriter.for_database(self.db_path, self.write_user_actions)
     
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """Соединение текущего потока: открывается один раз, кэширует подготовленные запросы"""
+        conn = self.backend.connection()
+        if conn.in_transaction:
+            # Предыдущий вызов упал, не дойдя до commit/close
+            conn.rollback()
+        return conn
+
+    def close(self):
+        """Закрывает соединение текущего потока"""
+        self.backend.close_connection()
+
+    def _fetch_all(self, sql: str, params=()) -> List[dict]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = dict_row
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def _fetch_one(self, sql: str, params=()) -> Optional[dict]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = dict_row
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        conn.close()
+        return row
+
+    def query_stats(self, limit: int = 5) -> dict:
+        """Метрики запросов процесса: итоги и самые дорогие запросы"""
+        return {**query_metrics.totals(), 'top': query_metrics.top(limit)}
     
     def init_db(self):
         """Инициализация всех таблиц"""
         conn = self.get_connection()
         cursor = conn.cursor()
+        # Схема описана в синтаксисе SQLite, бэкенд переводит ее на свой диалект
+        ddl = self.backend.adapt_ddl
+        self.backend.prepare(cursor)
         
         # Таблица пользователей
-        cursor.execute('''
+        cursor.execute(ddl('''
             CREATE TABLE IF NOT EXISTS users (
                 user_id INTEGER PRIMARY KEY,
                 username TEXT,
@@ -37,22 +85,30 @@ class Database:
                 last_active TEXT,
                 is_active BOOLEAN DEFAULT TRUE,
                 matches_count INTEGER DEFAULT 0,
-                profile_completed BOOLEAN DEFAULT FALSE
+                profile_completed BOOLEAN DEFAULT FALSE,
+                candidates_stale BOOLEAN DEFAULT TRUE,
+                matches_accepted INTEGER DEFAULT 0,
+                matches_rejected INTEGER DEFAULT 0,
+                matches_successful INTEGER DEFAULT 0,
+                last_matched_date TEXT,
+                fatigue_score REAL DEFAULT 0,
+                fatigue_updated TEXT,
+                delivery_failures INTEGER DEFAULT 0
             )
-        ''')
+        '''))
         
         # Таблица вопросов анкеты
-        cursor.execute('''
+        cursor.execute(ddl('''
             CREATE TABLE IF NOT EXISTS questions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 question_text TEXT,
                 question_order INTEGER,
                 is_active BOOLEAN DEFAULT TRUE
             )
-        ''')
+        '''))
         
         # Таблица мэтчей
-        cursor.execute('''
+        cursor.execute(ddl('''
             CREATE TABLE IF NOT EXISTS matches (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user1_id INTEGER,
@@ -67,13 +123,14 @@ class Database:
                 user2_accepted BOOLEAN DEFAULT FALSE,
                 chat_created BOOLEAN DEFAULT FALSE,
                 match_successful BOOLEAN DEFAULT NULL,
+                rejected_by INTEGER,
                 FOREIGN KEY (user1_id) REFERENCES users (user_id),
                 FOREIGN KEY (user2_id) REFERENCES users (user_id)
             )
-        ''')
+        '''))
         
         # Таблица действий пользователей
-        cursor.execute('''
+        cursor.execute(ddl('''
             CREATE TABLE IF NOT EXISTS user_actions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER,
@@ -82,10 +139,60 @@ class Database:
                 action_date TEXT,
                 FOREIGN KEY (user_id) REFERENCES users (user_id)
             )
-        ''')
+        '''))
+        
+        # Входящие предложения пользователя: pending мэтчи с карточкой собеседника
+        inbox_created = not self.backend.table_exists(cursor, 'match_inbox')
+        cursor.execute(ddl('''
+            CREATE TABLE IF NOT EXISTS match_inbox (
+                user_id INTEGER,
+                match_id INTEGER,
+                partner_id INTEGER,
+                name TEXT,
+                username TEXT,
+                city TEXT,
+                profession TEXT,
+                goals TEXT,
+                about TEXT,
+                linkedin_url TEXT,
+                contact_preference TEXT,
+                common_interests TEXT,
+                is_forced BOOLEAN DEFAULT FALSE,
+                proposal_text TEXT,
+                PRIMARY KEY (user_id, match_id)
+            )
+        '''))
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_match_inbox_match ON match_inbox (match_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_match_inbox_partner ON match_inbox (partner_id)")
+        
+        # История пар: кто с кем уже встречался, без сканирования matches
+        pairs_created = not self.backend.table_exists(cursor, 'match_pairs')
+        cursor.execute(ddl('''
+            CREATE TABLE IF NOT EXISTS match_pairs (
+                user_low INTEGER,
+                user_high INTEGER,
+                first_matched TEXT,
+                PRIMARY KEY (user_low, user_high)
+            ) WITHOUT ROWID
+        '''))
+        
+        # Кэш лучших кандидатов для инкрементального мэтчинга
+        cursor.execute(ddl('''
+            CREATE TABLE IF NOT EXISTS match_candidates (
+                user_id INTEGER,
+                candidate_id INTEGER,
+                score INTEGER,
+                common_interests TEXT,
+                PRIMARY KEY (user_id, candidate_id)
+            )
+        '''))
+        
+        # Индексы для архивирования по дате
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_matches_status_created ON matches (status, created_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_actions_date ON user_actions (action_date)")
         
         # Таблица запланированных мэтчей
-        cursor.execute('''
+        cursor.execute(ddl('''
             CREATE TABLE IF NOT EXISTS scheduled_matches (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 match_date TEXT,
@@ -93,7 +200,49 @@ class Database:
                 created_date TEXT,
                 completed_date TEXT
             )
-        ''')
+        '''))
+        
+        # Рассылки: курсор по user_id позволяет продолжить после перезапуска
+        cursor.execute(ddl('''
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT,
+                segment TEXT,
+                segment_value TEXT,
+                status TEXT DEFAULT 'running',
+                cursor_user_id INTEGER DEFAULT 0,
+                total INTEGER DEFAULT 0,
+                sent INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                blocked INTEGER DEFAULT 0,
+                created_by INTEGER,
+                created_date TEXT,
+                finished_date TEXT
+            )
+        '''))
+        
+        # Отложенные уведомления о предложениях: когда отправить пользователю его inbox
+        cursor.execute(ddl('''
+            CREATE TABLE IF NOT EXISTS scheduled_notifications (
+                user_id INTEGER PRIMARY KEY,
+                send_at TEXT
+            )
+        '''))
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_notifications_send_at ON scheduled_notifications (send_at)")
+        
+        # Журнал обслуживания БД: размер и фрагментация до и после каждого прогона
+        cursor.execute(ddl('''
+            CREATE TABLE IF NOT EXISTS maintenance_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_date TEXT,
+                duration REAL,
+                size_before INTEGER,
+                size_after INTEGER,
+                free_bytes INTEGER,
+                fragmentation REAL,
+                integrity TEXT
+            )
+        '''))
         
         # Добавляем стандартные вопросы
         default_questions = [
@@ -121,6 +270,34 @@ class Database:
         self._update_table_structure(cursor, "matches", "user2_accepted", "BOOLEAN DEFAULT FALSE")
         self._update_table_structure(cursor, "matches", "chat_created", "BOOLEAN DEFAULT FALSE")
         self._update_table_structure(cursor, "matches", "match_successful", "BOOLEAN DEFAULT NULL")
+        self._update_table_structure(cursor, "match_inbox", "proposal_text", "TEXT")
+        self._update_table_structure(cursor, "users", "candidates_stale", "BOOLEAN DEFAULT TRUE")
+        self._update_table_structure(cursor, "users", "matches_accepted", "INTEGER DEFAULT 0")
+        self._update_table_structure(cursor, "users", "matches_rejected", "INTEGER DEFAULT 0")
+        self._update_table_structure(cursor, "users", "matches_successful", "INTEGER DEFAULT 0")
+        self._update_table_structure(cursor, "users", "last_matched_date", "TEXT")
+        self._update_table_structure(cursor, "users", "fatigue_score", "REAL DEFAULT 0")
+        self._update_table_structure(cursor, "users", "fatigue_updated", "TEXT")
+        self._update_table_structure(cursor, "matches", "rejected_by", "INTEGER")
+        self._update_table_structure(cursor, "users", "delivery_failures", "INTEGER DEFAULT 0")
+        self._update_table_structure(cursor, "users", "pool", f"TEXT DEFAULT '{Config.DEFAULT_POOL}'")
+        self._update_table_structure(cursor, "matches", "pool", f"TEXT DEFAULT '{Config.DEFAULT_POOL}'")
+        # Снимок раунда выбирает пользователей одного пула
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_pool ON users (pool, is_active, profile_completed)")
+        
+        # Полнотекстовый индекс для поиска пользователей в админке
+        self._create_search_index(cursor)
+        
+        # Заполняем inbox из существующих pending мэтчей при первом создании
+        if inbox_created:
+            cursor.execute("SELECT id, user1_id, user2_id, common_interests, is_forced FROM matches WHERE status = 'pending'")
+            for match_id, user1_id, user2_id, common_interests, is_forced in cursor.fetchall():
+                self._add_to_inbox(cursor, match_id, user1_id, user2_id, common_interests, is_forced)
+                self._add_to_inbox(cursor, match_id, user2_id, user1_id, common_interests, is_forced)
+        
+        # Заполняем историю пар и счетчики из существующих мэтчей при первом создании
+        if pairs_created:
+            self._backfill_match_history(cursor)
         
         conn.commit()
         conn.close()
@@ -129,17 +306,150 @@ class Database:
     def _update_table_structure(self, cursor, table_name, column_name, column_type):
         """Добавляет колонку в таблицу если она отсутствует"""
         try:
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = [column[1] for column in cursor.fetchall()]
-            
+            columns = self.backend.table_columns(cursor, table_name)
+
             if column_name not in columns:
-                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+                cursor.execute(self.backend.adapt_ddl(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
                 logger.info(f"Added column {column_name} to table {table_name}")
         except Exception as e:
             logger.error(f"Error updating table structure: {e}")
 
+    SEARCH_FIELDS = ('name', 'username', 'city', 'profession')
+
+    def _create_search_index(self, cursor):
+        """Полнотекстовый индекс по SEARCH_FIELDS (FTS5 в SQLite, GIN в PostgreSQL)"""
+        try:
+            self.backend.create_search_index(cursor, self.SEARCH_FIELDS)
+        except Exception as e:
+            logger.error(f"Error creating user search index: {e}")
+
+    def search_users(self, query: str, limit: int = 10, active_only: bool = True) -> List[dict]:
+        """Поиск пользователей по началу слов в имени, username, городе и профессии.
+
+        Результаты отсортированы по релевантности.
+        """
+        match = self.backend.search_query(query)
+        if not match:
+            return []
+
+        filters = "AND u.is_active = TRUE AND u.profile_completed = TRUE" if active_only else ""
+        try:
+            return self._fetch_all(self.backend.search_users_sql(filters), (match, limit))
+        except Exception as e:
+            logger.error(f"Error searching users: {e}")
+            return []
+
+    INBOX_CARD_FIELDS = (
+        'name', 'username', 'city', 'profession', 'goals',
+        'about', 'linkedin_url', 'contact_preference'
+    )
+    
+    def _get_inbox_card(self, cursor, user_id) -> Optional[dict]:
+        """Карточка пользователя для inbox его собеседников"""
+        cursor.execute(
+            f"SELECT {', '.join(self.INBOX_CARD_FIELDS)} FROM users WHERE user_id = ?",
+            (user_id,)
+        )
+        row = cursor.fetchone()
+        return dict(zip(self.INBOX_CARD_FIELDS, row)) if row else None
+    
+    def _add_to_inbox(self, cursor, match_id, user_id, partner_id, common_interests, is_forced):
+        """Кладет карточку собеседника и готовый текст предложения в inbox пользователя"""
+        partner = self._get_inbox_card(cursor, partner_id)
+        if not partner:
+            return
+        
+        cursor.execute('''
+            INSERT INTO match_inbox
+            (user_id, match_id, partner_id, name, username, city, profession, goals,
+             about, linkedin_url, contact_preference, common_interests, is_forced, proposal_text)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, match_id) DO UPDATE SET
+                partner_id = excluded.partner_id, name = excluded.name, username = excluded.username,
+                city = excluded.city, profession = excluded.profession, goals = excluded.goals,
+                about = excluded.about, linkedin_url = excluded.linkedin_url,
+                contact_preference = excluded.contact_preference, common_interests = excluded.common_interests,
+                is_forced = excluded.is_forced, proposal_text = excluded.proposal_text
+        ''', (
+            user_id, match_id, partner_id,
+            *(partner[field] for field in self.INBOX_CARD_FIELDS),
+            common_interests, is_forced,
+            render_match_proposal(partner, common_interests, is_forced)
+        ))
+    
+    def _refresh_inbox_cards(self, cursor, user_id):
+        """Обновляет карточку пользователя и тексты предложений в inbox его собеседников"""
+        cursor.execute(
+            "SELECT user_id, match_id, common_interests, is_forced FROM match_inbox WHERE partner_id = ?",
+            (user_id,)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        
+        partner = self._get_inbox_card(cursor, user_id)
+        if not partner:
+            return
+        
+        card = [partner[field] for field in self.INBOX_CARD_FIELDS]
+        set_clause = ", ".join([f"{field} = ?" for field in self.INBOX_CARD_FIELDS])
+        cursor.executemany(
+            f"UPDATE match_inbox SET {set_clause}, proposal_text = ? WHERE user_id = ? AND match_id = ?",
+            [
+                (*card, render_match_proposal(partner, common_interests, is_forced), owner_id, match_id)
+                for owner_id, match_id, common_interests, is_forced in rows
+            ]
+        )
+    
+    def _backfill_match_history(self, cursor):
+        """Строит историю пар и агрегаты пользователей по таблице matches"""
+        cursor.execute('''
+            INSERT INTO match_pairs (user_low, user_high, first_matched)
+            SELECT user_low, user_high, MIN(created_date) FROM (
+                SELECT CASE WHEN user1_id < user2_id THEN user1_id ELSE user2_id END AS user_low,
+                       CASE WHEN user1_id < user2_id THEN user2_id ELSE user1_id END AS user_high,
+                       created_date
+                FROM matches
+            ) AS pairs
+            WHERE TRUE
+            GROUP BY user_low, user_high
+            ON CONFLICT DO NOTHING
+        ''')
+        cursor.execute('''
+            UPDATE users SET
+                matches_count = stats.total,
+                matches_accepted = stats.accepted,
+                matches_successful = stats.successful,
+                last_matched_date = stats.last_matched
+            FROM (
+                SELECT user_id,
+                       COUNT(*) AS total,
+                       SUM(CASE WHEN status = 'accepted' THEN 1 ELSE 0 END) AS accepted,
+                       SUM(CASE WHEN match_successful THEN 1 ELSE 0 END) AS successful,
+                       MAX(created_date) AS last_matched
+                FROM (
+                    SELECT user1_id AS user_id, status, match_successful, created_date FROM matches
+                    UNION ALL
+                    SELECT user2_id, status, match_successful, created_date FROM matches
+                ) AS sides
+                GROUP BY user_id
+            ) AS stats
+            WHERE users.user_id = stats.user_id
+        ''')
+        logger.info("Match history backfilled")
+    
+    def _add_fatigue(self, cursor, user_ids, weight: float, now: str):
+        """Добавляет усталость пользователям с учетом затухания накопленной"""
+        cursor.executemany('''
+            UPDATE users
+            SET fatigue_score = fatigue_decay(fatigue_score, fatigue_updated, ?) + ?,
+                fatigue_updated = ?
+            WHERE user_id = ?
+        ''', [(now, weight, now, user_id) for user_id in user_ids])
+    
     # === USER METHODS ===
-    def add_user(self, user_id: int, username: str = None) -> bool:
+    def add_user(self, user_id: int, username: str = None, pool: str = None) -> bool:
+        """Добавляет пользователя или обновляет username; pool - пул из ссылки приглашения"""
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -159,18 +469,22 @@ class Database:
                     datetime.datetime.now().isoformat(),
                     user_id
                 ))
+                self._refresh_inbox_cards(cursor, user_id)
+                if pool:
+                    self._set_user_pool(cursor, user_id, pool)
                 logger.info(f"Updated existing user: {user_id}")
             else:
                 # Создаем нового пользователя
                 cursor.execute('''
                     INSERT INTO users 
-                    (user_id, username, registration_date, last_active)
-                    VALUES (?, ?, ?, ?)
+                    (user_id, username, registration_date, last_active, pool)
+                    VALUES (?, ?, ?, ?, ?)
                 ''', (
                     user_id,
                     username,
                     datetime.datetime.now().isoformat(),
-                    datetime.datetime.now().isoformat()
+                    datetime.datetime.now().isoformat(),
+                    pool or Config.DEFAULT_POOL
                 ))
                 logger.info(f"Created new user: {user_id}")
             
@@ -181,6 +495,50 @@ class Database:
             logger.error(f"Error adding/updating user: {e}")
             return False
     
+    def _set_user_pool(self, cursor, user_id: int, pool: str):
+        # В другом пуле старые кандидаты не нужны: список пересчитается в раунде
+        cursor.execute('''
+            UPDATE users SET pool = ?, candidates_stale = TRUE
+            WHERE user_id = ? AND pool IS DISTINCT FROM ?
+        ''', (pool, user_id, pool))
+        if cursor.rowcount:
+            cursor.execute("DELETE FROM match_candidates WHERE user_id = ? OR candidate_id = ?", (user_id, user_id))
+            logger.info(f"User {user_id} moved to pool {pool}")
+    
+    def set_user_pool(self, user_id: int, pool: str) -> bool:
+        """Переводит пользователя в другой пул"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,))
+            if cursor.fetchone() is None:
+                conn.close()
+                return False
+            self._set_user_pool(cursor, user_id, pool)
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error setting user pool: {e}")
+            return False
+    
+    def get_pool_sizes(self) -> Dict[str, int]:
+        """Число активных пользователей с заполненным профилем по пулам"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT pool, COUNT(*) FROM users
+                WHERE is_active = TRUE AND profile_completed = TRUE
+                GROUP BY pool ORDER BY pool
+            ''')
+            sizes = {pool or Config.DEFAULT_POOL: count for pool, count in cursor.fetchall()}
+            conn.close()
+            return sizes
+        except Exception as e:
+            logger.error(f"Error getting pool sizes: {e}")
+            return {}
+    
     def update_user_profile(self, user_id: int, **kwargs) -> bool:
         try:
             conn = self.get_connection()
@@ -190,9 +548,12 @@ class Database:
             values = list(kwargs.values())
             values.append(user_id)
             
-            query = f"UPDATE users SET {set_clause}, profile_completed = TRUE WHERE user_id = ?"
+            # Профиль изменился - кандидатов пользователя нужно пересчитать
+            query = f"UPDATE users SET {set_clause}, profile_completed = TRUE, candidates_stale = TRUE WHERE user_id = ?"
             cursor.execute(query, values)
             
+            self._refresh_inbox_cards(cursor, user_id)
+            
             conn.commit()
             conn.close()
             return True
@@ -202,44 +563,57 @@ class Database:
     
     def get_user(self, user_id: int) -> Optional[dict]:
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, row))
-            return None
+            return self._fetch_one("SELECT * FROM users WHERE user_id = ?", (user_id,))
         except Exception as e:
             logger.error(f"Error getting user: {e}")
             return None
     
     def get_all_active_users(self) -> List[dict]:
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE is_active = TRUE AND profile_completed = TRUE")
-            rows = cursor.fetchall()
-            conn.close()
-            
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+            return self._fetch_all("SELECT * FROM users WHERE is_active = TRUE AND profile_completed = TRUE")
         except Exception as e:
             logger.error(f"Error getting active users: {e}")
             return []
     
-    def get_questions(self) -> List[dict]:
+    def get_matching_snapshot(self, pool: str = None) -> MatchingSnapshot:
+        """Компактный снимок активных пользователей: только колонки, нужные для мэтчинга.
+
+        pool - только пользователи этого пула (None - все пулы).
+        """
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM questions WHERE is_active = TRUE ORDER BY question_order")
-            rows = cursor.fetchall()
+            # Усталость считается на момент раунда; слишком уставшие и давно неактивные пропускают раунд
+            now = datetime.datetime.now()
+            columns = ', '.join(UserRecord.COLUMNS[:-1])
+            cursor.execute(f'''
+                SELECT {columns}, fatigue FROM (
+                    SELECT {columns}, fatigue_decay(fatigue_score, fatigue_updated, :now) AS fatigue
+                    FROM users
+                    WHERE is_active = TRUE AND profile_completed = TRUE
+                      AND (CAST(:idle_cutoff AS TEXT) IS NULL OR last_active IS NULL OR last_active >= :idle_cutoff)
+                      AND (CAST(:pool AS TEXT) IS NULL OR pool = :pool)
+                ) AS scored
+                WHERE fatigue < :threshold
+            ''', {
+                'now': now.isoformat(),
+                'threshold': Config.FATIGUE_SKIP_THRESHOLD,
+                'idle_cutoff': (
+                    (now - datetime.timedelta(days=Config.MATCHING_IDLE_DAYS)).isoformat()
+                    if Config.MATCHING_IDLE_DAYS else None
+                ),
+                'pool': pool,
+            })
+            snapshot = MatchingSnapshot(cursor)
             conn.close()
-            
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+            return snapshot
+        except Exception as e:
+            logger.error(f"Error getting matching snapshot: {e}")
+            return MatchingSnapshot(())
+    
+    def get_questions(self) -> List[dict]:
+        try:
+            return self._fetch_all("SELECT * FROM questions WHERE is_active = TRUE ORDER BY question_order")
         except Exception as e:
             logger.error(f"Error getting questions: {e}")
             return []
@@ -260,20 +634,39 @@ class Database:
             if cursor.fetchone():
                 return False  # Мэтч уже существует
             
+            common_interests_json = json.dumps(common_interests)
+            now = datetime.datetime.now().isoformat()
             cursor.execute('''
                 INSERT INTO matches 
-                (user1_id, user2_id, match_score, common_interests, status, created_date, is_forced)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                (user1_id, user2_id, match_score, common_interests, status, created_date, is_forced, pool)
+                VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT pool FROM users WHERE user_id = ?))
+                RETURNING id
             ''', (
                 user1_id,
                 user2_id,
                 match_score,
-                json.dumps(common_interests),
+                common_interests_json,
                 'pending',
-                datetime.datetime.now().isoformat(),
-                is_forced
+                now,
+                is_forced,
+                user1_id
             ))
             
+            match_id = cursor.fetchone()[0]
+            self._add_to_inbox(cursor, match_id, user1_id, user2_id, common_interests_json, is_forced)
+            self._add_to_inbox(cursor, match_id, user2_id, user1_id, common_interests_json, is_forced)
+            
+            # История пар и агрегаты обновляются в той же транзакции
+            cursor.execute(
+                'INSERT INTO match_pairs (user_low, user_high, first_matched) VALUES (?, ?, ?) ON CONFLICT DO NOTHING',
+                (min(user1_id, user2_id), max(user1_id, user2_id), now)
+            )
+            cursor.execute('''
+                UPDATE users SET matches_count = matches_count + 1, last_matched_date = ?
+                WHERE user_id IN (?, ?)
+            ''', (now, user1_id, user2_id))
+            self._add_fatigue(cursor, (user1_id, user2_id), Config.FATIGUE_MATCH_WEIGHT, now)
+            
             conn.commit()
             conn.close()
             return True
@@ -283,9 +676,7 @@ class Database:
     
     def get_pending_matches(self, user_id: int) -> List[dict]:
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
+            return self._fetch_all('''
                 SELECT m.*, 
                        CASE 
                            WHEN m.user1_id = ? THEN u2.name 
@@ -305,81 +696,179 @@ class Database:
                 WHERE (m.user1_id = ? OR m.user2_id = ?) 
                 AND m.status = 'pending'
             ''', (user_id, user_id, user_id, user_id, user_id))
+        except Exception as e:
+            logger.error(f"Error getting pending matches: {e}")
+            return []
+    
+    def get_match_inbox(self, user_id: int) -> List[dict]:
+        """Входящие pending мэтчи пользователя вместе с карточкой собеседника.
+
+        Читается одним поиском по первичному ключу, без JOIN по users.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT match_id, partner_id, {', '.join(self.INBOX_CARD_FIELDS)},
+                       common_interests, is_forced, proposal_text
+                FROM match_inbox
+                WHERE user_id = ?
+                ORDER BY match_id
+            ''', (user_id,))
             
             rows = cursor.fetchall()
             conn.close()
             
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+            inbox = []
+            for row in rows:
+                match_id, partner_id, *card, common_interests, is_forced, proposal_text = row
+                partner = dict(zip(self.INBOX_CARD_FIELDS, card))
+                partner['user_id'] = partner_id
+                inbox.append({
+                    'match_id': match_id,
+                    'partner': partner,
+                    'common_interests': common_interests,
+                    'is_forced': bool(is_forced),
+                    # Строки inbox, созданные до появления колонки, рендерим на лету
+                    'proposal_text': proposal_text or render_match_proposal(partner, common_interests, is_forced)
+                })
+            return inbox
         except Exception as e:
-            logger.error(f"Error getting pending matches: {e}")
+            logger.error(f"Error getting match inbox: {e}")
             return []
     
-    def update_match_status(self, match_id: int, status: str) -> bool:
+    def update_match_status(self, match_id: int, status: str, user_id: int = None) -> bool:
+        """Переводит pending мэтч в новый статус одним UPDATE.
+
+        Закрытые мэтчи (accepted/rejected) повторно не переводятся,
+        поэтому двойное нажатие кнопки ничего не меняет. user_id - кто
+        отклонил мэтч, ему засчитывается отказ и усталость.
+        """
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
+            now = datetime.datetime.now().isoformat()
             
             cursor.execute('''
                 UPDATE matches 
-                SET status = ?, accepted_date = ?
-                WHERE id = ?
-            ''', (status, datetime.datetime.now().isoformat() if status == 'accepted' else None, match_id))
+                SET status = ?, accepted_date = ?, rejected_by = ?
+                WHERE id = ? AND status = 'pending'
+                RETURNING user1_id, user2_id
+            ''', (
+                status,
+                now if status == 'accepted' else None,
+                user_id if status == 'rejected' else None,
+                match_id
+            ))
+            row = cursor.fetchone()
+            updated = row is not None
+            
+            if updated:
+                cursor.execute('DELETE FROM match_inbox WHERE match_id = ?', (match_id,))
+                if status == 'accepted':
+                    cursor.execute(
+                        'UPDATE users SET matches_accepted = matches_accepted + 1 WHERE user_id IN (?, ?)',
+                        row
+                    )
+                elif status == 'rejected' and user_id in row:
+                    cursor.execute(
+                        'UPDATE users SET matches_rejected = matches_rejected + 1 WHERE user_id = ?',
+                        (user_id,)
+                    )
+                    self._add_fatigue(cursor, (user_id,), Config.FATIGUE_REJECT_WEIGHT, now)
             
             conn.commit()
             conn.close()
-            return True
+            return updated
         except Exception as e:
             logger.error(f"Error updating match status: {e}")
             return False
     
-    def update_match_acceptance(self, match_id: int, user_id: int, accepted: bool) -> bool:
-        """Обновляет статус принятия мэтча пользователем"""
+    def update_match_acceptance(self, match_id: int, user_id: int, accepted: bool) -> Optional[dict]:
+        """Отмечает решение пользователя по мэтчу одним атомарным UPDATE.
+
+        Возвращает новое состояние мэтча или None, если мэтч не найден,
+        пользователь не участвует в нем или мэтч уже закрыт. Когда этим
+        вызовом приняли оба участника, мэтч переходит в статус 'accepted'
+        и в результате выставлен флаг 'both_accepted'. Переход из 'pending'
+        возможен только один раз, поэтому событие приходит ровно одному вызову.
+        """
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            # Определяем, какой пользователь принимает
-            cursor.execute('SELECT user1_id, user2_id FROM matches WHERE id = ?', (match_id,))
-            match = cursor.fetchone()
-            
-            if not match:
-                return False
+            # Новые значения флагов: SET в SQLite видит только старые значения,
+            # поэтому выражения для обоих флагов повторяются в status/chat_created
+            user1_flag = "CASE WHEN user1_id = :user_id THEN :accepted ELSE user1_accepted END"
+            user2_flag = "CASE WHEN user2_id = :user_id THEN :accepted ELSE user2_accepted END"
+            both_accepted = f"(({user1_flag}) AND ({user2_flag}))"
             
-            user1_id, user2_id = match
+            cursor.execute(f'''
+                UPDATE matches
+                SET user1_accepted = {user1_flag},
+                    user2_accepted = {user2_flag},
+                    chat_created = CASE WHEN {both_accepted} THEN TRUE ELSE chat_created END,
+                    status = CASE WHEN {both_accepted} THEN 'accepted' ELSE status END,
+                    accepted_date = CASE WHEN {both_accepted} THEN :now ELSE accepted_date END
+                WHERE id = :match_id
+                AND status = 'pending'
+                AND (user1_id = :user_id OR user2_id = :user_id)
+                RETURNING id, user1_id, user2_id, user1_accepted, user2_accepted, status
+            ''', {
+                'match_id': match_id,
+                'user_id': user_id,
+                'accepted': accepted,
+                'now': datetime.datetime.now().isoformat()
+            })
             
-            if user_id == user1_id:
-                cursor.execute('UPDATE matches SET user1_accepted = ? WHERE id = ?', (accepted, match_id))
-            elif user_id == user2_id:
-                cursor.execute('UPDATE matches SET user2_accepted = ? WHERE id = ?', (accepted, match_id))
-            else:
-                return False
-            
-            # Проверяем, оба ли приняли
-            cursor.execute('SELECT user1_accepted, user2_accepted FROM matches WHERE id = ?', (match_id,))
-            user1_accepted, user2_accepted = cursor.fetchone()
+            row = cursor.fetchone()
+            columns = [description[0] for description in cursor.description]
             
-            if user1_accepted and user2_accepted:
-                cursor.execute('UPDATE matches SET chat_created = TRUE WHERE id = ?', (match_id,))
+            if row and row[columns.index('status')] == 'accepted':
+                cursor.execute('DELETE FROM match_inbox WHERE match_id = ?', (match_id,))
+                cursor.execute(
+                    'UPDATE users SET matches_accepted = matches_accepted + 1 WHERE user_id IN (?, ?)',
+                    (row[columns.index('user1_id')], row[columns.index('user2_id')])
+                )
             
             conn.commit()
             conn.close()
-            return True
+            
+            if not row:
+                return None
+            
+            match = dict(zip(columns, row))
+            match['both_accepted'] = match['status'] == 'accepted'
+            return match
         except Exception as e:
             logger.error(f"Error updating match acceptance: {e}")
-            return False
+            return None
     
     def set_match_success(self, match_id: int, successful: bool) -> bool:
-        """Устанавливает статус успешности мэтча"""
+        """Устанавливает статус успешности мэтча.
+
+        Засчитывается первая оценка: повторная не меняет результат и счетчики.
+        """
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            cursor.execute('UPDATE matches SET match_successful = ? WHERE id = ?', (successful, match_id))
+            cursor.execute('''
+                UPDATE matches SET match_successful = ?
+                WHERE id = ? AND match_successful IS NULL
+                RETURNING user1_id, user2_id
+            ''', (successful, match_id))
+            row = cursor.fetchone()
+            
+            if row and successful:
+                cursor.execute(
+                    'UPDATE users SET matches_successful = matches_successful + 1 WHERE user_id IN (?, ?)',
+                    row
+                )
             
             conn.commit()
             conn.close()
-            return True
+            return row is not None
         except Exception as e:
             logger.error(f"Error setting match success: {e}")
             return False
@@ -387,9 +876,7 @@ class Database:
     def get_match(self, match_id: int) -> Optional[dict]:
         """Получает информацию о мэтче по ID"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
+            return self._fetch_one('''
                 SELECT m.*, u1.name as user1_name, u2.name as user2_name,
                        u1.username as user1_username, u2.username as user2_username,
                        u1.linkedin_url as user1_linkedin, u2.linkedin_url as user2_linkedin
@@ -398,14 +885,6 @@ class Database:
                 LEFT JOIN users u2 ON m.user2_id = u2.user_id
                 WHERE m.id = ?
             ''', (match_id,))
-            
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, row))
-            return None
         except Exception as e:
             logger.error(f"Error getting match: {e}")
             return None
@@ -417,6 +896,11 @@ class Database:
             cursor = conn.cursor()
             
             cursor.execute('DELETE FROM matches')
+            cursor.execute('DELETE FROM match_inbox')
+            cursor.execute('DELETE FROM match_pairs')
+            # История пар очищена - кэш кандидатов больше не актуален
+            cursor.execute('DELETE FROM match_candidates')
+            cursor.execute('UPDATE users SET candidates_stale = TRUE')
             cursor.execute('DELETE FROM scheduled_matches')
             
             conn.commit()
@@ -430,26 +914,329 @@ class Database:
     def get_all_pending_matches(self) -> List[dict]:
         """Получить все pending мэтчи для админа"""
         try:
+            return self._fetch_all('''
+                SELECT m.*, u1.name as user1_name, u2.name as user2_name,
+                       u1.username as user1_username, u2.username as user2_username
+                FROM matches m
+                LEFT JOIN users u1 ON m.user1_id = u1.user_id
+                LEFT JOIN users u2 ON m.user2_id = u2.user_id
+                WHERE m.status = 'pending'
+            ''')
+        except Exception as e:
+            logger.error(f"Error getting all pending matches: {e}")
+            return []
+    
+    def _fetch_keyset_page(self, select_sql: str, where: List[str], params: list, key: str,
+                           after_id: int = None, before_id: int = None, limit: int = 10) -> Dict:
+        """Страница по ключу (WHERE key > ? LIMIT ?) вместо выборки всей таблицы.
+
+        Возвращает {'items', 'has_prev', 'has_next'}; лишняя строка в LIMIT
+        показывает, есть ли что-то дальше в направлении листания.
+        """
+        where = list(where)
+        params = list(params)
+        if before_id is not None:
+            where.append(f"{key} < ?")
+            params.append(before_id)
+            order = "DESC"
+        else:
+            if after_id is not None:
+                where.append(f"{key} > ?")
+                params.append(after_id)
+            order = "ASC"
+
+        rows = self._fetch_all(
+            f"{select_sql} WHERE {' AND '.join(where)} ORDER BY {key} {order} LIMIT ?",
+            params + [limit + 1]
+        )
+        more = len(rows) > limit
+        items = rows[:limit]
+
+        if before_id is not None:
+            items.reverse()
+            return {'items': items, 'has_prev': more, 'has_next': True}
+        return {'items': items, 'has_prev': after_id is not None, 'has_next': more}
+
+    @staticmethod
+    def _user_search_filter(query: str = None):
+        if not query:
+            return [], []
+        pattern = f"%{query.strip().lstrip('@')}%"
+        return ["(casefold(name) LIKE casefold(?) OR casefold(username) LIKE casefold(?))"], [pattern, pattern]
+
+    def get_active_users_page(self, after_id: int = None, before_id: int = None,
+                              limit: int = 10, query: str = None) -> Dict:
+        """Страница активных пользователей (по user_id) с числом ожидающих мэтчей"""
+        try:
+            where, params = self._user_search_filter(query)
+            return self._fetch_keyset_page(
+                '''
+                SELECT u.*, (SELECT COUNT(*) FROM match_inbox i WHERE i.user_id = u.user_id) AS pending_count
+                FROM users u
+                ''',
+                ["is_active = TRUE", "profile_completed = TRUE"] + where, params,
+                "u.user_id", after_id, before_id, limit
+            )
+        except Exception as e:
+            logger.error(f"Error getting active users page: {e}")
+            return {'items': [], 'has_prev': False, 'has_next': False}
+
+    def count_active_users(self, query: str = None) -> int:
+        try:
+            where, params = self._user_search_filter(query)
             conn = self.get_connection()
             cursor = conn.cursor()
-            cursor.execute('''
+            cursor.execute(
+                f"SELECT COUNT(*) FROM users WHERE {' AND '.join(['is_active = TRUE', 'profile_completed = TRUE'] + where)}",
+                params
+            )
+            count = cursor.fetchone()[0]
+            conn.close()
+            return count
+        except Exception as e:
+            logger.error(f"Error counting active users: {e}")
+            return 0
+
+    def get_pending_matches_page(self, after_id: int = None, before_id: int = None, limit: int = 10) -> Dict:
+        """Страница pending мэтчей для админа (по id)"""
+        try:
+            return self._fetch_keyset_page(
+                '''
                 SELECT m.*, u1.name as user1_name, u2.name as user2_name,
                        u1.username as user1_username, u2.username as user2_username
                 FROM matches m
                 LEFT JOIN users u1 ON m.user1_id = u1.user_id
                 LEFT JOIN users u2 ON m.user2_id = u2.user_id
-                WHERE m.status = 'pending'
+                ''',
+                ["m.status = 'pending'"], [],
+                "m.id", after_id, before_id, limit
+            )
+        except Exception as e:
+            logger.error(f"Error getting pending matches page: {e}")
+            return {'items': [], 'has_prev': False, 'has_next': False}
+
+    def count_pending_matches(self) -> int:
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM matches WHERE status = 'pending'")
+            count = cursor.fetchone()[0]
+            conn.close()
+            return count
+        except Exception as e:
+            logger.error(f"Error counting pending matches: {e}")
+            return 0
+
+    def get_matches_for_export(self) -> List[dict]:
+        """Все мэтчи с именами участников для CSV-выгрузки"""
+        try:
+            return self._fetch_all('''
+                SELECT m.*, u1.name as user1_name, u2.name as user2_name
+                FROM matches m
+                LEFT JOIN users u1 ON m.user1_id = u1.user_id
+                LEFT JOIN users u2 ON m.user2_id = u2.user_id
+                ORDER BY m.created_date DESC
             ''')
-            
-            rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error getting matches for export: {e}")
+            return []
+
+    def get_match_pairs(self, pool: str = None) -> set:
+        """Пары, которые уже встречались (любой статус), как (min_id, max_id).
+
+        pool - только пары с участником из этого пула: раунду пула чужая история не нужна.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            if pool is None:
+                cursor.execute('SELECT user_low, user_high FROM match_pairs')
+            else:
+                cursor.execute('''
+                    SELECT user_low, user_high FROM match_pairs
+                    WHERE user_low IN (SELECT user_id FROM users WHERE pool = ?)
+                ''', (pool,))
+            pairs = set(cursor.fetchall())
             conn.close()
+            return pairs
+        except Exception as e:
+            logger.error(f"Error getting match pairs: {e}")
+            return set()
+    
+    def have_met(self, user1_id: int, user2_id: int) -> bool:
+        """Были ли пользователи уже в паре (любой статус)"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT 1 FROM match_pairs WHERE user_low = ? AND user_high = ?',
+                (min(user1_id, user2_id), max(user1_id, user2_id))
+            )
+            result = cursor.fetchone() is not None
+            conn.close()
+            return result
+        except Exception as e:
+            logger.error(f"Error checking match pair: {e}")
+            return True  # В случае ошибки считаем, что мэтч уже был
+    
+    def get_users_with_pending_matches(self) -> set:
+        """ID пользователей, у которых есть pending мэтч"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT DISTINCT user_id FROM match_inbox')
+            user_ids = {row[0] for row in cursor.fetchall()}
+            conn.close()
+            return user_ids
+        except Exception as e:
+            logger.error(f"Error getting users with pending matches: {e}")
+            return set()
+    
+    # === SCHEDULED NOTIFICATIONS ===
+    def get_notification_profiles(self, history_days: int) -> Dict[int, dict]:
+        """Пользователи с ожидающими предложениями: город и число действий по часам суток"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id, city FROM users
+                WHERE user_id IN (SELECT user_id FROM match_inbox)
+            ''')
+            profiles = {user_id: {'city': city, 'hours': [0] * 24} for user_id, city in cursor.fetchall()}
             
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+            cutoff = (datetime.datetime.now() - datetime.timedelta(days=history_days)).isoformat()
+            cursor.execute('''
+                SELECT user_id, CAST(substr(action_date, 12, 2) AS INTEGER) AS hour, COUNT(*)
+                FROM user_actions
+                WHERE action_date >= ? AND user_id IN (SELECT user_id FROM match_inbox)
+                GROUP BY user_id, hour
+            ''', (cutoff,))
+            for user_id, hour, count in cursor.fetchall():
+                if user_id in profiles and hour is not None:
+                    profiles[user_id]['hours'][hour] += count
+            conn.close()
+            return profiles
         except Exception as e:
-            logger.error(f"Error getting all pending matches: {e}")
+            logger.error(f"Error getting notification profiles: {e}")
+            return {}
+    
+    def schedule_notifications(self, plan: Dict[int, str]) -> bool:
+        """Сохраняет время отправки {user_id: iso-время}; новое расписание заменяет старое"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO scheduled_notifications (user_id, send_at) VALUES (?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET send_at = excluded.send_at
+            ''', list(plan.items()))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error scheduling notifications: {e}")
+            return False
+    
+    def pop_due_notifications(self, now: str, limit: int = 500) -> List[int]:
+        """Забирает из расписания пользователей, которым пора отправить предложения"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM scheduled_notifications
+                WHERE user_id IN (
+                    SELECT user_id FROM scheduled_notifications
+                    WHERE send_at <= ? ORDER BY send_at LIMIT ?
+                )
+                RETURNING user_id
+            ''', (now, limit))
+            user_ids = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+            conn.close()
+            return user_ids
+        except Exception as e:
+            logger.error(f"Error popping due notifications: {e}")
             return []
     
+    def cancel_scheduled_notification(self, user_id: int) -> bool:
+        """Пользователь сам открыл предложения - отложенная отправка не нужна"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM scheduled_notifications WHERE user_id = ?", (user_id,))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error cancelling scheduled notification: {e}")
+            return False
+    
+    def get_notification_schedule_stats(self) -> dict:
+        """Сколько уведомлений ждет отправки и когда ближайшее и последнее"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*), MIN(send_at), MAX(send_at) FROM scheduled_notifications")
+            count, first, last = cursor.fetchone()
+            conn.close()
+            return {'count': count, 'first': first, 'last': last}
+        except Exception as e:
+            logger.error(f"Error getting notification schedule stats: {e}")
+            return {'count': 0, 'first': None, 'last': None}
+    
+    # === MATCH CANDIDATES ===
+    def get_match_candidates(self, pool: str = None) -> Dict[int, List[tuple]]:
+        """Кэш кандидатов: user_id -> [(candidate_id, score, common_interests)] по убыванию баллов"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id, candidate_id, score, common_interests
+                FROM match_candidates
+                WHERE CAST(? AS TEXT) IS NULL OR user_id IN (SELECT user_id FROM users WHERE pool = ?)
+                ORDER BY user_id, score DESC
+            ''', (pool, pool))
+            
+            candidates = {}
+            for user_id, candidate_id, score, common_interests in cursor.fetchall():
+                candidates.setdefault(user_id, []).append(
+                    (candidate_id, score, json.loads(common_interests))
+                )
+            conn.close()
+            return candidates
+        except Exception as e:
+            logger.error(f"Error getting match candidates: {e}")
+            return {}
+    
+    def save_match_candidates(self, candidates: Dict[int, List[tuple]], fresh_user_ids: List[int] = ()) -> bool:
+        """Заменяет списки кандидатов указанных пользователей и снимает флаг пересчета"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.executemany(
+                'DELETE FROM match_candidates WHERE user_id = ?',
+                [(user_id,) for user_id in candidates]
+            )
+            cursor.executemany('''
+                INSERT INTO match_candidates (user_id, candidate_id, score, common_interests)
+                VALUES (?, ?, ?, ?)
+            ''', [
+                (user_id, candidate_id, score, json.dumps(common_interests))
+                for user_id, user_candidates in candidates.items()
+                for candidate_id, score, common_interests in user_candidates
+            ])
+            cursor.executemany(
+                'UPDATE users SET candidates_stale = FALSE WHERE user_id = ?',
+                [(user_id,) for user_id in fresh_user_ids]
+            )
+            
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error saving match candidates: {e}")
+            return False
+    
     # === SCHEDULED MATCHES ===
     def create_scheduled_match(self, match_date: str) -> int:
         """Создает запланированный мэтч и возвращает его ID"""
@@ -460,9 +1247,10 @@ class Database:
             cursor.execute('''
                 INSERT INTO scheduled_matches (match_date, created_date)
                 VALUES (?, ?)
+                RETURNING id
             ''', (match_date, datetime.datetime.now().isoformat()))
-            
-            match_id = cursor.lastrowid
+
+            match_id = cursor.fetchone()[0]
             conn.commit()
             conn.close()
             return match_id
@@ -473,18 +1261,10 @@ class Database:
     def get_scheduled_matches(self) -> List[dict]:
         """Получить все запланированные мэтчи"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
+            return self._fetch_all('''
                 SELECT * FROM scheduled_matches 
                 ORDER BY match_date DESC
             ''')
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
         except Exception as e:
             logger.error(f"Error getting scheduled matches: {e}")
             return []
@@ -508,6 +1288,375 @@ class Database:
             logger.error(f"Error updating scheduled match: {e}")
             return False
     
+    # === BROADCASTS ===
+
+    BROADCAST_SEGMENTS = {
+        'all': "is_active = TRUE",
+        'active': "is_active = TRUE AND profile_completed = TRUE",
+        'city': "is_active = TRUE AND profile_completed = TRUE AND casefold(city) = casefold(?)",
+        'incomplete': "is_active = TRUE AND profile_completed = FALSE",
+    }
+
+    def _segment_filter(self, segment: str, segment_value: str = None):
+        condition = self.BROADCAST_SEGMENTS[segment]
+        return condition, ((segment_value,) if '?' in condition else ())
+
+    def count_segment(self, segment: str, segment_value: str = None) -> int:
+        """Сколько пользователей попадает в сегмент рассылки"""
+        try:
+            condition, params = self._segment_filter(segment, segment_value)
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM users WHERE {condition}", params)
+            count = cursor.fetchone()[0]
+            conn.close()
+            return count
+        except Exception as e:
+            logger.error(f"Error counting broadcast segment: {e}")
+            return 0
+
+    def create_broadcast(self, text: str, segment: str, segment_value: str = None, created_by: int = None) -> Optional[int]:
+        try:
+            total = self.count_segment(segment, segment_value)
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO broadcasts (text, segment, segment_value, total, created_by, created_date)
+                VALUES (?, ?, ?, ?, ?, ?)
+                RETURNING id
+            ''', (text, segment, segment_value, total, created_by, datetime.datetime.now().isoformat()))
+            broadcast_id = cursor.fetchone()[0]
+            conn.commit()
+            conn.close()
+            return broadcast_id
+        except Exception as e:
+            logger.error(f"Error creating broadcast: {e}")
+            return None
+
+    def get_broadcast(self, broadcast_id: int) -> Optional[dict]:
+        try:
+            return self._fetch_one("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+        except Exception as e:
+            logger.error(f"Error getting broadcast: {e}")
+            return None
+
+    def get_running_broadcasts(self) -> List[dict]:
+        try:
+            return self._fetch_all("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id")
+        except Exception as e:
+            logger.error(f"Error getting running broadcasts: {e}")
+            return []
+
+    def get_broadcast_recipients(self, broadcast: dict, limit: int = 100) -> List[int]:
+        """Следующая пачка получателей после курсора рассылки"""
+        try:
+            condition, params = self._segment_filter(broadcast['segment'], broadcast['segment_value'])
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT user_id FROM users WHERE {condition} AND user_id > ? ORDER BY user_id LIMIT ?",
+                params + (broadcast['cursor_user_id'] or 0, limit)
+            )
+            user_ids = [row[0] for row in cursor.fetchall()]
+            conn.close()
+            return user_ids
+        except Exception as e:
+            logger.error(f"Error getting broadcast recipients: {e}")
+            return []
+
+    def advance_broadcast(self, broadcast_id: int, user_id: int, outcome: str) -> bool:
+        """Сдвигает курсор на user_id и учитывает результат доставки (sent/failed/blocked)"""
+        if outcome not in ('sent', 'failed', 'blocked'):
+            raise ValueError(f"Unknown broadcast outcome: {outcome}")
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE broadcasts SET cursor_user_id = ?, {outcome} = {outcome} + 1
+                WHERE id = ?
+            ''', (user_id, broadcast_id))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error advancing broadcast: {e}")
+            return False
+
+    def set_broadcast_status(self, broadcast_id: int, status: str) -> bool:
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE broadcasts SET status = ?, finished_date = ?
+                WHERE id = ? AND status = 'running'
+            ''', (status, None if status == 'running' else datetime.datetime.now().isoformat(), broadcast_id))
+            updated = cursor.rowcount > 0
+            conn.commit()
+            conn.close()
+            return updated
+        except Exception as e:
+            logger.error(f"Error updating broadcast status: {e}")
+            return False
+
+    def set_user_active(self, user_id: int, is_active: bool) -> bool:
+        """Включает/выключает участие пользователя в мэтчинге"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE users SET is_active = ?, candidates_stale = TRUE WHERE user_id = ?",
+                (is_active, user_id)
+            )
+            updated = cursor.rowcount > 0
+            conn.commit()
+            conn.close()
+            return updated
+        except Exception as e:
+            logger.error(f"Error updating user activity status: {e}")
+            return False
+
+    def deactivate_user(self, user_id: int) -> int:
+        """Отключает пользователя, до которого бот не может достучаться.
+
+        Его pending мэтчи отменяются, партнеры снова попадают в пул.
+        Возвращает число освобожденных мэтчей.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE users SET is_active = FALSE, candidates_stale = TRUE WHERE user_id = ?", (user_id,)
+            )
+            cursor.execute('''
+                UPDATE matches SET status = 'cancelled', rejected_by = ?
+                WHERE status = 'pending' AND (user1_id = ? OR user2_id = ?)
+                RETURNING id, CASE WHEN user1_id = ? THEN user2_id ELSE user1_id END
+            ''', (user_id, user_id, user_id, user_id))
+            freed = cursor.fetchall()
+
+            for match_id, partner_id in freed:
+                cursor.execute("DELETE FROM match_inbox WHERE match_id = ?", (match_id,))
+                cursor.execute("UPDATE users SET candidates_stale = TRUE WHERE user_id = ?", (partner_id,))
+            cursor.execute(
+                "DELETE FROM match_candidates WHERE user_id = ? OR candidate_id = ?", (user_id, user_id)
+            )
+
+            conn.commit()
+            conn.close()
+            if freed:
+                logger.info(f"User {user_id} deactivated, freed {len(freed)} pending matches")
+            return len(freed)
+        except Exception as e:
+            logger.error(f"Error deactivating user: {e}")
+            return 0
+
+    def record_delivery_failure(self, user_id: int, unreachable: bool) -> Optional[int]:
+        """Учитывает неудачную доставку пользователю.
+
+        Недоступный пользователь (заблокировал бота, удалил аккаунт) отключается
+        сразу, прочие ошибки - после DELIVERY_FAILURE_LIMIT неудач подряд.
+        Возвращает число освобожденных мэтчей, если пользователь отключен, иначе None.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE users SET delivery_failures = delivery_failures + 1
+                WHERE user_id = ?
+                RETURNING delivery_failures
+            ''', (user_id,))
+            row = cursor.fetchone()
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error recording delivery failure: {e}")
+            return None
+
+        if row and (unreachable or row[0] >= Config.DELIVERY_FAILURE_LIMIT):
+            return self.deactivate_user(user_id)
+        return None
+
+    def record_delivery_success(self, user_ids: Iterable[int]) -> bool:
+        """Сбрасывает счетчик неудачных доставок пакетом, одной транзакцией"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return True
+        try:
+            conn = self.get_connection()
+            with conn:
+                # Строки без неудач не переписываются
+                conn.executemany(
+                    "UPDATE users SET delivery_failures = 0 WHERE user_id = ? AND delivery_failures > 0",
+                    [(user_id,) for user_id in user_ids]
+                )
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error recording delivery success: {e}")
+            return False
+
+    # === ARCHIVE ===
+    def _archive_rows(self, cursor, table: str, date_column: str, condition: str, params: tuple) -> int:
+        """Переносит строки table в помесячные таблицы archive.{table}_YYYY_MM"""
+        columns = self.backend.table_columns(cursor, table)
+        column_list = ", ".join(columns)
+        
+        cursor.execute(
+            f"SELECT DISTINCT substr({date_column}, 1, 7) FROM {table} WHERE {condition}",
+            params
+        )
+        months = [row[0] for row in cursor.fetchall() if row[0] and re.fullmatch(r"\d{4}-\d{2}", row[0])]
+        
+        moved = 0
+        for month in months:
+            archive_table = f"{table}_{month.replace('-', '_')}"
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS archive.{archive_table} AS SELECT * FROM {table} WHERE FALSE"
+            )
+            # Колонки, появившиеся в основной таблице позже, добавляем и в архив
+            archived_columns = self.backend.table_columns(cursor, archive_table, schema='archive')
+            for column, column_type in columns.items():
+                if column not in archived_columns:
+                    cursor.execute(f"ALTER TABLE archive.{archive_table} ADD COLUMN {column} {column_type}")
+            
+            cursor.execute(f'''
+                INSERT INTO archive.{archive_table} ({column_list})
+                SELECT {column_list} FROM {table}
+                WHERE {condition} AND substr({date_column}, 1, 7) = ?
+            ''', (*params, month))
+            moved += cursor.rowcount
+        
+        cursor.execute(f"DELETE FROM {table} WHERE {condition}", params)
+        return moved
+    
+    def archive_old_data(self, matches_days: int = None, actions_days: int = None) -> dict:
+        """Переносит закрытые мэтчи и старые действия в архивную БД.
+
+        История пар (match_pairs) остается в основной базе, поэтому
+        повторные пары по-прежнему исключаются.
+        """
+        if matches_days is None:
+            matches_days = Config.ARCHIVE_MATCHES_AFTER_DAYS
+        if actions_days is None:
+            actions_days = Config.ARCHIVE_ACTIONS_AFTER_DAYS
+        
+        now = datetime.datetime.now()
+        matches_cutoff = (now - datetime.timedelta(days=matches_days)).isoformat()
+        actions_cutoff = (now - datetime.timedelta(days=actions_days)).isoformat()
+        scheduled_cutoff = (now - datetime.timedelta(days=7)).isoformat()
+        
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            self.backend.attach_archive(cursor)
+        except Exception as e:
+            logger.error(f"Error attaching archive database: {e}")
+            return {}
+        
+        # Соединение долгоживущее - архив отключаем при любом исходе
+        try:
+            # Создание архивных таблиц и перенос строк - одна транзакция: без явного
+            # BEGIN DDL выполнялся бы вне ее (в PostgreSQL - в autocommit)
+            cursor.execute("BEGIN")
+            matches_archived = self._archive_rows(
+                cursor, "matches", "created_date",
+                "status IN ('accepted', 'rejected', 'cancelled') AND created_date < ?", (matches_cutoff,)
+            )
+            actions_archived = self._archive_rows(
+                cursor, "user_actions", "action_date",
+                "action_date < ?", (actions_cutoff,)
+            )
+            
+            # Выполненные расписания старше недели просто удаляем
+            cursor.execute(
+                "DELETE FROM scheduled_matches WHERE status = 'completed' AND completed_date < ?",
+                (scheduled_cutoff,)
+            )
+            scheduled_deleted = cursor.rowcount
+            
+            conn.commit()
+            
+            logger.info(f"Archived {matches_archived} matches and {actions_archived} user actions")
+            return {
+                'matches_archived': matches_archived,
+                'actions_archived': actions_archived,
+                'scheduled_deleted': scheduled_deleted
+            }
+        except Exception as e:
+            logger.error(f"Error archiving old data: {e}")
+            return {}
+        finally:
+            conn.close()
+            self.backend.detach_archive(cursor)
+    
+    # === MAINTENANCE ===
+    def get_storage_stats(self) -> dict:
+        """Текущий размер базы, свободное место и фрагментация"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            stats = self.backend.storage_stats(cursor)
+            conn.close()
+            return stats
+        except Exception as e:
+            logger.error(f"Error getting storage stats: {e}")
+            return {}
+    
+    def run_maintenance(self, vacuum_pages: int = None) -> dict:
+        """ANALYZE, incremental vacuum и quick_check; результат пишется в maintenance_runs"""
+        if vacuum_pages is None:
+            vacuum_pages = Config.MAINTENANCE_VACUUM_PAGES
+        
+        started = datetime.datetime.now()
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            before = self.backend.storage_stats(cursor)
+            self.backend.optimize(cursor)
+            self.backend.vacuum(cursor, vacuum_pages)
+            problems = self.backend.integrity_check(cursor)
+            after = self.backend.storage_stats(cursor)
+            
+            if problems is None:
+                integrity = 'n/a'
+            else:
+                integrity = '; '.join(problems)[:500] if problems else 'ok'
+            report = {
+                'run_date': started.isoformat(),
+                'duration': (datetime.datetime.now() - started).total_seconds(),
+                'size_before': before['size_bytes'],
+                'size_after': after['size_bytes'],
+                'free_bytes': after['free_bytes'],
+                'fragmentation': after['fragmentation'],
+                'integrity': integrity,
+            }
+            cursor.execute('''
+                INSERT INTO maintenance_runs
+                    (run_date, duration, size_before, size_after, free_bytes, fragmentation, integrity)
+                VALUES (:run_date, :duration, :size_before, :size_after, :free_bytes, :fragmentation, :integrity)
+            ''', report)
+            conn.commit()
+            conn.close()
+            
+            if problems:
+                logger.error(f"Database integrity check failed: {integrity}")
+            logger.info(
+                f"Database maintenance done in {report['duration']:.1f}s: "
+                f"{report['size_before']} -> {report['size_after']} bytes"
+            )
+            return report
+        except Exception as e:
+            logger.error(f"Error running database maintenance: {e}")
+            return {}
+    
+    def get_last_maintenance(self) -> Optional[dict]:
+        try:
+            return self._fetch_one("SELECT * FROM maintenance_runs ORDER BY id DESC LIMIT 1")
+        except Exception as e:
+            logger.error(f"Error getting last maintenance run: {e}")
+            return None
+    
     # === ANALYTICS METHODS ===
     def get_user_stats(self) -> dict:
         try:
@@ -523,8 +1672,9 @@ class Database:
             cursor.execute("SELECT COUNT(*) FROM users WHERE profile_completed = TRUE")
             completed_profiles = cursor.fetchone()[0]
             
-            cursor.execute("SELECT COUNT(*) FROM matches WHERE status = 'accepted'")
-            successful_matches = cursor.fetchone()[0]
+            # Берем из агрегатов пользователей: архивирование не уменьшает счетчик
+            cursor.execute("SELECT COALESCE(SUM(matches_accepted), 0) FROM users")
+            successful_matches = int(cursor.fetchone()[0]) // 2
             
             cursor.execute("SELECT COUNT(*) FROM matches WHERE status = 'pending'")
             pending_matches = cursor.fetchone()[0]
@@ -546,17 +1696,39 @@ class Database:
             logger.error(f"Error getting user stats: {e}")
             return {}
     
+    def update_last_active(self, timestamps: Dict[int, str]) -> bool:
+        """Пакетно записывает время последней активности {user_id: iso-время}"""
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.executemany(
+                    "UPDATE users SET last_active = ? WHERE user_id = ?",
+                    [(timestamp, user_id) for user_id, timestamp in timestamps.items()]
+                )
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error updating last_active: {e}")
+            return False
+
     def log_user_action(self, user_id: int, action_type: str, target_user_id: int = None):
+        """Ставит событие в буфер; в БД оно попадет пакетом (см. ActionLogWriter)"""
+        if self.action_log is None:
+            # Экземпляр только для чтения (снимок) - события не пишутся
+            return
+        self.action_log.add((user_id, action_type, target_user_id, datetime.datetime.now().isoformat()))
+
+    def write_user_actions(self, rows: List[tuple]) -> bool:
+        """Пакетная запись событий user_actions одной транзакцией"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO user_actions (user_id, action_type, target_user_id, action_date)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, action_type, target_user_id, datetime.datetime.now().isoformat()))
-            
-            conn.commit()
+            with conn:
+                conn.executemany('''
+                    INSERT INTO user_actions (user_id, action_type, target_user_id, action_date)
+                    VALUES (?, ?, ?, ?)
+                ''', rows)
             conn.close()
+            return True
         except Exception as e:
-            logger.error(f"Error logging user action: {e}")
\ No newline at end of file
+            logger.error(f"Error logging user actions: {e}")
+            return False
\ No newline at end of file
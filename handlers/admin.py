@@ -1,34 +1,59 @@
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
+import asyncio
 import logging
 import csv
+import os
 import io
+from html import escape
+from typing import Optional
 from datetime import datetime
 from aiogram.types import BufferedInputFile
 from database import Database
 from services.matcher import MatchMaker
+from services.broadcast import BroadcastEngine
+from services.snapshots import SnapshotManager
+from services.maintenance import MaintenanceScheduler
+from services.outbound import TRANSACTIONAL, outbound, send_priority
+from services.telegram_session import TelegramSession
+from middlewares.throttling import throttling
 from utils.states import AdminStates
 
 from utils.keyboards import (
     get_admin_main_inline, get_admin_matching_inline,
     get_admin_management_inline,
     get_main_menu_inline, get_admin_settings_inline,
-    get_back_to_admin_inline,
+    get_back_to_admin_inline, get_admin_pagination_inline,
+    get_admin_user_choice_inline, get_broadcast_segments_inline,
+    get_broadcast_confirm_inline, get_broadcast_progress_inline,
+    get_admin_db_inline, get_admin_pools_inline,
 )
 from config import Config
 
 router = Router()
 db = Database()
 match_maker = MatchMaker(db)
+broadcaster = BroadcastEngine(db)
+snapshots = SnapshotManager(db)
+maintenance = MaintenanceScheduler(db)
 
 logger = logging.getLogger(__name__)
 
+ADMIN_PAGE_SIZE = 10
+
 
 def is_admin(user_id: int) -> bool:
     return user_id in Config.ADMIN_IDS
 
+
+def snapshot_note(reader: Database) -> str:
+    """Подпись о том, что данные взяты из копии БД"""
+    taken = snapshots.snapshot_time(reader)
+    return f"\n\n🗂 Данные из копии от {taken.strftime('%d.%m.%Y %H:%M')}" if taken else ""
+
     #==== Вспомогательные функции для csv ====
 
 def clean_csv_value(value):
@@ -103,6 +128,31 @@ async def admin_command(message: Message, state: FSMContext):
         reply_markup=get_admin_main_inline()
     )
 
+@router.message(Command("setpool"))
+async def admin_set_pool(message: Message, command: CommandObject):
+    """/setpool <user_id> <пул> - перевод пользователя в другой пул"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ Нет доступа к админ-панели")
+        return
+
+    args = (command.args or "").split()
+    if len(args) != 2 or not args[0].isdigit():
+        await message.answer(
+            "Использование: /setpool <user_id> <пул>\n"
+            f"Пулы: {', '.join(Config.MATCHING_POOLS)}"
+        )
+        return
+
+    user_id, pool = int(args[0]), args[1]
+    if pool not in Config.MATCHING_POOLS:
+        await message.answer(f"❌ Неизвестный пул. Пулы: {', '.join(Config.MATCHING_POOLS)}")
+        return
+
+    if db.set_user_pool(user_id, pool):
+        await message.answer(f"✅ Пользователь {user_id} переведен в пул {pool}")
+    else:
+        await message.answer(f"❌ Пользователь {user_id} не найден")
+
 # ===== INLINE ОБРАБОТЧИКИ АДМИН-ПАНЕЛИ =====
 
 
@@ -131,8 +181,8 @@ async def admin_stats(callback: CallbackQuery):
         await callback.answer("Нет доступа")
         return
 
-    stats = db.get_user_stats()
-    active_users = db.get_all_active_users()
+    reader = snapshots.reader()
+    stats = reader.get_user_stats()
 
     message_text = (
         "📊 Статистика системы:\n\n"
@@ -142,7 +192,8 @@ async def admin_stats(callback: CallbackQuery):
         f"💫 Успешные мэтчи: {stats.get('successful_matches', 0)}\n"
         f"⏳ Ожидающие решения: {stats.get('pending_matches', 0)}\n"
         f"📅 Запланированные: {stats.get('scheduled_matches', 0)}\n\n"
-        f"🔍 Готовы к мэтчингу: {len(active_users)} пользователей"
+        f"🔍 Готовы к мэтчингу: {reader.count_active_users()} пользователей"
+        f"{snapshot_note(reader)}"
     )
 
     await callback.message.edit_text(
@@ -152,45 +203,101 @@ async def admin_stats(callback: CallbackQuery):
     await callback.answer()
 
 
+def parse_page_callback(data: str):
+    """prefix:next:<id> / prefix:prev:<id> -> (after_id, before_id)"""
+    _, direction, key = data.split(":")
+    return (int(key), None) if direction == "next" else (None, int(key))
+
+
+def render_users_page(query: str = None, after_id: int = None, before_id: int = None):
+    """Текст и клавиатура страницы активных пользователей"""
+    page = db.get_active_users_page(after_id, before_id, ADMIN_PAGE_SIZE, query)
+    users = page['items']
+
+    if not users:
+        text = f"🔎 По запросу «{escape(query)}» никого не найдено" if query else "❌ Нет активных пользователей"
+    else:
+        total = db.count_active_users(query)
+        header = f"🔎 Поиск «{escape(query)}»" if query else "👥 Активные пользователи"
+        text = f"{header} ({total}):\n\n"
+        for user in users:
+            text += (
+                f"• {escape(user.get('name') or 'No name')}\n"
+                f"   👤 @{escape(user.get('username') or 'no username')}\n"
+                f"   🆔 <code>{user['user_id']}</code>\n"
+                f"   🏙 {escape(user.get('city') or 'Не указан')}\n"
+                f"   💫 Мэтчей: {user.get('matches_count', 0)} | "
+                f"⏳ Ожидает: {user.get('pending_count', 0)}\n\n"
+            )
+
+    markup = get_admin_pagination_inline(
+        "admin_users",
+        users[0]['user_id'] if users else None,
+        users[-1]['user_id'] if users else None,
+        page['has_prev'], page['has_next'],
+        back_callback="admin_main", search=True, query=query
+    )
+    return text, markup
+
+
 @router.callback_query(F.data == "admin_users")
-async def admin_users(callback: CallbackQuery):
-    """Список пользователей"""
+async def admin_users(callback: CallbackQuery, state: FSMContext):
+    """Список пользователей (первая страница, без поиска)"""
     if not is_admin(callback.from_user.id):
         await callback.answer("Нет доступа")
         return
 
-    active_users = db.get_all_active_users()
+    await state.set_state(None)
+    await state.update_data(users_query=None)
 
-    if not active_users:
-        await callback.message.edit_text(
-            "❌ Нет активных пользователей",
-            reply_markup=get_admin_main_inline()
-        )
+    text, markup = render_users_page()
+    await callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("admin_users:"))
+async def admin_users_page(callback: CallbackQuery, state: FSMContext):
+    """Листание списка пользователей"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
         return
 
-    message_text = f"👥 Активные пользователи ({len(active_users)}):\n\n"
+    after_id, before_id = parse_page_callback(callback.data)
+    query = (await state.get_data()).get('users_query')
 
-    for i, user in enumerate(active_users[:10], 1):
-        pending_matches = len(db.get_pending_matches(user['user_id']))
-        message_text += (
-            f"{i}. {user.get('name', 'No name')}\n"
-            f"   👤 @{user.get('username', 'no username')}\n"
-            f"   🆔 <code>{user['user_id']}</code>\n"
-            f"   🏙 {user.get('city', 'Не указан')}\n"
-            f"   💫 Мэтчей: {user.get('matches_count', 0)} | "
-            f"⏳ Ожидает: {pending_matches}\n\n"
-        )
+    text, markup = render_users_page(query, after_id, before_id)
+    await callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
+    await callback.answer()
 
-    if len(active_users) > 10:
-        message_text += f"... и еще {len(active_users) - 10} пользователей"
+
+@router.callback_query(F.data == "admin_users_search")
+async def admin_users_search(callback: CallbackQuery, state: FSMContext):
+    """Запрос строки поиска по имени или username"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
 
     await callback.message.edit_text(
-        message_text,
-        reply_markup=get_admin_main_inline(),
-        parse_mode="HTML"
+        "🔎 Введите имя или username для поиска:",
+        reply_markup=get_back_to_admin_inline()
     )
+    await state.set_state(AdminStates.waiting_user_search)
     await callback.answer()
 
+
+@router.message(AdminStates.waiting_user_search)
+async def process_user_search(message: Message, state: FSMContext):
+    """Первая страница результатов поиска"""
+    if not is_admin(message.from_user.id):
+        return
+
+    query = (message.text or '').strip()
+    await state.set_state(None)
+    await state.update_data(users_query=query or None)
+
+    text, markup = render_users_page(query or None)
+    await message.answer(text, reply_markup=markup, parse_mode="HTML")
+
 # ===== РАЗДЕЛ МЭТЧИНГА =====
 
 
@@ -204,66 +311,72 @@ async def admin_matching(callback: CallbackQuery, state: FSMContext):
     # Очищаем состояние при входе в меню мэтчинга
     await state.clear()
 
-    active_users = db.get_all_active_users()
+    pool_sizes = db.get_pool_sizes()
+    pools_text = ""
+    if len(pool_sizes) > 1:
+        pools_text = "".join(f"   🏘 {pool}: {size}\n" for pool, size in pool_sizes.items())
 
     await callback.message.edit_text(
         f"🔍 Управление мэтчингом\n\n"
-        f"Активных пользователей: {len(active_users)}\n"
+        f"Активных пользователей: {db.count_active_users()}\n"
+        f"{pools_text}"
         f"Выберите действие:",
         reply_markup=get_admin_matching_inline()
     )
     await callback.answer()
 
 
+async def run_admin_round(callback: CallbackQuery, force_all: bool, pool: str = None):
+    """Раунд по выбранному пулу ('*' - все пулы параллельно) или выбор пула, если их несколько.
+
+    Возвращает число созданных пар или None, если раунд не запускался.
+    """
+    action = "admin_force_matching" if force_all else "admin_run_matching"
+    pool_sizes = db.get_pool_sizes()
+
+    if pool is None and len(pool_sizes) > 1:
+        await callback.message.edit_text(
+            "🏘 Выберите пул (сообщество) для раунда.\n"
+            "Пары составляются только внутри пула.",
+            reply_markup=get_admin_pools_inline(action, pool_sizes)
+        )
+        await callback.answer()
+        return None
+
+    pools = list(pool_sizes) if pool in (None, '*') else [pool]
+    if all(pool_sizes.get(pool_key, 0) < 2 for pool_key in pools):
+        await callback.message.edit_text(
+            "❌ Недостаточно пользователей для мэтчинга (нужно минимум 2 в пуле)",
+            reply_markup=get_admin_matching_inline()
+        )
+        return None
+
+    await callback.message.edit_text(
+        "🎯 Запускаю принудительный мэтчинг..." if force_all else "🔄 Запускаю умный мэтчинг..."
+    )
+    results = await match_maker.run_pool_rounds_async(pools, force_all=force_all)
+    return sum(results.values())
+
+
 @router.callback_query(F.data == "admin_run_matching")
+@router.callback_query(F.data.startswith("admin_run_matching:"))
 async def admin_run_matching(callback: CallbackQuery, bot: Bot):
     """Запуск умного мэтчинга"""
     if not is_admin(callback.from_user.id):
         await callback.answer("Нет доступа")
         return
 
-    active_users = db.get_all_active_users()
-
-    if len(active_users) < 2:
-        await callback.message.edit_text(
-            "❌ Недостаточно пользователей для мэтчинга (нужно минимум 2)",
-            reply_markup=get_admin_matching_inline()
-        )
+    pool = callback.data.split(":", 1)[1] if ":" in callback.data else None
+    matches_count = await run_admin_round(callback, force_all=False, pool=pool)
+    if matches_count is None:
         return
 
-    await callback.message.edit_text("🔄 Запускаю умный мэтчинг...")
-
-    matches_count = match_maker.run_matching_round(force_all=False)
-
     if matches_count > 0:
         # Уведомляем пользователей
-        notified_count = 0
-        for user in active_users:
-            pending_matches = db.get_pending_matches(user['user_id'])
-            if pending_matches:
-                try:
-                    for match in pending_matches:
-                        if match['user1_id'] == user['user_id']:
-                            partner_id = match['user2_id']
-                        else:
-                            partner_id = match['user1_id']
-
-                        partner = db.get_user(partner_id)
-                        if partner:
-                            success = await send_match_proposal(
-                                bot, user['user_id'], partner, match['id'])
-                            if success:
-                                notified_count += 1
-                except Exception as e:
-                    logger.error(
-                        f"Error notifying user {user['user_id']}: {e}"
-                        )
+        stats = await notify_pending_users(bot)
 
         await callback.message.edit_text(
-            f"✅ Умный мэтчинг завершен!\n\n"
-            f"• Создано пар: {matches_count}\n"
-            f"• Уведомлений отправлено: {notified_count}\n"
-            f"• Всего пользователей: {len(active_users)}",
+            "✅ Умный мэтчинг завершен!\n\n" + format_round_report(matches_count, stats),
             reply_markup=get_admin_matching_inline()
         )
     else:
@@ -279,54 +392,24 @@ async def admin_run_matching(callback: CallbackQuery, bot: Bot):
 
 
 @router.callback_query(F.data == "admin_force_matching")
+@router.callback_query(F.data.startswith("admin_force_matching:"))
 async def admin_force_matching(callback: CallbackQuery, bot: Bot):
     """Принудительный мэтчинг"""
     if not is_admin(callback.from_user.id):
         await callback.answer("Нет доступа")
         return
 
-    active_users = db.get_all_active_users()
-
-    if len(active_users) < 2:
-        await callback.message.edit_text(
-            "❌ Недостаточно пользователей для мэтчинга",
-            reply_markup=get_admin_matching_inline()
-        )
+    pool = callback.data.split(":", 1)[1] if ":" in callback.data else None
+    matches_count = await run_admin_round(callback, force_all=True, pool=pool)
+    if matches_count is None:
         return
 
-    await callback.message.edit_text("🎯 Запускаю принудительный мэтчинг...")
-
-    matches_count = match_maker.run_matching_round(force_all=True)
-
     if matches_count > 0:
         # Уведомляем пользователей
-        notified_count = 0
-        for user in active_users:
-            pending_matches = db.get_pending_matches(user['user_id'])
-            if pending_matches:
-                try:
-                    for match in pending_matches:
-                        if match['user1_id'] == user['user_id']:
-                            partner_id = match['user2_id']
-                        else:
-                            partner_id = match['user1_id']
-
-                        partner = db.get_user(partner_id)
-                        if partner:
-                            success = await send_match_proposal(
-                                bot, user['user_id'], partner, match['id']
-                                )
-                            if success:
-                                notified_count += 1
-                except Exception as e:
-                    logger.error(
-                        f"Error notifying user {user['user_id']}: {e}"
-                        )
+        stats = await notify_pending_users(bot)
 
         await callback.message.edit_text(
-            f"✅ Принудительный мэтчинг завершен!\n\n"
-            f"Создано пар: {matches_count}\n"
-            f"Уведомлений отправлено: {notified_count}",
+            "✅ Принудительный мэтчинг завершен!\n\n" + format_round_report(matches_count, stats),
             reply_markup=get_admin_matching_inline()
         )
     else:
@@ -340,6 +423,31 @@ async def admin_force_matching(callback: CallbackQuery, bot: Bot):
     await callback.answer()
 
 
+def render_pending_matches_page(after_id: int = None, before_id: int = None):
+    """Текст и клавиатура страницы ожидающих мэтчей"""
+    page = db.get_pending_matches_page(after_id, before_id, ADMIN_PAGE_SIZE)
+    matches = page['items']
+
+    if not matches:
+        return "⏳ Нет ожидающих мэтчей", get_admin_matching_inline()
+
+    text = f"⏳ Ожидающие мэтчи ({db.count_pending_matches()}):\n\n"
+    for match in matches:
+        forced_text = " 🎯" if match.get('is_forced') else ""
+        text += (
+            f"• {match.get('user1_name', 'Unknown')} (<code>{match['user1_id']}</code>) + "
+            f"{match.get('user2_name', 'Unknown')} (<code>{match['user2_id']}</code>)\n"
+            f"   💫 Баллы: {match.get('match_score', 0)}{forced_text}\n"
+            f"   📅 Создан: {(match.get('created_date') or '')[:10]}\n\n"
+        )
+
+    markup = get_admin_pagination_inline(
+        "admin_pending_matches", matches[0]['id'], matches[-1]['id'],
+        page['has_prev'], page['has_next'], back_callback="admin_matching"
+    )
+    return text, markup
+
+
 @router.callback_query(F.data == "admin_pending_matches")
 async def admin_pending_matches(callback: CallbackQuery):
     """Список ожидающих мэтчей"""
@@ -347,34 +455,20 @@ async def admin_pending_matches(callback: CallbackQuery):
         await callback.answer("Нет доступа")
         return
 
-    pending_matches = db.get_all_pending_matches()
-
-    if not pending_matches:
-        await callback.message.edit_text(
-            "⏳ Нет ожидающих мэтчей",
-            reply_markup=get_admin_matching_inline()
-        )
-        return
-
-    message_text = f"⏳ Ожидающие мэтчи ({len(pending_matches)}):\n\n"
+    text, markup = render_pending_matches_page()
+    await callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
+    await callback.answer()
 
-    for i, match in enumerate(pending_matches[:10], 1):
-        forced_text = " 🎯" if match.get('is_forced') else ""
-        message_text += (
-            f"{i}. {match.get('user1_name', 'Unknown')} (<code>{match['user1_id']}</code>) + "
-            f"{match.get('user2_name', 'Unknown')} (<code>{match['user2_id']}</code>)\n"
-            f"   💫 Баллы: {match.get('match_score', 0)}{forced_text}\n"
-            f"   📅 Создан: {match.get('created_date', '')[:10]}\n\n"
-        )
 
-    if len(pending_matches) > 10:
-        message_text += f"... и еще {len(pending_matches) - 10} мэтчей"
+@router.callback_query(F.data.startswith("admin_pending_matches:"))
+async def admin_pending_matches_page(callback: CallbackQuery):
+    """Листание ожидающих мэтчей"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
 
-    await callback.message.edit_text(
-        message_text,
-        reply_markup=get_admin_matching_inline(),
-        parse_mode="HTML"
-    )
+    text, markup = render_pending_matches_page(*parse_page_callback(callback.data))
+    await callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
     await callback.answer()
 
 
@@ -385,9 +479,9 @@ async def admin_create_match_start(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Нет доступа")
         return
 
-    active_users = db.get_all_active_users()
+    total_users = db.count_active_users()
     
-    if len(active_users) < 2:
+    if total_users < 2:
         await callback.message.edit_text(
             "❌ Недостаточно пользователей для создания мэтча",
             reply_markup=get_admin_matching_inline()
@@ -395,12 +489,12 @@ async def admin_create_match_start(callback: CallbackQuery, state: FSMContext):
         return
 
     # Формируем список пользователей для выбора
-    users_text = "👥 Выберите первого пользователя (введите ID):\n\n"
-    for user in active_users[:10]:  # Показываем первые 10
+    users_text = "👥 Выберите первого пользователя (введите ID или часть имени, username, города):\n\n"
+    for user in db.get_active_users_page(limit=ADMIN_PAGE_SIZE)['items']:
         users_text += f"🆔 <code>{user['user_id']}</code> - {user.get('name', 'No name')} (@{user.get('username', 'no username')})\n"
     
-    if len(active_users) > 10:
-        users_text += f"\n... и еще {len(active_users) - 10} пользователей"
+    if total_users > ADMIN_PAGE_SIZE:
+        users_text += f"\n... и еще {total_users - ADMIN_PAGE_SIZE} пользователей (ID можно найти в разделе «Пользователи»)"
 
     await callback.message.edit_text(
         users_text,
@@ -411,109 +505,140 @@ async def admin_create_match_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(AdminStates.waiting_manual_match_user1)
     await callback.answer()
 
+async def search_manual_match_user(message: Message, exclude_id: int = None) -> Optional[int]:
+    """ID из сообщения или, если введен текст, список найденных пользователей для выбора"""
+    text = (message.text or '').strip()
+    if text.isdigit():
+        return int(text)
+
+    users = [
+        user for user in db.search_users(text, limit=ADMIN_PAGE_SIZE + 1)
+        if user['user_id'] != exclude_id
+    ][:ADMIN_PAGE_SIZE]
+
+    if not users:
+        await message.answer("❌ Никого не найдено. Введите ID или другую часть имени:")
+        return None
+
+    await message.answer(
+        f"🔎 Найдено по запросу «{text}»:",
+        reply_markup=get_admin_user_choice_inline(users)
+    )
+    return None
+
+
 @router.message(AdminStates.waiting_manual_match_user1)
 async def process_manual_match_user1(message: Message, state: FSMContext):
     """Обработка выбора первого пользователя"""
     if not is_admin(message.from_user.id):
         return
 
-    try:
-        user1_id = int(message.text.strip())
-        user1 = db.get_user(user1_id)
-        
-        if not user1:
-            await message.answer("❌ Пользователь не найден. Введите корректный ID:")
-            return
-        
-        await state.update_data(user1_id=user1_id, user1_name=user1.get('name', 'Unknown'))
-        
-        active_users = db.get_all_active_users()
-        users_text = f"✅ Первый пользователь: {user1.get('name')} (ID: <code>{user1_id}</code>)\n\n"
-        users_text += "👥 Выберите второго пользователя (введите ID):\n\n"
-        
-        for user in [u for u in active_users if u['user_id'] != user1_id][:10]:
-            users_text += f"🆔 <code>{user['user_id']}</code> - {user.get('name', 'No name')} (@{user.get('username', 'no username')})\n"
-        
-        await message.answer(
-            users_text,
-            reply_markup=get_back_to_admin_inline(),
-            parse_mode="HTML"
-        )
-        
-        await state.set_state(AdminStates.waiting_manual_match_user2)
-        
-    except ValueError:
-        await message.answer("❌ Введите числовой ID пользователя:")
+    user1_id = await search_manual_match_user(message)
+    if user1_id is not None:
+        await choose_manual_match_user1(message, state, user1_id)
+
 
 @router.message(AdminStates.waiting_manual_match_user2)
 async def process_manual_match_user2(message: Message, state: FSMContext, bot: Bot):
-    """Обработка выбора второго пользователя и создание мэтча"""
+    """Обработка выбора второго пользователя"""
     if not is_admin(message.from_user.id):
         return
 
-    try:
-        user2_id = int(message.text.strip())
-        state_data = await state.get_data()
-        user1_id = state_data['user1_id']
-        user1_name = state_data['user1_name']
-        
-        if user1_id == user2_id:
-            await message.answer("❌ Нельзя создать мэтч с самим собой. Введите другой ID:")
-            return
-        
-        user2 = db.get_user(user2_id)
-        
-        if not user2:
-            await message.answer("❌ Пользователь не найден. Введите корректный ID:")
-            return
-        
-        # Создаем мэтч
-        success = match_maker.create_specific_match(user1_id, user2_id)
-        
-        if success:
-            # Уведомляем пользователей
-            user1_matches = db.get_pending_matches(user1_id)
-            user2_matches = db.get_pending_matches(user2_id)
-            
-            # Находим созданный мэтч
-            latest_match = None
-            for match in user1_matches + user2_matches:
-                if (match['user1_id'] == user1_id and match['user2_id'] == user2_id) or \
-                   (match['user1_id'] == user2_id and match['user2_id'] == user1_id):
-                    latest_match = match
+    state_data = await state.get_data()
+    user2_id = await search_manual_match_user(message, exclude_id=state_data.get('user1_id'))
+    if user2_id is not None:
+        await choose_manual_match_user2(message, state, bot, user2_id)
+
+
+@router.callback_query(F.data.startswith("admin_pick_user:"))
+async def admin_pick_user(callback: CallbackQuery, state: FSMContext, bot: Bot):
+    """Выбор пользователя из результатов поиска"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
+
+    user_id = int(callback.data.split(":")[1])
+    current_state = await state.get_state()
+    await callback.answer()
+
+    if current_state == AdminStates.waiting_manual_match_user1.state:
+        await choose_manual_match_user1(callback.message, state, user_id)
+    elif current_state == AdminStates.waiting_manual_match_user2.state:
+        await choose_manual_match_user2(callback.message, state, bot, user_id)
+
+
+async def choose_manual_match_user1(message: Message, state: FSMContext, user1_id: int):
+    """Запоминает первого пользователя и просит выбрать второго"""
+    user1 = db.get_user(user1_id)
+    
+    if not user1:
+        await message.answer("❌ Пользователь не найден. Введите корректный ID или часть имени:")
+        return
+    
+    await state.update_data(user1_id=user1_id, user1_name=user1.get('name', 'Unknown'))
+    
+    active_users = db.get_active_users_page(limit=ADMIN_PAGE_SIZE + 1)['items']
+    users_text = f"✅ Первый пользователь: {user1.get('name')} (ID: <code>{user1_id}</code>)\n\n"
+    users_text += "👥 Выберите второго пользователя (введите ID или часть имени, username, города):\n\n"
+    
+    for user in [u for u in active_users if u['user_id'] != user1_id][:ADMIN_PAGE_SIZE]:
+        users_text += f"🆔 <code>{user['user_id']}</code> - {user.get('name', 'No name')} (@{user.get('username', 'no username')})\n"
+    
+    await message.answer(
+        users_text,
+        reply_markup=get_back_to_admin_inline(),
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(AdminStates.waiting_manual_match_user2)
+
+
+async def choose_manual_match_user2(message: Message, state: FSMContext, bot: Bot, user2_id: int):
+    """Создание мэтча с выбранным вторым пользователем"""
+    state_data = await state.get_data()
+    user1_id = state_data['user1_id']
+    user1_name = state_data['user1_name']
+    
+    if user1_id == user2_id:
+        await message.answer("❌ Нельзя создать мэтч с самим собой. Введите другой ID:")
+        return
+    
+    user2 = db.get_user(user2_id)
+    
+    if not user2:
+        await message.answer("❌ Пользователь не найден. Введите корректный ID или часть имени:")
+        return
+    
+    # Создаем мэтч
+    success = match_maker.create_specific_match(user1_id, user2_id)
+    
+    if success:
+        # Уведомляем пользователей: находим созданный мэтч в inbox каждого
+        notified_count = 0
+        for user_id, partner_id in ((user1_id, user2_id), (user2_id, user1_id)):
+            for proposal in db.get_match_inbox(user_id):
+                if proposal['partner']['user_id'] == partner_id:
+                    success = await send_match_proposal(bot, user_id, proposal)
+                    if success:
+                        notified_count += 1
                     break
-            
-            notified_count = 0
-            if latest_match:
-                # Уведомляем первого пользователя
-                success1 = await send_match_proposal(bot, user1_id, user2, latest_match['id'])
-                if success1:
-                    notified_count += 1
-                
-                # Уведомляем второго пользователя
-                success2 = await send_match_proposal(bot, user2_id, db.get_user(user1_id), latest_match['id'])
-                if success2:
-                    notified_count += 1
-            
-            await message.answer(
-                f"✅ Мэтч создан успешно!\n\n"
-                f"👥 {user1_name} + {user2.get('name', 'Unknown')}\n"
-                f"📤 Уведомлений отправлено: {notified_count}/2",
-                reply_markup=get_admin_matching_inline()
-            )
-        else:
-            await message.answer(
-                "❌ Не удалось создать мэтч. Возможно:\n"
-                "• Такая пара уже существует\n"
-                "• Пользователи уже были в паре ранее\n"
-                "• Ошибка базы данных",
-                reply_markup=get_admin_matching_inline()
-            )
-        
-        await state.clear()
         
-    except ValueError:
-        await message.answer("❌ Введите числовой ID пользователя:")
+        await message.answer(
+            f"✅ Мэтч создан успешно!\n\n"
+            f"👥 {user1_name} + {user2.get('name', 'Unknown')}\n"
+            f"📤 Уведомлений отправлено: {notified_count}/2",
+            reply_markup=get_admin_matching_inline()
+        )
+    else:
+        await message.answer(
+            "❌ Не удалось создать мэтч. Возможно:\n"
+            "• Такая пара уже существует\n"
+            "• Пользователи уже были в паре ранее\n"
+            "• Ошибка базы данных",
+            reply_markup=get_admin_matching_inline()
+        )
+    
+    await state.clear()
 
 # ===== РАЗДЕЛ УПРАВЛЕНИЯ =====
 
@@ -543,45 +668,20 @@ async def admin_quick_match(callback: CallbackQuery, bot: Bot):
         await callback.answer("Нет доступа")
         return
 
-    active_users = db.get_all_active_users()
-
-    if len(active_users) < 2:
+    if db.count_active_users() < 2:
         await callback.answer("❌ Недостаточно пользователей")
         return
 
     await callback.message.edit_text("⚡ Запускаю быстрый мэтчинг...")
 
-    matches_count = match_maker.run_matching_round(force_all=True)
+    matches_count = await match_maker.run_matching_round_async(force_all=True)
 
     if matches_count > 0:
         # Быстро уведомляем пользователей
-        notified_count = 0
-        for user in active_users:
-            pending_matches = db.get_pending_matches(user['user_id'])
-            if pending_matches:
-                try:
-                    for match in pending_matches:
-                        if match['user1_id'] == user['user_id']:
-                            partner_id = match['user2_id']
-                        else:
-                            partner_id = match['user1_id']
-
-                        partner = db.get_user(partner_id)
-                        if partner:
-                            success = await send_match_proposal(
-                                bot, user['user_id'], partner, match['id']
-                                )
-                            if success:
-                                notified_count += 1
-                except Exception as e:
-                    logger.error(
-                        f"Error notifying user {user['user_id']}: {e}"
-                        )
+        stats = await notify_pending_users(bot)
 
         await callback.message.edit_text(
-            f"✅ Быстрый мэтчинг завершен!\n\n"
-            f"Создано {matches_count} пар\n"
-            f"Отправлено {notified_count} уведомлений 🚀",
+            "✅ Быстрый мэтчинг завершен! 🚀\n\n" + format_round_report(matches_count, stats),
             reply_markup=get_admin_main_inline()
         )
     else:
@@ -599,30 +699,20 @@ async def admin_cleanup(callback: CallbackQuery):
         await callback.answer("Нет доступа")
         return
 
-    try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-
-        # Удаляем rejected мэтчи старше 30 дней
-        cursor.execute("DELETE FROM matches WHERE status = 'rejected' AND created_date < datetime('now', '-30 days')")
-        rejected_deleted = cursor.rowcount
-
-        # Удаляем completed scheduled matches старше 7 дней
-        cursor.execute("DELETE FROM scheduled_matches WHERE status = 'completed' AND completed_date < datetime('now', '-7 days')")
-        scheduled_deleted = cursor.rowcount
-
-        conn.commit()
-        conn.close()
+    # Закрытые мэтчи и старые действия переносим в архив, история пар остается
+    result = db.archive_old_data()
 
+    if result:
         await callback.message.edit_text(
             f"🧹 Очистка завершена!\n\n"
-            f"• Удалено rejected мэтчей: {rejected_deleted}\n"
-            f"• Удалено старых расписаний: {scheduled_deleted}",
+            f"• Перенесено мэтчей в архив: {result['matches_archived']}\n"
+            f"• Перенесено действий в архив: {result['actions_archived']}\n"
+            f"• Удалено старых расписаний: {result['scheduled_deleted']}",
             reply_markup=get_admin_management_inline()
         )
-    except Exception as e:
+    else:
         await callback.message.edit_text(
-            f"❌ Ошибка при очистке: {e}",
+            "❌ Ошибка при очистке, подробности в логах",
             reply_markup=get_admin_management_inline()
         )
     await callback.answer()
@@ -664,15 +754,56 @@ async def admin_debug(callback: CallbackQuery):
         await callback.answer("Нет доступа")
         return
 
-    active_users = db.get_all_active_users()
+    reader = snapshots.reader()
+    active_users = reader.get_active_users_page(limit=5)['items']
 
     debug_info = "🐛 Отладочная информация:\n\n"
-    debug_info += f"Активных пользователей: {len(active_users)}\n\n"
+    debug_info += f"Активных пользователей: {reader.count_active_users()}{snapshot_note(reader)}\n\n"
+
+    throttle_stats = throttling.stats()
+    debug_info += "🚦 Антиспам:\n"
+    debug_info += f"   • Обработано: {throttle_stats['handled']}\n"
+    debug_info += f"   • Склеено повторов: {throttle_stats['coalesced']}\n"
+    debug_info += f"   • Отклонено по лимиту: {throttle_stats['throttled']}\n\n"
+
+    debug_info += f"📤 Очередь отправки (flood wait: {outbound.flood_waits}):\n"
+    for name, class_stats in outbound.stats().items():
+        debug_info += (
+            f"   • {name}: в очереди {class_stats['queued']}, отправлено {class_stats['sent']}, "
+            f"ожидание {class_stats['avg_wait_ms']:.0f} мс\n"
+        )
+    debug_info += "\n"
+
+    if isinstance(callback.bot.session, TelegramSession):
+        http = callback.bot.session.stats()
+        debug_info += (
+            f"🌐 HTTP ({http['api']}): соединений открыто {http['connections_created']}, "
+            f"переиспользовано {http['reuse_rate']:.0%}, простаивают {http['idle_connections']}"
+            f"/{http['pool_limit']}, DNS {http['dns_lookups']}\n"
+        )
+        for kind, latency in http['latency'].items():
+            debug_info += (
+                f"   • {kind}: {latency['count']} (ошибок {latency['errors']}), "
+                f"{latency['avg_ms']:.0f} / p95 {latency['p95_ms']:.0f} / max {latency['max_ms']:.0f} мс\n"
+            )
+        debug_info += "\n"
+
+    schedule = db.get_notification_schedule_stats()
+    if schedule['count']:
+        debug_info += (
+            f"🕒 Отложенные предложения: {schedule['count']} "
+            f"({schedule['first'][11:16]}–{schedule['last'][11:16]})\n\n"
+        )
+
+    query_stats = db.query_stats(limit=3)
+    debug_info += f"🗄 Запросы к БД: {query_stats['calls']} ({query_stats['total_ms']:.0f} мс)\n"
+    for query in query_stats['top']:
+        debug_info += f"   • {query['calls']}× {query['total_ms']:.0f} мс: <code>{escape(query['statement'][:50])}</code>\n"
+    debug_info += "\n"
 
-    for user in active_users[:5]:
-        pending_matches = db.get_pending_matches(user['user_id'])
+    for user in active_users:
         debug_info += f"👤 {user.get('name')} (<code>{user['user_id']}</code>):\n"
-        debug_info += f"   • Ожидающих мэтчей: {len(pending_matches)}\n"
+        debug_info += f"   • Ожидающих мэтчей: {user.get('pending_count', 0)}\n"
         debug_info += f"   • Интересы: {user.get('interests', 'Нет')[:30]}...\n\n"
 
     # Тест мэтчинга между первыми двумя пользователями
@@ -712,6 +843,42 @@ async def admin_settings(callback: CallbackQuery):
     await callback.answer()
 
 
+def format_size(size_bytes) -> str:
+    if size_bytes is None:
+        return "—"
+    return f"{size_bytes / 1024 / 1024:.1f} МБ"
+
+
+def format_db_settings() -> str:
+    """Экран БД: текущий размер и итоги последнего обслуживания"""
+    stats = db.get_storage_stats()
+    text = (
+        f"🔧 База данных ({db.backend.name})\n\n"
+        f"💽 Размер: {format_size(stats.get('size_bytes'))}\n"
+        f"🕳 Свободно внутри файла: {format_size(stats.get('free_bytes'))}\n"
+        f"🧩 Фрагментация: {stats.get('fragmentation', 0)}%\n\n"
+    )
+
+    last_run = db.get_last_maintenance()
+    if last_run:
+        run_date = datetime.fromisoformat(last_run['run_date']).strftime('%d.%m.%Y %H:%M')
+        integrity = "✅" if last_run['integrity'] in ('ok', 'n/a') else f"❌ {escape(last_run['integrity'][:200])}"
+        text += (
+            f"🛠 Последнее обслуживание: {run_date} ({last_run['duration']:.1f} сек)\n"
+            f"   • Размер: {format_size(last_run['size_before'])} → {format_size(last_run['size_after'])}\n"
+            f"   • Фрагментация после: {last_run['fragmentation']}%\n"
+            f"   • Целостность: {integrity}\n"
+        )
+    else:
+        text += "🛠 Обслуживание еще не запускалось\n"
+
+    if maintenance.running:
+        text += "⏳ Обслуживание выполняется...\n"
+    elif 0 <= maintenance.hour <= 23:
+        text += f"📅 Следующее: {maintenance.next_run().strftime('%d.%m.%Y %H:%M')}\n"
+    return text
+
+
 @router.callback_query(F.data == "admin_db_settings")
 async def admin_db_settings(callback: CallbackQuery):
     """Настройки базы данных"""
@@ -719,16 +886,260 @@ async def admin_db_settings(callback: CallbackQuery):
         await callback.answer("Нет доступа")
         return
 
+    await callback.message.edit_text(
+        format_db_settings(),
+        reply_markup=get_admin_db_inline(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data == "admin_db_maintenance")
+async def admin_db_maintenance(callback: CallbackQuery):
+    """Внеочередное обслуживание БД"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
+
+    await callback.answer("⏳ Обслуживание запущено...")
+    report = await asyncio.to_thread(maintenance.run)
+
+    text = format_db_settings()
+    if report is None:
+        text = "⏳ Обслуживание уже выполнялось, показаны его последние итоги\n\n" + text
+    elif not report:
+        text = "❌ Обслуживание завершилось с ошибкой, подробности в логе\n\n" + text
+    await callback.message.edit_text(
+        text,
+        reply_markup=get_admin_db_inline(),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data == "admin_db_migrate")
+async def admin_db_migrate(callback: CallbackQuery):
+    """Обновление структуры БД"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
+
     # Пересоздаем таблицы для обновления структуры
     try:
         db.init_db()
         await callback.answer("✅ Структура БД обновлена")
-        
-        # Обновляем сообщение
-        await admin_settings(callback)
     except Exception as e:
         await callback.answer(f"❌ Ошибка: {e}")
 
+
+@router.callback_query(F.data == "admin_backup")
+async def admin_backup(callback: CallbackQuery):
+    """Внеочередная копия БД"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
+
+    if not snapshots.enabled:
+        await callback.answer("❌ Копии поддерживаются только для SQLite", show_alert=True)
+        return
+
+    await callback.answer("⏳ Снимаем копию...")
+    path = await asyncio.to_thread(snapshots.take)
+    if path is None:
+        text = "❌ Не удалось снять копию БД, подробности в логе"
+    else:
+        text = (
+            f"💾 Копия БД сохранена: <code>{escape(os.path.basename(path))}</code>\n"
+            f"⏱ Время копирования: {snapshots.last_duration:.1f} сек\n"
+            f"🗂 Хранится копий: {len(snapshots.snapshots())} из {snapshots.keep}"
+        )
+
+    await callback.message.edit_text(
+        text,
+        reply_markup=get_admin_settings_inline(),
+        parse_mode="HTML"
+    )
+
+# ===== РАССЫЛКА =====
+
+BROADCAST_SEGMENT_NAMES = {
+    'all': "все пользователи",
+    'active': "активные с заполненным профилем",
+    'city': "город",
+    'incomplete': "незаполненные профили",
+}
+
+BROADCAST_STATUS_NAMES = {
+    'running': "⏳ идет",
+    'done': "✅ завершена",
+    'cancelled': "⏹ остановлена",
+}
+
+
+def format_broadcast_progress(broadcast: dict) -> str:
+    """Строка прогресса рассылки с ETA"""
+    progress = broadcaster.progress(broadcast)
+    segment = BROADCAST_SEGMENT_NAMES.get(broadcast['segment'], broadcast['segment'])
+    if broadcast.get('segment_value'):
+        segment += f" «{broadcast['segment_value']}»"
+
+    text = (
+        f"📢 Рассылка #{broadcast['id']} ({segment}): "
+        f"{BROADCAST_STATUS_NAMES.get(broadcast['status'], broadcast['status'])}\n"
+        f"   {progress['processed']}/{progress['total']} ({progress['percent']}%) | "
+        f"✅ {broadcast['sent']} | 🚫 {broadcast['blocked']} | ❌ {broadcast['failed']}\n"
+    )
+    if progress['eta_seconds'] is not None:
+        minutes, seconds = divmod(progress['eta_seconds'], 60)
+        text += f"   ⏱ Осталось примерно: {minutes} мин {seconds} сек\n"
+    return text
+
+
+@router.callback_query(F.data == "admin_broadcast")
+async def admin_broadcast(callback: CallbackQuery, state: FSMContext):
+    """Рассылка: выбор аудитории и текущие рассылки"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
+
+    await state.clear()
+
+    text = "📢 Рассылка\n\n"
+    for broadcast in db.get_running_broadcasts():
+        text += format_broadcast_progress(broadcast) + "\n"
+    text += "Выберите аудиторию:"
+
+    await callback.message.edit_text(text, reply_markup=get_broadcast_segments_inline())
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("admin_broadcast_segment:"))
+async def admin_broadcast_segment(callback: CallbackQuery, state: FSMContext):
+    """Аудитория выбрана - просим город или текст"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
+
+    segment = callback.data.split(":")[1]
+    await state.update_data(broadcast_segment=segment, broadcast_segment_value=None)
+
+    if segment == 'city':
+        await callback.message.edit_text("🏙 Введите город:", reply_markup=get_back_to_admin_inline())
+        await state.set_state(AdminStates.waiting_broadcast_city)
+    else:
+        await callback.message.edit_text(
+            f"✍️ Аудитория: {BROADCAST_SEGMENT_NAMES[segment]} ({db.count_segment(segment)})\n\n"
+            "Отправьте текст рассылки (форматирование сохранится):",
+            reply_markup=get_back_to_admin_inline()
+        )
+        await state.set_state(AdminStates.waiting_broadcast_message)
+    await callback.answer()
+
+
+@router.message(AdminStates.waiting_broadcast_city)
+async def process_broadcast_city(message: Message, state: FSMContext):
+    if not is_admin(message.from_user.id):
+        return
+
+    city = (message.text or '').strip()
+    if not city:
+        await message.answer("❌ Введите название города:")
+        return
+
+    await state.update_data(broadcast_segment_value=city)
+    await message.answer(
+        f"✍️ Аудитория: город «{city}» ({db.count_segment('city', city)})\n\n"
+        "Отправьте текст рассылки (форматирование сохранится):",
+        reply_markup=get_back_to_admin_inline()
+    )
+    await state.set_state(AdminStates.waiting_broadcast_message)
+
+
+@router.message(AdminStates.waiting_broadcast_message)
+async def process_broadcast_message(message: Message, state: FSMContext):
+    """Предпросмотр рассылки перед отправкой"""
+    if not is_admin(message.from_user.id):
+        return
+
+    if not message.text:
+        await message.answer("❌ Поддерживается только текст. Отправьте текст рассылки:")
+        return
+
+    data = await state.get_data()
+    recipients = db.count_segment(data['broadcast_segment'], data.get('broadcast_segment_value'))
+    await state.update_data(broadcast_text=message.html_text)
+    await state.set_state(None)
+
+    await message.answer(
+        f"👀 Предпросмотр ниже. Получателей: {recipients}",
+    )
+    await message.answer(message.html_text, parse_mode="HTML", reply_markup=get_broadcast_confirm_inline())
+
+
+@router.callback_query(F.data == "admin_broadcast_confirm")
+async def admin_broadcast_confirm(callback: CallbackQuery, state: FSMContext, bot: Bot):
+    """Запуск рассылки в фоне"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
+
+    data = await state.get_data()
+    if not data.get('broadcast_text'):
+        await callback.answer("Черновик рассылки не найден")
+        return
+
+    broadcast_id = db.create_broadcast(
+        data['broadcast_text'], data['broadcast_segment'],
+        data.get('broadcast_segment_value'), callback.from_user.id
+    )
+    await state.clear()
+
+    if not broadcast_id:
+        await callback.answer("❌ Не удалось создать рассылку")
+        return
+
+    broadcaster.start(bot, broadcast_id)
+    await callback.answer("🚀 Рассылка запущена")
+    await callback.message.answer(
+        format_broadcast_progress(db.get_broadcast(broadcast_id)),
+        reply_markup=get_broadcast_progress_inline(broadcast_id, running=True)
+    )
+
+
+@router.callback_query(F.data.startswith("admin_broadcast_progress:"))
+async def admin_broadcast_progress(callback: CallbackQuery):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
+
+    broadcast = db.get_broadcast(int(callback.data.split(":")[1]))
+    if not broadcast:
+        await callback.answer("Рассылка не найдена")
+        return
+
+    try:
+        await callback.message.edit_text(
+            format_broadcast_progress(broadcast),
+            reply_markup=get_broadcast_progress_inline(broadcast['id'], broadcast['status'] == 'running')
+        )
+    except TelegramBadRequest:
+        # Прогресс не изменился с прошлого обновления
+        pass
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("admin_broadcast_stop:"))
+async def admin_broadcast_stop(callback: CallbackQuery):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Нет доступа")
+        return
+
+    broadcast_id = int(callback.data.split(":")[1])
+    if broadcaster.cancel(broadcast_id):
+        await callback.answer("⏹ Рассылка остановлена")
+    else:
+        await callback.answer("Рассылка уже завершена")
+    await admin_broadcast_progress(callback)
+
 # ===== ЭКСПОРТ CSV =====
 
 
@@ -752,7 +1163,8 @@ async def admin_export_csv(callback: CallbackQuery):
         ])
         
         # Данные пользователей
-        users = db.get_all_active_users()
+        reader = snapshots.reader()
+        users = reader.get_all_active_users()
         for user in users:
             # Очищаем и форматируем данные
             writer.writerow([
@@ -789,6 +1201,7 @@ async def admin_export_csv(callback: CallbackQuery):
                    f"Всего пользователей: {len(users)}\n"
                    f"Дата экспорта: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
                    f"Формат: TSV (табуляция как разделитель)"
+                   f"{snapshot_note(reader)}"
         )
         
         await callback.answer("✅ Файл успешно экспортирован!")
@@ -824,36 +1237,25 @@ async def admin_export_matches_csv(callback: CallbackQuery):
         ])
         
         # Получаем все мэтчи
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT m.*, u1.name as user1_name, u2.name as user2_name
-            FROM matches m
-            LEFT JOIN users u1 ON m.user1_id = u1.user_id
-            LEFT JOIN users u2 ON m.user2_id = u2.user_id
-            ORDER BY m.created_date DESC
-        ''')
-        
-        matches = cursor.fetchall()
-        conn.close()
-        
+        reader = snapshots.reader()
+        matches = reader.get_matches_for_export()
         for match in matches:
             writer.writerow([
-                match[0],  # id
-                match[1],  # user1_id
-                match[14] if len(match) > 14 else '',  # user1_name
-                match[2],  # user2_id
-                match[15] if len(match) > 15 else '',  # user2_name
-                match[3],  # match_score
-                clean_csv_value(match[4] if len(match) > 4 else ''),  # common_interests
-                match[5] if len(match) > 5 else '',  # status
-                format_date(match[6] if len(match) > 6 else ''),  # created_date
-                format_date(match[7] if len(match) > 7 else ''),  # accepted_date
-                match[8] if len(match) > 8 else '',  # is_forced
-                match[9] if len(match) > 9 else '',  # user1_accepted
-                match[10] if len(match) > 10 else '',  # user2_accepted
-                match[11] if len(match) > 11 else '',  # chat_created
-                match[12] if len(match) > 12 else ''   # match_successful
+                match['id'],
+                match['user1_id'],
+                match.get('user1_name') or '',
+                match['user2_id'],
+                match.get('user2_name') or '',
+                match['match_score'],
+                clean_csv_value(match.get('common_interests') or ''),
+                match.get('status') or '',
+                format_date(match.get('created_date') or ''),
+                format_date(match.get('accepted_date') or ''),
+                match.get('is_forced', ''),
+                match.get('user1_accepted', ''),
+                match.get('user2_accepted', ''),
+                match.get('chat_created', ''),
+                match.get('match_successful', '')
             ])
         
         # Перемещаем указатель в начало
@@ -870,6 +1272,7 @@ async def admin_export_matches_csv(callback: CallbackQuery):
             caption=f"📊 Экспорт данных мэтчей\n\n"
                    f"Всего мэтчей: {len(matches)}\n"
                    f"Дата экспорта: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
+                   f"{snapshot_note(reader)}"
         )
         
         await callback.answer("✅ Файл мэтчей успешно экспортирован!")
@@ -884,15 +1287,31 @@ async def admin_export_matches_csv(callback: CallbackQuery):
 
 # ===== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ =====
 
-async def send_match_proposal(bot: Bot, user_id: int, partner: dict, match_id: int):
+async def send_match_proposal(bot: Bot, user_id: int, proposal: dict):
     """Отправляет предложение мэтча пользователю"""
     try:
         from handlers.matching import send_match_proposal as send_proposal
-        return await send_proposal(bot, user_id, partner, match_id)
+        with send_priority(TRANSACTIONAL):
+            return await send_proposal(bot, user_id, proposal)
     except Exception as e:
         logger.error(f"Error in admin match proposal: {e}")
         return False
 
+
+async def notify_pending_users(bot: Bot) -> dict:
+    """Рассылает предложения после раунда и возвращает статистику доставки"""
+    try:
+        from handlers.matching import notify_pending_users as notify_users
+        return await notify_users(bot)
+    except Exception as e:
+        logger.error(f"Error in admin round notifications: {e}")
+        return {'notified': 0, 'deactivated': 0, 'wasted_matches': 0}
+
+
+def format_round_report(matches_count: int, stats: dict) -> str:
+    from handlers.matching import format_round_report as format_report
+    return format_report(matches_count, stats, match_maker.last_pool_sizes)
+
 # ===== ВОЗВРАТ В ГЛАВНОЕ МЕНЮ =====
 
 
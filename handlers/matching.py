@@ -3,9 +3,9 @@ from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.filters import Command
 from config import Config
 import logging
-import json
 import asyncio
 import csv
+from functools import lru_cache
 import io
 from datetime import datetime
 
@@ -18,6 +18,9 @@ from utils.keyboards import (
     get_admin_management_inline
 )
 from services.matcher import MatchMaker
+from services.notifications import NotificationSpreader
+from services.outbound import BULK, TRANSACTIONAL, send_priority
+from utils.delivery import DELIVERED, RETRY, UNREACHABLE, classify_delivery_error
 
 router = Router()
 db = Database()
@@ -30,85 +33,105 @@ def is_admin(user_id: int) -> bool:
     return user_id in Config.ADMIN_IDS
 
 
-async def send_match_proposal(bot: Bot, user_id: int, partner: dict, match_id: int):
-    """Отправляет предложение мэтча пользователю"""
+@lru_cache(maxsize=4096)
+def get_match_decision_markup(match_id: int, linkedin_url: str = None):
+    """Кнопки решения по мэтчу, собранные один раз на мэтч"""
+    return get_match_decision_inline(match_id, linkedin_url)
+
+
+async def deliver_match_proposal(bot: Bot, user_id: int, proposal: dict):
+    """Отправляет предложение и учитывает неудачу доставки.
+
+    Возвращает (исход, освобожденные мэтчи): если пользователь недоступен
+    и был отключен, второе значение - число отмененных мэтчей, иначе None.
+    Успешные доставки вызывающий сбрасывает пакетом (record_delivery_success).
+    """
     try:
-        # Получаем полную информацию о мэтче для common_interests
-        match_info = None
-        try:
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT common_interests, is_forced FROM matches WHERE id = ?
-            ''', (match_id,))
-            row = cursor.fetchone()
-            if row:
-                match_info = {
-                    'common_interests': row[0],
-                    'is_forced': bool(row[1])
-                }
-            conn.close()
-        except Exception as e:
-            logger.error(f"Error getting match info: {e}")
-        
-        common_text = "случайное знакомство"
-        if match_info and match_info['common_interests']:
-            try:
-                common_interests = json.loads(match_info['common_interests'])
-                if common_interests and common_interests != ["случайное знакомство"]:
-                    common_text = ", ".join(common_interests)
-            except:
-                pass
-        
-        forced_text = " 🎯" if match_info and match_info.get('is_forced') else ""
-        
-        message_text = (
-            f"🎯 Найден потенциальный собеседник{forced_text}!\n\n"
-            f"👤 Имя: {partner['name']}\n"
-            f"🏙 Город: {partner.get('city', 'не указан')}\n"
-            f"💼 Профессия: {partner.get('profession', 'не указана')}\n"
-            f"🎯 Цели: {partner.get('goals', 'не указаны')}\n"
-            f"📝 О себе: {partner.get('about', 'не указано')}\n\n"
-            f"✨ Совпадения: {common_text}\n"
-            f"🔗 Предпочтительный канал для связи: {partner.get('contact_preference', 'не указаны')}\n\n"
-            f"Изучите информацию и LinkedIn профиль, затем примите решение:"
-        )
-        
         await bot.send_message(
             user_id,
-            message_text,
-            reply_markup=get_match_decision_inline(match_id, partner.get('linkedin_url'))
+            proposal['proposal_text'],
+            reply_markup=get_match_decision_markup(
+                proposal['match_id'], proposal['partner'].get('linkedin_url')
+            )
         )
-        return True
+        return DELIVERED, None
     except Exception as e:
-        logger.error(f"Error sending match proposal to {user_id}: {e}")
-        return False
+        outcome = classify_delivery_error(e)
+        logger.error(f"Error sending match proposal to {user_id} ({outcome}): {e}")
+        if outcome == RETRY:
+            return outcome, None
+        return outcome, db.record_delivery_failure(user_id, unreachable=outcome == UNREACHABLE)
 
-def get_match_info_from_db(match_id: int):
-    """Получает информацию о мэтче напрямую из базы"""
-    try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT m.*, u1.name as user1_name, u2.name as user2_name,
-                   u1.username as user1_username, u2.username as user2_username,
-                   u1.linkedin_url as user1_linkedin, u2.linkedin_url as user2_linkedin
-            FROM matches m
-            LEFT JOIN users u1 ON m.user1_id = u1.user_id
-            LEFT JOIN users u2 ON m.user2_id = u2.user_id
-            WHERE m.id = ?
-        ''', (match_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, row))
-        return None
-    except Exception as e:
-        logger.error(f"Error getting match info: {e}")
-        return None
+async def send_match_proposal(bot: Bot, user_id: int, proposal: dict):
+    """Отправляет пользователю готовое предложение мэтча из inbox"""
+    outcome, _ = await deliver_match_proposal(bot, user_id, proposal)
+    if outcome == DELIVERED:
+        db.record_delivery_success([user_id])
+    return outcome == DELIVERED
+
+async def send_inbox_proposals(bot: Bot, user_id: int) -> int:
+    """Отправляет пользователю все предложения из его inbox, возвращает число отправленных"""
+    sent_count = 0
+    for proposal in db.get_match_inbox(user_id):
+        outcome, freed = await deliver_match_proposal(bot, user_id, proposal)
+        if outcome == DELIVERED:
+            sent_count += 1
+        elif freed is not None:
+            break
+    if sent_count:
+        db.record_delivery_success([user_id])
+    return sent_count
+
+# Отложенная отправка предложений по окну NOTIFY_WINDOW_HOURS
+spreader = NotificationSpreader(db, send_inbox_proposals)
+
+async def notify_pending_users(bot: Bot) -> dict:
+    """Рассылает предложения всем, у кого есть pending мэтчи, и считает потери.
+
+    Недоступные пользователи отключаются, их пары отменяются (wasted_matches).
+    Если задано окно рассылки, предложения не отправляются сразу, а
+    распределяются по нему (scheduled - сколько пользователей в расписании).
+    """
+    stats = {'notified': 0, 'deactivated': 0, 'wasted_matches': 0, 'scheduled': 0}
+    if spreader.enabled:
+        stats['scheduled'] = len(spreader.schedule_pending())
+        return stats
+    
+    # Массовая отправка: ответы пользователям идут вперед нее
+    delivered = set()
+    with send_priority(BULK):
+        for user_id in sorted(db.get_users_with_pending_matches()):
+            for proposal in db.get_match_inbox(user_id):
+                outcome, freed = await deliver_match_proposal(bot, user_id, proposal)
+                if outcome == DELIVERED:
+                    stats['notified'] += 1
+                    delivered.add(user_id)
+                elif freed is not None:
+                    stats['deactivated'] += 1
+                    stats['wasted_matches'] += freed
+                    break
+    # Счетчики неудач сбрасываются одной транзакцией, а не записью на каждое сообщение
+    db.record_delivery_success(delivered)
+    return stats
+
+def format_round_report(matches_count: int, stats: dict, pool_sizes: dict = None) -> str:
+    """Отчет о раунде: пул, пары, доставка и потери на недоступных пользователях"""
+    if pool_sizes is None:
+        pool_sizes = match_maker.last_pool_sizes
+    text = f"• Пул раунда: {sum(pool_sizes.values())} пользователей\n"
+    if len(pool_sizes) > 1:
+        text += ''.join(f"   ◦ {pool}: {size}\n" for pool, size in pool_sizes.items())
+    text += f"• Создано пар: {matches_count}\n"
+    if stats.get('scheduled'):
+        text += f"• Предложения получат {stats['scheduled']} пользователей в течение {spreader.window_hours:g} ч\n"
+    else:
+        text += f"• Уведомлений отправлено: {stats['notified']}\n"
+    if stats['deactivated']:
+        text += (
+            f"• Отключено недоступных: {stats['deactivated']}\n"
+            f"• Потеряно пар: {stats['wasted_matches']}\n"
+        )
+    return text
 
 async def notify_both_accepted(bot: Bot, match_id: int):
     """Уведомляет обоих пользователей о взаимном принятии мэтча"""
@@ -131,19 +154,20 @@ async def notify_both_accepted(bot: Bot, match_id: int):
     
     # Отправляем сообщение обоим пользователям
     try:
-        await bot.send_message(user1_id, message_text, reply_markup=get_chat_created_inline(user2_id, match['user2_username']))
-        await bot.send_message(user2_id, message_text, reply_markup=get_chat_created_inline(user1_id, match['user1_username']))
-        
-        # Через 30 секунд отправляем запрос об успешности мэтча
-        await asyncio.sleep(30)
-        
-        followup_text = (
-            "📊 Как прошло ваше знакомство?\n\n"
-            "Пожалуйста, оцените успешность мэтча:"
-        )
-        
-        await bot.send_message(user1_id, followup_text, reply_markup=get_match_success_inline(match_id))
-        await bot.send_message(user2_id, followup_text, reply_markup=get_match_success_inline(match_id))
+        with send_priority(TRANSACTIONAL):
+            await bot.send_message(user1_id, message_text, reply_markup=get_chat_created_inline(user2_id, match['user2_username']))
+            await bot.send_message(user2_id, message_text, reply_markup=get_chat_created_inline(user1_id, match['user1_username']))
+            
+            # Через 30 секунд отправляем запрос об успешности мэтча
+            await asyncio.sleep(30)
+            
+            followup_text = (
+                "📊 Как прошло ваше знакомство?\n\n"
+                "Пожалуйста, оцените успешность мэтча:"
+            )
+            
+            await bot.send_message(user1_id, followup_text, reply_markup=get_match_success_inline(match_id))
+            await bot.send_message(user2_id, followup_text, reply_markup=get_match_success_inline(match_id))
         
     except Exception as e:
         logger.error(f"Error notifying users about mutual acceptance: {e}")
@@ -151,37 +175,17 @@ async def notify_both_accepted(bot: Bot, match_id: int):
 @router.message(Command("match"))
 async def manual_match(message: Message, bot: Bot):
     """Ручной запуск мэтчинга (для тестирования)"""
-    users = db.get_all_active_users()
-    
-    if len(users) < 2:
+    if db.count_active_users() < 2:
         await message.answer("Недостаточно пользователей для мэтчинга")
         return
     
     # Используем существующий метод мэтчинга
-    matches_count = match_maker.run_matching_round(force_all=True)
+    matches_count = await match_maker.run_matching_round_async(force_all=True)
     
     if matches_count > 0:
-        # Уведомляем пользователей
-        notified_count = 0
-        for user in users:
-            pending_matches = db.get_pending_matches(user['user_id'])
-            if pending_matches:
-                try:
-                    for match in pending_matches:
-                        if match['user1_id'] == user['user_id']:
-                            partner_id = match['user2_id']
-                        else:
-                            partner_id = match['user1_id']
-                        
-                        partner = db.get_user(partner_id)
-                        if partner:
-                            success = await send_match_proposal(bot, user['user_id'], partner, match['id'])
-                            if success:
-                                notified_count += 1
-                except Exception as e:
-                    logger.error(f"Error notifying user {user['user_id']}: {e}")
+        stats = await notify_pending_users(bot)
         
-        await message.answer(f"Мэтчинг завершен! Создано {matches_count} пар, отправлено {notified_count} уведомлений")
+        await message.answer("Мэтчинг завершен!\n\n" + format_round_report(matches_count, stats))
     else:
         await message.answer("Не удалось создать пары")
 
@@ -199,24 +203,17 @@ async def find_match(callback: CallbackQuery, bot: Bot):
         await callback.answer()
         return
     
-    # Ищем pending мэтчи
-    pending_matches = db.get_pending_matches(user_id)
+    # Ищем pending мэтчи в inbox пользователя
+    inbox = db.get_match_inbox(user_id)
     
-    if pending_matches:
+    if inbox:
+        # Пользователь пришел сам - отложенная отправка тех же предложений не нужна
+        db.cancel_scheduled_notification(user_id)
         sent_count = 0
-        for match in pending_matches:
-            # Определяем кто собеседник
-            if match['user1_id'] == user_id:
-                partner_id = match['user2_id']
-            else:
-                partner_id = match['user1_id']
-            
-            partner = db.get_user(partner_id)
-            
-            if partner:
-                success = await send_match_proposal(bot, user_id, partner, match['id'])
-                if success:
-                    sent_count += 1
+        for proposal in inbox:
+            success = await send_match_proposal(bot, user_id, proposal)
+            if success:
+                sent_count += 1
         
         if sent_count > 0:
             await callback.answer(f"🔍 Найдено {sent_count} новых предложений!")
@@ -241,54 +238,36 @@ async def accept_match(callback: CallbackQuery, bot: Bot):
     match_id = int(callback.data.split("_")[1])
     user_id = callback.from_user.id
     
-    # Сначала получаем информацию о мэтче ДО обновления статуса
-    match_info = get_match_info_from_db(match_id)
+    # Один атомарный переход: возвращает новое состояние мэтча
+    match = db.update_match_acceptance(match_id, user_id, True)
     
-    if not match_info:
+    if not match:
         await callback.message.edit_text(
-            "❌ Ошибка: информация о мэтче не найдена",
+            "❌ Мэтч не найден или уже закрыт",
             reply_markup=get_main_menu_inline()
         )
         await callback.answer()
         return
     
-    # Обновляем статус принятия пользователем
-    success = db.update_match_acceptance(match_id, user_id, True)
-    
-    if success:
-        # Логируем действие
-        db.log_user_action(user_id, "accepted_match", 
-                          match_info['user2_id'] if user_id == match_info['user1_id'] else match_info['user1_id'])
-        
-        # Проверяем, приняли ли оба пользователя
-        updated_match = db.get_match(match_id)
-        if updated_match and updated_match.get('chat_created'):
-            # Оба приняли - уведомляем их
-            await callback.message.edit_text(
-                "✅ Ты принял приглашение! Ожидаем решения собеседника...\n\n"
-                "Как только оба примут мэтч, вы сможете начать общение! 🚀"
-            )
-            
-            # Уведомляем обоих о взаимном принятии
-            await notify_both_accepted(bot, match_id)
-        else:
-            await callback.message.edit_text(
-                "✅ Ты принял приглашение! Ожидаем решения собеседника...\n\n"
-                "Как только оба примут мэтч, вы сможете начать общение! 🚀"
-            )
-    else:
-        await callback.message.edit_text(
-            "❌ Ошибка при принятии мэтча",
-            reply_markup=get_main_menu_inline()
-        )
+    # Логируем действие
+    db.log_user_action(user_id, "accepted_match",
+                      match['user2_id'] if user_id == match['user1_id'] else match['user1_id'])
     
+    await callback.message.edit_text(
+        "✅ Ты принял приглашение! Ожидаем решения собеседника...\n\n"
+        "Как только оба примут мэтч, вы сможете начать общение! 🚀"
+    )
     await callback.answer()
+    
+    # Событие "оба приняли" приходит ровно одному нажатию
+    if match['both_accepted']:
+        await notify_both_accepted(bot, match_id)
 
 @router.callback_query(F.data.startswith("reject_"))
 async def reject_match(callback: CallbackQuery):
     match_id = int(callback.data.split("_")[1])
     
-    db.update_match_status(match_id, "rejected")
+    db.update_match_status(match_id, "rejected", callback.from_user.id)
     await callback.message.edit_text(
         "❌ Хорошо, предложение отклонено. Жди следующих мэтчей!",
         reply_markup=get_main_menu_inline()
@@ -348,13 +327,13 @@ async def check_status(message: Message):
         await message.answer("❌ Профиль не заполнен. Заверши регистрацию через /start")
         return
     
-    pending_matches = db.get_pending_matches(user_id)
+    pending_matches = db.get_match_inbox(user_id)
     stats = db.get_user_stats()
     
     status_text = (
         f"📊 Твой статус:\n\n"
         f"👤 Имя: {user.get('name', 'Не указано')}\n"
-        f"💫 Успешных мэтчей: {user.get('matches_count', 0)}\n"
+        f"💫 Успешных мэтчей: {user.get('matches_successful', 0)}\n"
         f"🔍 Ожидающих предложений: {len(pending_matches)}\n\n"
         f"📈 По системе:\n"
         f"• Пользователей: {stats.get('total_users', 0)}\n"
@@ -32,7 +32,7 @@ async def show_profile(callback: CallbackQuery):
         f"🎯 Цели: {user.get('goals', 'Не указаны')}\n"
         f"📖 О себе: {user.get('about', 'Не указано')}\n"
         f"📞 Контакты: {user.get('contact_preference', 'Не указаны')}\n\n"
-        f"💫 Успешных мэтчей: {user.get('matches_count', 0)}\n"
+        f"💫 Успешных мэтчей: {user.get('matches_successful', 0)}\n"
     )
     
     await callback.message.edit_text(
@@ -113,7 +113,7 @@ async def show_profile_message(message: Message):
         f"🎯 Цели: {user.get('goals', 'Не указаны')}\n"
         f"📖 О себе: {user.get('about', 'Не указано')}\n"
         f"📞 Контакты: {user.get('contact_preference', 'Не указаны')}\n\n"
-        f"💫 Успешных мэтчей: {user.get('matches_count', 0)}\n"
+        f"💫 Успешных мэтчей: {user.get('matches_successful', 0)}\n"
     )
     
     await message.answer(
@@ -208,16 +208,11 @@ async def toggle_active(callback: CallbackQuery):
     
     new_status = not user.get('is_active', True)
     
+    if not db.set_user_active(user_id, new_status):
+        await callback.answer("Ошибка при изменении статуса")
+        return
+    
     try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE users SET is_active = ? WHERE user_id = ?",
-            (new_status, user_id)
-        )
-        conn.commit()
-        conn.close()
-        
         status_text = "неактивен" if new_status else "активен"
         await callback.answer(f"Статус изменен: теперь ты {status_text}")
         
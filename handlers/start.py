@@ -1,6 +1,6 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 
 from database import Database
@@ -14,16 +14,25 @@ logger = logging.getLogger(__name__)
 router = Router()
 db = Database()
 
+
+def parse_pool(payload: str = None):
+    """Ключ пула из ссылки t.me/<бот>?start=pool_<ключ>; неизвестные пулы игнорируются"""
+    if not payload or not payload.startswith("pool_"):
+        return None
+    pool = payload[len("pool_"):]
+    return pool if pool in Config.MATCHING_POOLS else None
+
+
 @router.message(Command("start"))
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, command: CommandObject):
     user_id = message.from_user.id
     username = message.from_user.username
     
     # Очищаем состояние
     await state.clear()
     
-    # Добавляем/обновляем пользователя в базе
-    db.add_user(user_id, username)
+    # Добавляем/обновляем пользователя в базе; ссылка сообщества переводит в его пул
+    db.add_user(user_id, username, pool=parse_pool(command.args))
     
     # Получаем данные пользователя
     user = db.get_user(user_id)
@@ -41,19 +50,6 @@ async def cmd_start(message: Message, state: FSMContext):
         )
         await state.set_state(RegistrationStates.waiting_name)
     else:
-        # Обновляем last_active
-        try:
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET last_active = ? WHERE user_id = ?",
-                (message.date.isoformat(), user_id)
-            )
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logger.error(f"Error updating last_active: {e}")
-        
         # ПОСЛЕ заполнения профиля показываем обычное меню для всех
         await message.answer(
             "🎉 С возвращением! Выбери действие:",
@@ -86,19 +82,6 @@ async def back_to_main(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     user_id = callback.from_user.id
     
-    # Обновляем last_active
-    try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE users SET last_active = ? WHERE user_id = ?",
-            (callback.message.date.isoformat(), user_id)
-        )
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        logger.error(f"Error updating last_active: {e}")
-    
     # Проверяем права админа для отображения правильного меню
     if user_id in Config.ADMIN_IDS:
         await callback.message.edit_text(
@@ -1,52 +1,92 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from datetime import datetime
 
 from config import Config
-from database import Database
-from services.matcher import MatchMaker
-
-# Import handlers
-from handlers.start import router as start_router
-from handlers.registration import router as registration_router
-from handlers.matching import router as matching_router
-from handlers.profile import router as profile_router
-from handlers.admin import router as admin_router
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from services.outbound import outbound
+from services.telegram_session import TelegramSession
+
 logger = logging.getLogger(__name__)
 
-# Initialize bot and dispatcher
-bot = Bot(token=Config.BOT_TOKEN)
-dp = Dispatcher()
+def create_dispatcher() -> Dispatcher:
+    """Dispatcher с роутерами, middleware и фоновыми службами бота.
 
-# Register routers
-dp.include_router(start_router)
-dp.include_router(registration_router)
-dp.include_router(matching_router)
-dp.include_router(profile_router)
-dp.include_router(admin_router)
+    Собирается здесь, а не при импорте: процессы параллельного скоринга
+    (forkserver) импортируют main.py как __mp_main__, и им не нужны ни
+    роутеры, ни Database() с ее соединением. Бот создается в main(),
+    replay_updates.py подставляет свой.
+    """
+    from database import Database
+    from middlewares.throttling import throttling
+    from middlewares.activity import ActivityMiddleware
+    from middlewares.capture import UpdateCapture
 
-# Initialize database and services
-db = Database()
-match_maker = MatchMaker(db)
+    # Import handlers
+    from handlers.start import router as start_router
+    from handlers.registration import router as registration_router
+    from handlers.matching import router as matching_router, spreader
+    from handlers.profile import router as profile_router
+    from handlers.admin import router as admin_router, broadcaster, snapshots, maintenance
 
-async def on_startup():
-    """Действия при запуске бота"""
-    logger.info("Bot started!")
-    logger.info("Автоматическое расписание отключено. Используйте админ-панель для ручного запуска мэтчинга.")
+    dp = Dispatcher()
 
-async def on_shutdown():
-    """Действия при остановке бота"""
-    logger.info("Bot stopped!")
+    # Register routers
+    dp.include_router(start_router)
+    dp.include_router(registration_router)
+    dp.include_router(matching_router)
+    dp.include_router(profile_router)
+    dp.include_router(admin_router)
+
+    # Initialize database and services
+    db = Database()
+    activity = ActivityMiddleware(db)
+    capture = UpdateCapture()
+
+    # Register middlewares
+    if capture.enabled:
+        dp.update.outer_middleware(capture)
+    # Активность отмечается до антиспама: склеенные и отклоненные апдейты тоже считаются
+    dp.message.outer_middleware(activity)
+    dp.callback_query.outer_middleware(activity)
+    dp.message.outer_middleware(throttling)
+    dp.callback_query.outer_middleware(throttling)
+
+    async def on_startup(bot: Bot):
+        """Действия при запуске бота"""
+        logger.info("Bot started!")
+        db.action_log.start()
+        activity.start()
+        broadcaster.resume(bot)
+        spreader.start(bot)
+        snapshots.start()
+        maintenance.start()
+        logger.info("Автоматическое расписание отключено. Используйте админ-панель для ручного запуска мэтчинга.")
+
+    async def on_shutdown():
+        """Действия при остановке бота"""
+        await broadcaster.stop()
+        await spreader.close()
+        await snapshots.close()
+        await maintenance.close()
+        await activity.close()
+        await outbound.close()
+        await db.action_log.close()
+        capture.close()
+        logger.info("Bot stopped!")
 
-async def main():
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
-    
+    return dp
+
+async def main():
+    dp = create_dispatcher()
+    # Общая сессия с пулом keep-alive соединений к API
+    bot = Bot(token=Config.BOT_TOKEN, session=TelegramSession())
+    # Все запросы к API идут через общую очередь с приоритетами
+    bot.session.middleware(outbound)
     await dp.start_polling(bot)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # Configure logging
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
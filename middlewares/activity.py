@@ -0,0 +1,73 @@
+import asyncio
+import datetime
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """Отслеживание last_active без записи в БД на каждый апдейт.
+
+    Время последнего действия пользователя запоминается в памяти; фоновая
+    задача раз в flush_interval секунд пишет накопленное одним UPDATE-пакетом
+    в отдельном потоке, не занимая event loop.
+    """
+
+    def __init__(self, db, flush_interval: float = None):
+        self.db = db
+        self.flush_interval = flush_interval or Config.ACTIVITY_FLUSH_INTERVAL
+        self._dirty: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = getattr(event, 'from_user', None)
+        if user is not None:
+            with self._lock:
+                self._dirty[user.id] = datetime.datetime.now().isoformat()
+        return await handler(event, data)
+
+    def flush(self) -> int:
+        with self._lock:
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, {}
+        if not self.db.update_last_active(dirty):
+            # Не записалось - вернем, более свежие отметки не затираем
+            with self._lock:
+                for user_id, timestamp in dirty.items():
+                    self._dirty.setdefault(user_id, timestamp)
+            return 0
+        return len(dirty)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        flushed = await asyncio.to_thread(self.flush)
+        logger.info(f"Activity tracker closed, flushed {flushed} users")
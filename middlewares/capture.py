@@ -0,0 +1,141 @@
+import hashlib
+import hmac
+import json
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import Config
+from utils.keyboards import get_main_menu_keyboard
+
+logger = logging.getLogger(__name__)
+
+# Числа такой длины в callback_data - идентификаторы пользователей, а не мэтчей
+USER_ID_PATTERN = re.compile(r'\d{7,}')
+# Сколько записей копить перед сбросом на диск
+FLUSH_EVERY = 100
+# Подписи кнопок reply-клавиатуры: их тексты пишутся как есть, остальное маскируется
+KEYBOARD_LABELS = frozenset(
+    button.text for row in get_main_menu_keyboard().keyboard for button in row
+)
+
+
+class UpdateCapture(BaseMiddleware):
+    """Запись входящих апдейтов для воспроизведения (replay_updates.py).
+
+    Каждый апдейт дописывается в файл строкой JSON [время, апдейт]. При
+    anonymize идентификаторы пользователей и чатов заменяются стабильными
+    псевдонимами (HMAC с солью), имена и username - заглушками, в текстах
+    буквы и цифры маскируются с сохранением длины. Команды, подписи кнопок из
+    utils/keyboards.py (точное совпадение) и id администраторов сохраняются,
+    чтобы при воспроизведении апдейты шли по тем же обработчикам.
+
+    Запись синхронная, прямо в event loop на каждый апдейт: это
+    диагностический режим на время снятия нагрузки, не для постоянной работы.
+    """
+
+    def __init__(self, path: str = None, anonymize: bool = None, salt: str = None):
+        self.path = Config.CAPTURE_UPDATES_PATH if path is None else path
+        self.anonymize = Config.CAPTURE_ANONYMIZE if anonymize is None else anonymize
+        self._salt = (salt or Config.CAPTURE_SALT or Config.BOT_TOKEN or '').encode()
+        self._file = None
+        self._pending = 0
+        self.captured = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if self.enabled:
+            self.record(event, time.time())
+        return await handler(event, data)
+
+    def record(self, update: TelegramObject, timestamp: float):
+        try:
+            payload = update.model_dump(mode='json', by_alias=True, exclude_none=True)
+            if self.anonymize:
+                payload = self._scrub(payload)
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps([round(timestamp, 3), payload], ensure_ascii=False, separators=(',', ':')))
+            self._file.write('\n')
+            self.captured += 1
+            self._pending += 1
+            if self._pending >= FLUSH_EVERY:
+                self._file.flush()
+                self._pending = 0
+        except Exception as e:
+            logger.error(f"Error capturing update: {e}")
+
+    def pseudonym(self, value: int) -> int:
+        if value in Config.ADMIN_IDS:
+            return value
+        digest = hmac.new(self._salt, str(abs(value)).encode(), hashlib.sha256).hexdigest()
+        alias = 10 ** 9 + int(digest[:12], 16) % 10 ** 12
+        return -alias if value < 0 else alias
+
+    def _mask(self, text: str) -> str:
+        if text.startswith('/'):
+            command, _, rest = text.partition(' ')
+            return f"{command} {self._mask_words(rest)}" if rest else command
+        # Короткое число - ответ на вопрос о возрасте, его проверяет регистрация
+        if text in KEYBOARD_LABELS or (text.isdigit() and len(text) <= 3):
+            return text
+        return self._mask_words(text)
+
+    def _mask_words(self, text: str) -> str:
+        words = []
+        for word in text.split(' '):
+            if 'linkedin.com' in word:
+                words.append('https://www.linkedin.com/in/anonymous')
+            elif USER_ID_PATTERN.fullmatch(word):
+                words.append(str(self.pseudonym(int(word))))
+            else:
+                words.append(''.join(
+                    'x' if char.isalpha() else '0' if char.isdigit() else char for char in word
+                ))
+        return ' '.join(words)
+
+    def _scrub(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self._scrub(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        # User или Chat
+        is_account = isinstance(value.get('id'), int) and ('first_name' in value or 'type' in value)
+        scrubbed = {}
+        for key, item in value.items():
+            if is_account and key == 'id':
+                scrubbed[key] = self.pseudonym(item)
+            elif key == 'username':
+                scrubbed[key] = f"user{abs(self.pseudonym(value.get('id', 0))) % 10 ** 8}"
+            elif key in ('first_name', 'last_name', 'title') and isinstance(item, str):
+                scrubbed[key] = ''.join('x' if char.isalpha() else char for char in item)
+            elif key in ('text', 'caption') and isinstance(item, str):
+                scrubbed[key] = self._mask(item)
+            elif key == 'data' and isinstance(item, str):
+                scrubbed[key] = USER_ID_PATTERN.sub(lambda m: str(self.pseudonym(int(m.group()))), item)
+            elif key in ('user_id', 'chat_id') and isinstance(item, int):
+                scrubbed[key] = self.pseudonym(item)
+            elif key in ('phone_number', 'vcard', 'location', 'venue'):
+                continue
+            else:
+                scrubbed[key] = self._scrub(item)
+        return scrubbed
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Update capture closed, {self.captured} updates in {self.path}")
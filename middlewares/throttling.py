@@ -0,0 +1,114 @@
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Защита от спама кнопками и лимит апдейтов на пользователя.
+
+    Одинаковые нажатия (тот же пользователь и тот же callback_data) склеиваются:
+    пока первое обрабатывается и еще window секунд после него повторы только
+    получают пустой answer(). Сверх rate_limit апдейтов за rate_period секунд
+    пользователь получает короткое предупреждение, до хендлеров дело не доходит.
+    """
+
+    def __init__(self, window: float = None, rate_limit: int = None, rate_period: float = None):
+        self.window = Config.THROTTLE_CALLBACK_WINDOW if window is None else window
+        self.rate_limit = Config.THROTTLE_RATE_LIMIT if rate_limit is None else rate_limit
+        self.rate_period = Config.THROTTLE_RATE_PERIOD if rate_period is None else rate_period
+
+        self._in_flight = set()
+        self._recent: Dict[Tuple[int, str], float] = {}
+        self._history: Dict[int, deque] = {}
+        self._last_cleanup = time.monotonic()
+        self.counters = Counter()
+
+    def _cleanup(self, now: float):
+        """Забываем пользователей и нажатия, вышедшие за окна"""
+        if now - self._last_cleanup < max(self.rate_period, self.window):
+            return
+        self._last_cleanup = now
+        self._recent = {key: ts for key, ts in self._recent.items() if now - ts < self.window}
+        self._history = {
+            user_id: hits for user_id, hits in self._history.items()
+            if hits and now - hits[-1] < self.rate_period
+        }
+
+    def _rate_limited(self, user_id: int, now: float) -> bool:
+        if not self.rate_limit:
+            return False
+        hits = self._history.setdefault(user_id, deque())
+        while hits and now - hits[0] >= self.rate_period:
+            hits.popleft()
+        if len(hits) >= self.rate_limit:
+            return True
+        hits.append(now)
+        return False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = getattr(event, 'from_user', None)
+        if user is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        self._cleanup(now)
+
+        key = None
+        if isinstance(event, CallbackQuery) and event.data:
+            key = (user.id, event.data)
+            finished = self._recent.get(key)
+            if key in self._in_flight or (finished is not None and now - finished < self.window):
+                self.counters['coalesced'] += 1
+                await self._answer(event)
+                return None
+
+        if self._rate_limited(user.id, now):
+            self.counters['throttled'] += 1
+            await self._answer(event, "⏳ Слишком часто, подождите немного")
+            return None
+
+        self.counters['handled'] += 1
+        if key is None:
+            return await handler(event, data)
+
+        self._in_flight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight.discard(key)
+            self._recent[key] = time.monotonic()
+
+    @staticmethod
+    async def _answer(event: TelegramObject, text: str = None):
+        try:
+            if isinstance(event, CallbackQuery):
+                await event.answer(text)
+            elif isinstance(event, Message) and text:
+                await event.answer(text)
+        except Exception as e:
+            logger.debug(f"Error answering throttled update: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'handled': self.counters['handled'],
+            'coalesced': self.counters['coalesced'],
+            'throttled': self.counters['throttled'],
+            'tracked_users': len(self._history),
+        }
+
+
+# Один экземпляр на процесс: регистрируется в main.py, счетчики читает админка
+throttling = ThrottlingMiddleware()
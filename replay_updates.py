@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import typing
+from collections import Counter
+from typing import List, Tuple
+
+# Воспроизведение апдейтов, записанных UpdateCapture (CAPTURE_UPDATES_PATH),
+# через настоящий Dispatcher с роутерами и middleware из main.py.
+# Запросы к Telegram уходят в поддельную сессию, база - временная копия.
+#
+#   python replay_updates.py updates.jsonl                  # в реальном темпе
+#   python replay_updates.py updates.jsonl --speed 10       # в 10 раз быстрее
+#   python replay_updates.py updates.jsonl --speed max --database backups/random_coffee-....db
+
+
+def parse_speed(value: str) -> float:
+    """Множитель скорости; max (или 0) - без пауз между апдейтами"""
+    if value == 'max':
+        return 0.0
+    speed = float(value)
+    if speed < 0:
+        raise argparse.ArgumentTypeError("скорость не может быть отрицательной")
+    return speed
+
+
+def load_updates(path: str) -> List[Tuple[float, dict]]:
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                timestamp, update = json.loads(line)
+                records.append((timestamp, update))
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def prepare_environment(args, workdir: str):
+    """Окружение до импорта config: временная БД, без записи апдейтов и фоновых копий"""
+    database = os.path.join(workdir, 'replay.db')
+    if args.database:
+        if '://' in args.database:
+            database = args.database
+        else:
+            shutil.copy(args.database, database)
+    os.environ['DATABASE_URL'] = database
+    os.environ['ARCHIVE_DB_PATH'] = os.path.join(workdir, 'replay_archive.db')
+    os.environ['BACKUP_DIR'] = os.path.join(workdir, 'backups')
+    os.environ['BACKUP_INTERVAL_MINUTES'] = '0'
+    os.environ['MAINTENANCE_HOUR'] = '-1'
+    os.environ['CAPTURE_UPDATES_PATH'] = ''
+    if args.no_limit:
+        os.environ['OUTBOUND_RATE'] = '1000000'
+        os.environ['OUTBOUND_BURST'] = '1000000'
+
+
+def update_sender(update: dict):
+    """Отправитель апдейта: его апдейты обрабатываются строго по порядку"""
+    for event in update.values():
+        if isinstance(event, dict):
+            sender = event.get('from') or event.get('chat') or {}
+            return sender.get('id')
+    return None
+
+
+def percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+async def replay(args):
+    from aiogram import Bot
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Chat, Message, Update, User
+
+    import main as app
+    from storage.base import query_metrics
+
+    class ReplaySession(BaseSession):
+        """Сессия без сети: отвечает правдоподобными объектами с задержкой latency"""
+
+        def __init__(self, latency: float):
+            super().__init__()
+            self.latency = latency
+            self.calls = Counter()
+            self._message_id = 0
+
+        def fake_result(self, bot, method):
+            returning = method.__returning__
+            options = typing.get_args(returning) or (returning,)
+            if Message in options:
+                self._message_id += 1
+                chat_id = getattr(method, 'chat_id', None)
+                return Message(
+                    message_id=self._message_id,
+                    date=datetime.datetime.now(),
+                    chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type='private'),
+                    text=getattr(method, 'text', None),
+                ).as_(bot)
+            if User in options:
+                return User(id=bot.id, is_bot=True, first_name='Replay')
+            if bool in options:
+                return True
+            if typing.get_origin(returning) is list:
+                return []
+            return returning.model_construct() if hasattr(returning, 'model_construct') else None
+
+        async def make_request(self, bot, method, timeout=None):
+            self.calls[type(method).__name__] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self.fake_result(bot, method)
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b''
+
+        async def close(self):
+            pass
+
+    records = load_updates(args.file)
+    if not records:
+        print("❌ В файле нет апдейтов")
+        sys.exit(1)
+
+    session = ReplaySession(args.latency / 1000)
+    bot = Bot(token='42:REPLAY', session=session)
+    bot.session.middleware(app.outbound)
+    dp = app.create_dispatcher()
+
+    durations = []
+    errors = Counter()
+    lag = []
+
+    async def feed(update: dict, previous: asyncio.Task = None):
+        if previous is not None:
+            await asyncio.wait([previous])
+        started = time.monotonic()
+        try:
+            await dp.feed_update(bot, Update.model_validate(update, context={'bot': bot}))
+        except Exception as e:
+            errors[type(e).__name__] += 1
+        durations.append(time.monotonic() - started)
+
+    await dp.emit_startup(bot=bot)
+    first = records[0][0]
+    started = time.monotonic()
+    tasks = []
+    last_task = {}
+    for timestamp, update in records:
+        if args.speed:
+            due = started + (timestamp - first) / args.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                lag.append(-delay)
+        sender = update_sender(update)
+        task = asyncio.create_task(feed(update, last_task.get(sender)))
+        if sender is not None:
+            last_task[sender] = task
+        tasks.append(task)
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+    outbound_stats = app.outbound.stats()
+    await dp.emit_shutdown(bot=bot)
+
+    print(f"Апдейтов: {len(records)} за {elapsed:.1f} сек "
+          f"(в записи {records[-1][0] - first:.1f} сек), {len(records) / elapsed:.1f}/сек")
+    print(f"Обработка: среднее {sum(durations) * 1000 / len(durations):.1f} мс, "
+          f"p95 {percentile(durations, 0.95) * 1000:.1f} мс, max {max(durations) * 1000:.1f} мс")
+    if lag:
+        print(f"Отставание от записи: {len(lag)} апдейтов, max {max(lag) * 1000:.0f} мс")
+    if errors:
+        print("Ошибки: " + ", ".join(f"{name} ×{count}" for name, count in errors.most_common()))
+    print(f"Запросы к API: {sum(session.calls.values())}")
+    for name, count in session.calls.most_common():
+        print(f"   • {name}: {count}")
+    for name, class_stats in outbound_stats.items():
+        if class_stats['sent']:
+            print(f"Очередь {name}: {class_stats['sent']}, ожидание {class_stats['avg_wait_ms']:.0f} мс")
+    query_stats = {**query_metrics.totals(), 'top': query_metrics.top(5)}
+    print(f"Запросы к БД: {query_stats['calls']} ({query_stats['total_ms']:.0f} мс)")
+    for query in query_stats['top']:
+        print(f"   • {query['calls']}× {query['total_ms']:.0f} мс: {query['statement'][:70]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных апдейтов")
+    parser.add_argument('file', help="файл записи (CAPTURE_UPDATES_PATH)")
+    parser.add_argument('--speed', type=parse_speed, default=1.0, help="множитель темпа или max")
+    parser.add_argument('--database', help="копия БД SQLite (не изменяется) или URL PostgreSQL; по умолчанию пустая")
+    parser.add_argument('--latency', type=float, default=50, help="задержка ответа поддельного API, мс")
+    parser.add_argument('--no-limit', action='store_true', help="не ограничивать скорость исходящих запросов")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"❌ Файл {args.file} не найден")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory(prefix='replay-') as workdir:
+        prepare_environment(args, workdir)
+        logging.basicConfig(level=logging.INFO)
+        asyncio.run(replay(args))
+
+
+if __name__ == "__main__":
+    main()
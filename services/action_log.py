@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ActionLogWriter:
+    """Буфер событий user_actions с пакетной записью.
+
+    Событие кладется в кольцевой буфер в памяти; фоновая задача сбрасывает
+    его одной транзакцией по размеру пакета или по таймеру. Если буфер
+    заполнен до предела, запись выполняется прямо в вызывающем коде -
+    это и есть backpressure. Если запись не удалась, события возвращаются
+    в буфер; при недоступной БД сверх max_pending самые новые отбрасываются
+    (с предупреждением в логе и счетчиком dropped_total), а не копятся
+    в памяти без предела.
+    """
+
+    _writers: Dict[str, 'ActionLogWriter'] = {}
+
+    def __init__(self, write_rows: Callable[[List[tuple]], bool],
+                 batch_size: int = None, max_pending: int = None, flush_interval: float = None):
+        self._write_rows = write_rows
+        self.batch_size = batch_size or Config.ACTION_LOG_BATCH_SIZE
+        self.max_pending = max_pending or Config.ACTION_LOG_MAX_PENDING
+        self.flush_interval = flush_interval or Config.ACTION_LOG_FLUSH_INTERVAL
+
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushed_total = 0
+        self.inline_flushes = 0
+        self.dropped_total = 0
+
+    @classmethod
+    def for_database(cls, db_path: str, write_rows: Callable[[List[tuple]], bool]) -> 'ActionLogWriter':
+        """Один буфер на файл БД, общий для всех экземпляров Database"""
+        if db_path not in cls._writers:
+            cls._writers[db_path] = cls(write_rows)
+        return cls._writers[db_path]
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def add(self, row: tuple):
+        with self._lock:
+            self._buffer.append(row)
+            pending = len(self._buffer)
+
+        if pending >= self.max_pending or (self._task is None and pending >= self.batch_size):
+            # Фоновая задача не успевает (или не запущена) - пишем сами
+            self.inline_flushes += 1
+            self.flush()
+        elif pending >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Записывает все накопленные события одной транзакцией"""
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._buffer)
+                self._buffer.clear()
+            if not rows:
+                return 0
+
+            if not self._write_rows(rows):
+                # Возвращаем события в начало буфера, лишнее сверх лимита отбрасываем
+                with self._lock:
+                    self._buffer.extendleft(reversed(rows))
+                    dropped = max(0, len(self._buffer) - self.max_pending)
+                    for _ in range(dropped):
+                        self._buffer.pop()
+                if dropped:
+                    self.dropped_total += dropped
+                    logger.warning(f"Action log write failed, dropped {dropped} events over the buffer limit")
+                return 0
+
+            self.flushed_total += len(rows)
+            return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+    def start(self):
+        """Запускает фоновый сброс буфера в текущем event loop"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Останавливает фоновую задачу и сбрасывает остаток буфера"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        flushed = await asyncio.to_thread(self.flush)
+        logger.info(f"Action log closed, flushed {flushed} pending events")
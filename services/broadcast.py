@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import Config
+from services.outbound import BULK, send_priority
+from utils.delivery import DELIVERED, FAILED, RETRY, UNREACHABLE, classify_delivery_error
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastEngine:
+    """Фоновая доставка рассылок с постоянным курсором.
+
+    Курсор (последний обработанный user_id) сохраняется после каждого
+    получателя, поэтому после перезапуска рассылка продолжается с места
+    остановки. Сообщения идут в общей очереди бота классом bulk: лимит
+    скорости и ожидание flood wait берет на себя она, рассылка не мешает
+    ответам пользователям.
+    """
+
+    MAX_RETRIES = 3
+
+    def __init__(self, db):
+        self.db = db
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # Начало текущего прогона: (monotonic, обработано к этому моменту) - для оценки скорости
+        self._run_started: Dict[int, Tuple[float, int]] = {}
+
+    def start(self, bot: Bot, broadcast_id: int):
+        if broadcast_id in self._tasks and not self._tasks[broadcast_id].done():
+            return
+        # Задача наследует класс отправки из контекста создания
+        with send_priority(BULK):
+            self._tasks[broadcast_id] = asyncio.create_task(self._run(bot, broadcast_id))
+
+    def resume(self, bot: Bot) -> int:
+        """Продолжает рассылки, прерванные остановкой бота"""
+        broadcasts = self.db.get_running_broadcasts()
+        for broadcast in broadcasts:
+            self.start(bot, broadcast['id'])
+        if broadcasts:
+            logger.info(f"Resumed {len(broadcasts)} broadcasts")
+        return len(broadcasts)
+
+    def cancel(self, broadcast_id: int) -> bool:
+        cancelled = self.db.set_broadcast_status(broadcast_id, 'cancelled')
+        task = self._tasks.pop(broadcast_id, None)
+        if task:
+            task.cancel()
+        return cancelled
+
+    async def stop(self):
+        """Останавливает задачи без смены статуса - при запуске они продолжатся"""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _deliver(self, bot: Bot, user_id: int, text: str) -> str:
+        for _ in range(self.MAX_RETRIES):
+            try:
+                await bot.send_message(user_id, text, parse_mode="HTML")
+                return DELIVERED
+            except TelegramRetryAfter as e:
+                # Очередь outbound уже выждала и повторила запрос - второй раз не ждем
+                logger.warning(f"Broadcast to {user_id} still flood limited after outbound retries: {e}")
+                return FAILED
+            except Exception as e:
+                outcome = classify_delivery_error(e)
+                if outcome != RETRY:
+                    logger.info(f"Broadcast to {user_id} failed ({outcome}): {e}")
+                    return outcome
+                await asyncio.sleep(1)
+        return FAILED
+
+    async def _run(self, bot: Bot, broadcast_id: int):
+        try:
+            while True:
+                broadcast = self.db.get_broadcast(broadcast_id)
+                if not broadcast or broadcast['status'] != 'running':
+                    return
+                self._run_started.setdefault(broadcast_id, (time.monotonic(), self.processed(broadcast)))
+
+                recipients = self.db.get_broadcast_recipients(broadcast, Config.BROADCAST_BATCH_SIZE)
+                if not recipients:
+                    self.db.set_broadcast_status(broadcast_id, 'done')
+                    logger.info(f"Broadcast {broadcast_id} finished")
+                    return
+
+                for user_id in recipients:
+                    outcome = await self._deliver(bot, user_id, broadcast['text'])
+                    if outcome == UNREACHABLE:
+                        self.db.record_delivery_failure(user_id, unreachable=True)
+                    self.db.advance_broadcast(broadcast_id, user_id, outcome)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Broadcast {broadcast_id} crashed: {e}")
+        finally:
+            if self._tasks.get(broadcast_id) is asyncio.current_task():
+                del self._tasks[broadcast_id]
+                self._run_started.pop(broadcast_id, None)
+
+    @staticmethod
+    def processed(broadcast: dict) -> int:
+        return broadcast['sent'] + broadcast['failed'] + broadcast['blocked']
+
+    def progress(self, broadcast: dict) -> dict:
+        """Доля выполнения и оценка оставшегося времени по скорости текущего прогона.
+
+        Скорость считается с последнего запуска (или продолжения после
+        перезапуска бота), поэтому простой не занижает ее.
+        """
+        processed = self.processed(broadcast)
+        total = max(broadcast['total'], processed)
+        remaining = total - processed
+
+        eta_seconds = None
+        run = self._run_started.get(broadcast['id'])
+        if broadcast['status'] == 'running' and run is not None:
+            started, processed_at_start = run
+            done = processed - processed_at_start
+            if done > 0:
+                eta_seconds = int(remaining * (time.monotonic() - started) / done)
+
+        return {
+            'processed': processed,
+            'total': total,
+            'percent': int(processed * 100 / total) if total else 100,
+            'eta_seconds': eta_seconds,
+        }
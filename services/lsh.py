@@ -0,0 +1,86 @@
+import random
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+# Простое число Мерсенна для универсального хеширования
+_PRIME = (1 << 61) - 1
+
+
+class MinHashLSH:
+    """Приближенный поиск похожих множеств токенов: MinHash-сигнатуры + LSH по полосам.
+
+    Сигнатура из num_perm минимумов разбивается на bands полос; пользователи,
+    совпавшие хотя бы в одной полосе, становятся кандидатами. Запрос
+    просматривает только свои корзины, а не всех пользователей.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 32, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)
+        ]
+        self._buckets: List[Dict[Tuple[int, ...], Set[Hashable]]] = [
+            defaultdict(set) for _ in range(bands)
+        ]
+        self._signatures: Dict[Hashable, Tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._signatures
+
+    def signature(self, tokens: Iterable[str]) -> Tuple[int, ...]:
+        """MinHash-сигнатура множества токенов (стабильна между процессами)"""
+        hashes = {zlib.crc32(token.encode('utf-8')) for token in tokens}
+        if not hashes:
+            return ()
+        return tuple(
+            min((a * h + b) % _PRIME for h in hashes)
+            for a, b in self._permutations
+        )
+
+    def _bands_of(self, signature: Tuple[int, ...]):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def add(self, key: Hashable, tokens: Iterable[str]):
+        """Добавляет (или заменяет) запись в индексе"""
+        self.remove(key)
+        signature = self.signature(tokens)
+        if not signature:
+            return
+        self._signatures[key] = signature
+        for band, band_key in self._bands_of(signature):
+            self._buckets[band][band_key].add(key)
+
+    def remove(self, key: Hashable):
+        signature = self._signatures.pop(key, None)
+        if not signature:
+            return
+        for band, band_key in self._bands_of(signature):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def query(self, key: Hashable, limit: int = None) -> List[Hashable]:
+        """Кандидаты для записи из индекса, по убыванию числа совпавших полос"""
+        signature = self._signatures.get(key)
+        if not signature:
+            return []
+
+        collisions = Counter()
+        for band, band_key in self._bands_of(signature):
+            collisions.update(self._buckets[band].get(band_key, ()))
+        collisions.pop(key, None)
+
+        return [candidate for candidate, _ in collisions.most_common(limit)]
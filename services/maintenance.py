@@ -0,0 +1,62 @@
+import asyncio
+import datetime
+import logging
+import threading
+from typing import Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceScheduler:
+    """Ежедневное обслуживание БД в тихий час.
+
+    После массовых удалений (очистка мэтчей, архивирование) файл SQLite
+    не уменьшается, а статистика планировщика устаревает. Раз в сутки в
+    MAINTENANCE_HOUR обновляется статистика, возвращаются свободные
+    страницы и проверяется целостность; итоги пишутся в maintenance_runs.
+    """
+
+    def __init__(self, db, hour: int = None):
+        self.db = db
+        self.hour = Config.MAINTENANCE_HOUR if hour is None else hour
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(self) -> Optional[dict]:
+        """Один прогон; None, если обслуживание уже идет"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self.db.run_maintenance()
+        finally:
+            self._lock.release()
+
+    def next_run(self, now: datetime.datetime = None) -> datetime.datetime:
+        now = now or datetime.datetime.now()
+        moment = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        return moment if moment > now else moment + datetime.timedelta(days=1)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep((self.next_run() - datetime.datetime.now()).total_seconds())
+            await asyncio.to_thread(self.run)
+
+    def start(self):
+        """Запускает ежедневное обслуживание в текущем event loop"""
+        if self._task is None and 0 <= self.hour <= 23:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,13 +1,31 @@
+import asyncio
+import functools
 import logging
 import random
 from typing import List, Dict, Tuple
+from config import Config
 from database import Database  # ИСПРАВЛЕНО: убрал циклический импорт
+from services.lsh import MinHashLSH
+from services.parallel_scoring import score_top_k
+from services.snapshot import MatchingSnapshot
 
 logger = logging.getLogger(__name__)
 
 class MatchMaker:
     def __init__(self, db: Database):
         self.db = db
+        # Участники последнего раунда по пулам - для отчета админу
+        self.last_pool_sizes: Dict[str, int] = {}
+    
+    @property
+    def last_pool_size(self) -> int:
+        return sum(self.last_pool_sizes.values())
+    
+    def _collect_pool_results(self, results: Dict[str, Tuple[int, int]]) -> Dict[str, int]:
+        """Результаты раундов {пул: (создано пар, участников)} -> {пул: создано пар}"""
+        # Размеры пулов берутся из результатов раундов и сохраняются одним присваиванием
+        self.last_pool_sizes = {pool: size for pool, (_, size) in results.items()}
+        return {pool: created for pool, (created, _) in results.items()}
     
     def calculate_match_score(self, user1: dict, user2: dict) -> Tuple[int, List[str]]:
         """Рассчитывает баллы совпадения и общие интересы"""
@@ -56,24 +74,32 @@ class MatchMaker:
         
         return score, common_interests
     
+    def user_tokens(self, user: dict) -> set:
+        """Токены профиля для MinHash: интересы, цели, город и возрастная группа"""
+        tokens = set()
+        for field, prefix in (('interests', 'i:'), ('goals', 'g:')):
+            for item in (user.get(field) or '').split(','):
+                if item.strip():
+                    tokens.add(prefix + item.strip().lower())
+        if user.get('city'):
+            tokens.add('c:' + user['city'].lower().strip())
+        if user.get('age'):
+            tokens.add(f"a:{user['age'] // 5}")
+        return tokens
+    
+    def build_lsh_index(self, users: List[dict]) -> MinHashLSH:
+        """Строит LSH-индекс по профилям пользователей"""
+        index = MinHashLSH(num_perm=Config.LSH_NUM_PERM, bands=Config.LSH_BANDS)
+        for user in users:
+            index.add(user['user_id'], self.user_tokens(user))
+        return index
+    
     def have_previous_match(self, user1_id: int, user2_id: int) -> bool:
         """Проверяет, были ли пользователи уже в паре (любой статус)"""
-        try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id FROM matches 
-                WHERE ((user1_id = ? AND user2_id = ?) OR (user1_id = ? AND user2_id = ?))
-            ''', (user1_id, user2_id, user2_id, user1_id))
-            
-            result = cursor.fetchone() is not None
-            conn.close()
-            return result
-        except Exception as e:
-            logger.error(f"Error checking previous matches: {e}")
-            return True  # В случае ошибки считаем, что мэтч уже был
-    
-    def find_best_matches(self, user: dict, all_users: List[dict], max_matches: int = 3) -> List[Tuple[dict, int, List[str]]]:
+        return self.db.have_met(user1_id, user2_id)
+    
+    def find_best_matches(self, user: dict, all_users: List[dict], max_matches: int = 3,
+                          previous_pairs: set = None) -> List[Tuple[dict, int, List[str]]]:
         """Находит лучшие совпадения для пользователя"""
         matches = []
         
@@ -82,7 +108,11 @@ class MatchMaker:
                 continue
             
             # Проверяем, не было ли уже мэтча (любого статуса)
-            if self.have_previous_match(user['user_id'], potential_match['user_id']):
+            if previous_pairs is not None:
+                pair = (min(user['user_id'], potential_match['user_id']), max(user['user_id'], potential_match['user_id']))
+                if pair in previous_pairs:
+                    continue
+            elif self.have_previous_match(user['user_id'], potential_match['user_id']):
                 continue
             
             score, common_interests = self.calculate_match_score(user, potential_match)
@@ -94,6 +124,24 @@ class MatchMaker:
         matches.sort(key=lambda x: x[1], reverse=True)
         return matches[:max_matches]
     
+    def find_approximate_matches(self, user: dict, users_by_id: Dict[int, dict], index: MinHashLSH,
+                                 previous_pairs: set, max_matches: int = 3) -> List[Tuple[dict, int, List[str]]]:
+        """Как find_best_matches, но точный скоринг только для кандидатов из LSH-индекса"""
+        matches = []
+        
+        for candidate_id in index.query(user['user_id'], limit=Config.LSH_MAX_CANDIDATES):
+            potential_match = users_by_id.get(candidate_id)
+            if not potential_match:
+                continue
+            if (min(user['user_id'], candidate_id), max(user['user_id'], candidate_id)) in previous_pairs:
+                continue
+            
+            score, common_interests = self.calculate_match_score(user, potential_match)
+            matches.append((potential_match, score, common_interests))
+        
+        matches.sort(key=lambda x: x[1], reverse=True)
+        return matches[:max_matches]
+    
     def create_forced_match(self, user1_id: int, user2_id: int) -> bool:
         """Создает принудительный мэтч без проверки совпадений"""
         user1 = self.db.get_user(user1_id)
@@ -114,19 +162,65 @@ class MatchMaker:
         
         return success
     
-    def run_matching_round(self, force_all: bool = False) -> int:
-        """Запускает раунд мэтчинга"""
-        active_users = self.db.get_all_active_users()
+    async def run_matching_round_async(self, **kwargs) -> int:
+        """Запускает раунд мэтчинга в отдельном потоке, не блокируя event loop бота"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.run_matching_round, **kwargs))
+    
+    async def run_pool_rounds_async(self, pools: List[str] = None, **kwargs) -> Dict[str, int]:
+        """Раунды по пулам вне event loop; возвращает {пул: создано пар}.
+
+        Пулы не пересекаются по пользователям, поэтому стоимость раунда
+        зависит от размера пула, а не от числа всех пользователей. На
+        PostgreSQL раунды пулов идут параллельно, каждый в своем потоке; у
+        SQLite один писатель на файл, поэтому там пулы идут по очереди.
+        """
+        if pools is None:
+            pools = list(self.db.get_pool_sizes())
+        loop = asyncio.get_running_loop()
+        pool_round = functools.partial(self._pool_round, **kwargs)
+        if self.db.backend.name == 'sqlite':
+            results = await loop.run_in_executor(None, lambda: [pool_round(pool) for pool in pools])
+        else:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(None, pool_round, pool) for pool in pools
+            ))
+        return self._collect_pool_results(dict(zip(pools, results)))
+    
+    def run_matching_round(self, force_all: bool = False, incremental: bool = None,
+                           approximate: bool = None, parallel: bool = None, pool: str = None) -> int:
+        """Запускает раунд мэтчинга; pool - только внутри этого пула (None - все пулы по очереди)"""
+        # Все пулы по очереди: между пулами пары не составляются
+        pools = list(self.db.get_pool_sizes()) if pool is None else [pool]
+        results = {
+            pool_key: self._pool_round(pool_key, force_all, incremental, approximate, parallel)
+            for pool_key in pools
+        }
+        return sum(self._collect_pool_results(results).values())
+    
+    def _pool_round(self, pool: str, force_all: bool = False, incremental: bool = None,
+                    approximate: bool = None, parallel: bool = None) -> Tuple[int, int]:
+        """Раунд в одном пуле; возвращает (создано пар, участников раунда)"""
+        if incremental is None:
+            incremental = Config.INCREMENTAL_MATCHING
+        if approximate is None:
+            approximate = Config.APPROXIMATE_MATCHING
+        if parallel is None:
+            parallel = Config.PARALLEL_MATCHING
+        if incremental and not force_all:
+            return self._incremental_pool_round(pool, approximate)
         
-        if len(active_users) < 2:
-            logger.info("Not enough users for matching")
-            return 0
+        snapshot = self.db.get_matching_snapshot(pool)
+        
+        if len(snapshot) < 2:
+            logger.info(f"Not enough users for matching in pool {pool}")
+            return 0, len(snapshot)
         
-        logger.info(f"Starting matching round for {len(active_users)} users")
+        logger.info(f"Starting matching round for {len(snapshot)} users in pool {pool}")
         
         # Перемешиваем пользователей для случайности
-        random.shuffle(active_users)
-        matched_user_ids = set()
+        snapshot.shuffle()
+        active_users = snapshot.users
         matches_created = 0
         
         # Используем два разных алгоритма в зависимости от режима
@@ -136,7 +230,7 @@ class MatchMaker:
                 user1 = active_users[i]
                 user2 = active_users[i + 1]
                 
-                if user1['user_id'] in matched_user_ids or user2['user_id'] in matched_user_ids:
+                if snapshot.is_matched(user1['user_id']) or snapshot.is_matched(user2['user_id']):
                     continue
                 
                 # Пропускаем проверку на предыдущие мэтчи в принудительном режиме
@@ -144,22 +238,51 @@ class MatchMaker:
                 success = self.create_forced_match(user1['user_id'], user2['user_id'])
                 
                 if success:
-                    matched_user_ids.add(user1['user_id'])
-                    matched_user_ids.add(user2['user_id'])
+                    snapshot.mark_matched(user1['user_id'])
+                    snapshot.mark_matched(user2['user_id'])
                     matches_created += 1
                     logger.info(f"Created forced match between {user1['user_id']} and {user2['user_id']}")
         else:
-            # Умный мэтчинг с поиском совпадений
+            # Умный мэтчинг с поиском совпадений; история пар читается один раз на раунд
+            previous_pairs = self.db.get_match_pairs(pool)
+            if approximate:
+                index = self.build_lsh_index(active_users)
+            elif parallel:
+                # Вся матрица баллов считается заранее в пуле процессов
+                top_partners = score_top_k(
+                    active_users, previous_pairs, Config.MATCHING_TOP_K,
+                    workers=Config.MATCHING_WORKERS or None
+                )
+            
             for user in active_users:
-                if user['user_id'] in matched_user_ids:
+                if snapshot.is_matched(user['user_id']):
                     continue
                 
                 # Ищем лучшие совпадения для текущего пользователя
-                potential_matches = self.find_best_matches(
-                    user, 
-                    [u for u in active_users if u['user_id'] not in matched_user_ids and u['user_id'] != user['user_id']],
-                    max_matches=1
-                )
+                if parallel and not approximate:
+                    potential_matches = []
+                    user_top = top_partners.get(user['user_id'], [])
+                    for partner_id, score in user_top:
+                        if not snapshot.is_matched(partner_id):
+                            partner = snapshot.get(partner_id)
+                            potential_matches.append(
+                                (partner, score, self.calculate_match_score(user, partner)[1])
+                            )
+                            break
+                    if not potential_matches and len(user_top) >= Config.MATCHING_TOP_K:
+                        # Весь top-K уже занят - точный скоринг по оставшимся, а не случайная пара
+                        potential_matches = self.find_best_matches(
+                            user, snapshot.unmatched(), max_matches=1, previous_pairs=previous_pairs
+                        )
+                elif approximate:
+                    potential_matches = self.find_approximate_matches(
+                        user, snapshot, index, previous_pairs, max_matches=1
+                    )
+                else:
+                    # Занятые пропускаются по маске, без пересборки списка
+                    potential_matches = self.find_best_matches(
+                        user, snapshot.unmatched(), max_matches=1, previous_pairs=previous_pairs
+                    )
                 
                 if potential_matches:
                     partner, score, common_interests = potential_matches[0]
@@ -170,29 +293,174 @@ class MatchMaker:
                     )
                     
                     if success:
-                        matched_user_ids.add(user['user_id'])
-                        matched_user_ids.add(partner['user_id'])
+                        snapshot.mark_matched(user['user_id'])
+                        snapshot.mark_matched(partner['user_id'])
+                        previous_pairs.add((min(user['user_id'], partner['user_id']), max(user['user_id'], partner['user_id'])))
+                        if approximate:
+                            index.remove(user['user_id'])
+                            index.remove(partner['user_id'])
                         matches_created += 1
                         logger.info(f"Created smart match between {user['user_id']} and {partner['user_id']} with score {score}")
             
             # Если остались неспаренные пользователи, создаем принудительные пары
-            unmatched_users = [u for u in active_users if u['user_id'] not in matched_user_ids]
+            unmatched_users = list(snapshot.unmatched())
             logger.info(f"Unmatched users remaining: {len(unmatched_users)}")
             
-            if len(unmatched_users) >= 2:
-                # Создаем пары из оставшихся пользователей, игнорируя историю мэтчей
-                for i in range(0, len(unmatched_users) - 1, 2):
-                    user1 = unmatched_users[i]
-                    user2 = unmatched_users[i + 1]
-                    
-                    success = self.create_forced_match(user1['user_id'], user2['user_id'])
-                    if success:
-                        matches_created += 1
-                        logger.info(f"Created fallback forced match between {user1['user_id']} and {user2['user_id']}")
+            matches_created += self.create_fallback_matches(unmatched_users)
         
-        logger.info(f"Matching round completed. Created {matches_created} matches")
+        logger.info(f"Matching round completed in pool {pool}. Created {matches_created} matches")
+        return matches_created, len(snapshot)
+    
+    def create_fallback_matches(self, unmatched_users: List[dict]) -> int:
+        """Создает принудительные пары из оставшихся пользователей, игнорируя историю мэтчей"""
+        matches_created = 0
+        for i in range(0, len(unmatched_users) - 1, 2):
+            user1 = unmatched_users[i]
+            user2 = unmatched_users[i + 1]
+            
+            success = self.create_forced_match(user1['user_id'], user2['user_id'])
+            if success:
+                matches_created += 1
+                logger.info(f"Created fallback forced match between {user1['user_id']} and {user2['user_id']}")
         return matches_created
     
+    def _offer_candidate(self, candidates: Dict[int, List[tuple]], user_id: int, candidate: tuple) -> bool:
+        """Предлагает кандидата в top-K список пользователя, возвращает True если список изменился"""
+        top_k = Config.MATCHING_TOP_K
+        user_candidates = [c for c in candidates.get(user_id, []) if c[0] != candidate[0]]
+        had_candidate = len(user_candidates) != len(candidates.get(user_id, []))
+        
+        if not had_candidate and len(user_candidates) >= top_k and candidate[1] <= user_candidates[-1][1]:
+            return False
+        
+        user_candidates.append(candidate)
+        user_candidates.sort(key=lambda x: x[1], reverse=True)
+        candidates[user_id] = user_candidates[:top_k]
+        return True
+    
+    def refresh_candidates(self, active_users: MatchingSnapshot, previous_pairs: set, approximate: bool = False,
+                           pool: str = None) -> Dict[int, List[tuple]]:
+        """Пересчитывает top-K кандидатов только для новых и изменившихся пользователей.
+
+        Каждый пересчитанный пользователь заодно предлагается в списки
+        остальных, так что стоимость пропорциональна числу изменений,
+        а не квадрату числа пользователей.
+        """
+        candidates = self.db.get_match_candidates(pool)
+        stale_ids = {
+            u['user_id'] for u in active_users
+            if u.get('candidates_stale') or not candidates.get(u['user_id'])
+        }
+        changed_ids = set()
+        
+        if approximate and stale_ids:
+            index = self.build_lsh_index(active_users)
+        
+        for user in active_users:
+            if user['user_id'] not in stale_ids:
+                continue
+            
+            if approximate:
+                others = [
+                    active_users.get(candidate_id)
+                    for candidate_id in index.query(user['user_id'], limit=Config.LSH_MAX_CANDIDATES)
+                ]
+            else:
+                others = active_users
+            
+            scored = []
+            for other in others:
+                if other['user_id'] == user['user_id']:
+                    continue
+                if (min(user['user_id'], other['user_id']), max(user['user_id'], other['user_id'])) in previous_pairs:
+                    continue
+                
+                score, common_interests = self.calculate_match_score(user, other)
+                scored.append((other['user_id'], score, common_interests))
+                
+                if other['user_id'] not in stale_ids and self._offer_candidate(
+                        candidates, other['user_id'], (user['user_id'], score, common_interests)):
+                    changed_ids.add(other['user_id'])
+            
+            scored.sort(key=lambda x: x[1], reverse=True)
+            candidates[user['user_id']] = scored[:Config.MATCHING_TOP_K]
+            changed_ids.add(user['user_id'])
+        
+        if changed_ids:
+            self.db.save_match_candidates(
+                {user_id: candidates[user_id] for user_id in changed_ids},
+                fresh_user_ids=list(stale_ids)
+            )
+        logger.info(f"Candidates refreshed for {len(stale_ids)} users, {len(changed_ids)} lists updated")
+        return candidates
+    
+    def run_incremental_round(self, approximate: bool = False, pool: str = None) -> int:
+        """Инкрементальный раунд: пары только для свободных пользователей из кэша кандидатов"""
+        pools = list(self.db.get_pool_sizes()) if pool is None else [pool]
+        results = {pool_key: self._incremental_pool_round(pool_key, approximate) for pool_key in pools}
+        return sum(self._collect_pool_results(results).values())
+    
+    def _incremental_pool_round(self, pool: str, approximate: bool = False) -> Tuple[int, int]:
+        """Инкрементальный раунд в одном пуле; возвращает (создано пар, участников раунда)"""
+        active_users = self.db.get_matching_snapshot(pool)
+        
+        if len(active_users) < 2:
+            logger.info(f"Not enough users for matching in pool {pool}")
+            return 0, len(active_users)
+        
+        previous_pairs = self.db.get_match_pairs(pool)
+        candidates = self.refresh_candidates(active_users, previous_pairs, approximate=approximate, pool=pool)
+        
+        # Пользователи с ожидающими мэтчами в раунде не участвуют
+        busy_ids = self.db.get_users_with_pending_matches()
+        for user_id in busy_ids:
+            active_users.mark_matched(user_id)
+        round_users = list(active_users.unmatched())
+        random.shuffle(round_users)
+        logger.info(f"Starting incremental matching round for {len(round_users)} of {len(active_users)} users in pool {pool}")
+        
+        matches_created = 0
+        
+        for user in round_users:
+            if active_users.is_matched(user['user_id']):
+                continue
+            
+            for candidate_id, score, common_interests in candidates.get(user['user_id'], []):
+                pair = (min(user['user_id'], candidate_id), max(user['user_id'], candidate_id))
+                if (candidate_id not in active_users or active_users.is_matched(candidate_id)
+                        or pair in previous_pairs):
+                    continue
+                
+                success = self.db.create_match(
+                    user['user_id'], candidate_id, score, common_interests, is_forced=False
+                )
+                if success:
+                    active_users.mark_matched(user['user_id'])
+                    active_users.mark_matched(candidate_id)
+                    previous_pairs.add(pair)
+                    matches_created += 1
+                    logger.info(f"Created incremental match between {user['user_id']} and {candidate_id} with score {score}")
+                break
+        
+        # Убираем из списков уже встретившиеся пары; опустевшие списки пересчитаются в следующем раунде
+        pruned = {}
+        for user_id, user_candidates in candidates.items():
+            remaining = [
+                c for c in user_candidates
+                if (min(user_id, c[0]), max(user_id, c[0])) not in previous_pairs
+            ]
+            if len(remaining) != len(user_candidates):
+                pruned[user_id] = remaining
+        if pruned:
+            self.db.save_match_candidates(pruned)
+        
+        unmatched_users = [u for u in round_users if not active_users.is_matched(u['user_id'])]
+        logger.info(f"Unmatched users remaining: {len(unmatched_users)}")
+        matches_created += self.create_fallback_matches(unmatched_users)
+        
+        logger.info(f"Incremental matching round completed in pool {pool}. Created {matches_created} matches")
+        return matches_created, len(round_users)
+    
     def create_specific_match(self, user1_id: int, user2_id: int) -> bool:
         """Создает конкретный мэтч между двумя пользователями"""
         user1 = self.db.get_user(user1_id)
@@ -201,6 +469,10 @@ class MatchMaker:
         if not user1 or not user2:
             return False
 
+        # Пулы (сообщества) не пересекаются
+        if user1.get('pool') != user2.get('pool'):
+            return False
+
         # Проверяем, не было ли уже мэтча
         if self.have_previous_match(user1_id, user2_id):
             return False
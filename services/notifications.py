@@ -0,0 +1,157 @@
+import asyncio
+import datetime
+import logging
+import math
+import random
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot
+
+from config import Config
+from services.outbound import BULK, send_priority
+
+logger = logging.getLogger(__name__)
+
+# Смещение от UTC (часы) для частых городов; дополняется и переопределяется CITY_UTC_OFFSETS
+DEFAULT_CITY_OFFSETS = {
+    'калининград': 2,
+    'москва': 3, 'санкт-петербург': 3, 'питер': 3, 'спб': 3, 'казань': 3, 'нижний новгород': 3,
+    'ростов-на-дону': 3, 'краснодар': 3, 'воронеж': 3, 'минск': 3,
+    'самара': 4, 'саратов': 4, 'ижевск': 4, 'тбилиси': 4, 'ереван': 4, 'баку': 4, 'дубай': 4,
+    'екатеринбург': 5, 'челябинск': 5, 'пермь': 5, 'уфа': 5, 'тюмень': 5, 'ташкент': 5, 'алматы': 5,
+    'омск': 6, 'бишкек': 6,
+    'новосибирск': 7, 'красноярск': 7, 'томск': 7, 'барнаул': 7,
+    'иркутск': 8, 'улан-удэ': 8,
+    'якутск': 9,
+    'владивосток': 10, 'хабаровск': 10,
+}
+
+# Сколько действий нужно, чтобы доверять истории больше, чем часам по умолчанию
+MIN_HISTORY = 5
+
+
+def city_offset(city: Optional[str]) -> Optional[float]:
+    """Смещение UTC для города пользователя или None, если город неизвестен"""
+    if not city:
+        return None
+    key = city.strip().casefold()
+    if key.startswith('г.'):
+        key = key[2:].strip()
+    offsets = {**DEFAULT_CITY_OFFSETS, **Config.CITY_UTC_OFFSETS}
+    return offsets.get(key)
+
+
+def hour_weights(profile: dict, server_offset: float) -> List[float]:
+    """Готовность пользователя ответить в каждый час по времени сервера (0..1).
+
+    Основа - дневные часы NOTIFY_ACTIVE_HOURS по местному времени города;
+    если истории действий достаточно, внутри нее выше часы, когда
+    пользователь обычно активен.
+    """
+    start, end = Config.NOTIFY_ACTIVE_HOURS
+    offset = city_offset(profile.get('city'))
+    shift = 0 if offset is None else offset - server_offset
+
+    weights = []
+    for hour in range(24):
+        local_hour = (hour + shift) % 24
+        weights.append(1.0 if start <= local_hour < end else 0.1)
+
+    history = profile.get('hours') or [0] * 24
+    total = sum(history)
+    if total >= MIN_HISTORY:
+        peak = max(history)
+        weights = [weight * (0.25 + 0.75 * count / peak) for weight, count in zip(weights, history)]
+    return weights
+
+
+def plan_notifications(profiles: Dict[int, dict], start: datetime.datetime,
+                       window_hours: float, slot_minutes: int) -> Dict[int, datetime.datetime]:
+    """Время отправки для каждого пользователя внутри окна.
+
+    Жадно по слотам: пользователь получает слот, где он охотнее отвечает,
+    но чем больше слот уже занят относительно равномерной загрузки, тем он
+    дороже - так пик ответов размазывается по окну.
+    """
+    slots = max(1, int(window_hours * 60 // slot_minutes))
+    slot_times = [start + datetime.timedelta(minutes=slot_minutes * i) for i in range(slots)]
+    target = max(1, math.ceil(len(profiles) / slots))
+    server_offset = start.astimezone().utcoffset().total_seconds() / 3600
+    load = [0] * slots
+
+    user_ids = list(profiles)
+    random.shuffle(user_ids)
+    plan = {}
+    for user_id in user_ids:
+        weights = hour_weights(profiles[user_id], server_offset)
+        best = max(
+            range(slots),
+            key=lambda i: weights[slot_times[i].hour] / (1 + load[i] / target)
+        )
+        load[best] += 1
+        plan[user_id] = slot_times[best]
+    return plan
+
+
+class NotificationSpreader:
+    """Отложенная рассылка предложений после раунда.
+
+    Вместо одной волны всем сразу каждому пользователю назначается время
+    в окне NOTIFY_WINDOW_HOURS (plan_notifications); расписание хранится в
+    БД и переживает перезапуск. Фоновая задача отправляет наступившие.
+    """
+
+    POLL_INTERVAL = 30
+
+    def __init__(self, db, deliver: Callable[[Bot, int], Awaitable[int]], window_hours: float = None):
+        self.db = db
+        self.deliver = deliver
+        self.window_hours = Config.NOTIFY_WINDOW_HOURS if window_hours is None else window_hours
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_hours > 0
+
+    def schedule_pending(self) -> Dict[int, datetime.datetime]:
+        """Назначает время отправки всем, у кого есть ожидающие предложения"""
+        profiles = self.db.get_notification_profiles(Config.NOTIFY_HISTORY_DAYS)
+        if not profiles:
+            return {}
+        plan = plan_notifications(
+            profiles, datetime.datetime.now(), self.window_hours, Config.NOTIFY_SLOT_MINUTES
+        )
+        if not self.db.schedule_notifications({user_id: moment.isoformat() for user_id, moment in plan.items()}):
+            return {}
+        logger.info(f"Scheduled proposals for {len(plan)} users over {self.window_hours}h")
+        return plan
+
+    async def send_due(self, bot: Bot) -> int:
+        """Отправляет наступившие уведомления, возвращает число пользователей"""
+        user_ids = self.db.pop_due_notifications(datetime.datetime.now().isoformat())
+        for user_id in user_ids:
+            await self.deliver(bot, user_id)
+        return len(user_ids)
+
+    async def _run(self, bot: Bot):
+        while True:
+            try:
+                await self.send_due(bot)
+            except Exception as e:
+                logger.error(f"Error sending scheduled proposals: {e}")
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    def start(self, bot: Bot):
+        """Запускает отправку по расписанию (в том числе оставшемуся с прошлого запуска)"""
+        if self._task is None:
+            with send_priority(BULK):
+                self._task = asyncio.create_task(self._run(bot))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
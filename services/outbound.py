@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetUpdates
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Классы исходящих запросов, от важного к массовому
+INTERACTIVE = 0     # ответы на действия пользователя
+TRANSACTIONAL = 1   # события по мэтчу: оба приняли, вопрос об успехе
+BULK = 2            # предложения после раунда, рассылки
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', TRANSACTIONAL: 'transactional', BULK: 'bulk'}
+
+_priority: ContextVar[int] = ContextVar('outbound_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def send_priority(priority: int):
+    """Запросы к Telegram внутри блока (и в задачах, созданных в нем) идут с этим классом"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Ограничитель скорости: rate токенов в секунду, не больше capacity про запас.
+
+    Токены выдает только OutboundScheduler._dispatch - единственный потребитель.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, reserve: float = 0) -> float:
+        """Берет токен, если после этого останется не меньше reserve; иначе - сколько ждать"""
+        self._refill()
+        if self._tokens >= 1 + reserve:
+            self._tokens -= 1
+            return 0.0
+        return (1 + reserve - self._tokens) / self.rate
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Очередь исходящих запросов бота с приоритетами и общим лимитом.
+
+    Подключается к сессии бота (bot.session.middleware), поэтому через нее
+    идут все вызовы API, кроме getUpdates. Запросы ждут в одной очереди и
+    выходят по классу (interactive, затем transactional, затем bulk), а
+    внутри класса - по порядку. Массовые и транзакционные отправки не берут
+    последние reserve токенов: ответ пользователю уходит сразу, даже когда
+    идет рассылка. На flood wait Telegram (RetryAfter) встает вся очередь.
+    """
+
+    MAX_RETRIES = 3
+
+    def __init__(self, rate: float = None, burst: int = None, reserve: int = None):
+        self.bucket = TokenBucket(rate or Config.OUTBOUND_RATE, burst or Config.OUTBOUND_BURST)
+        reserve = Config.OUTBOUND_INTERACTIVE_RESERVE if reserve is None else reserve
+        # Иначе массовым отправкам никогда не хватит токенов
+        self.reserve = min(reserve, self.bucket.capacity - 1)
+
+        self._heap = []
+        self._sequence = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._paused_until = 0.0
+
+        self._sent = {priority: 0 for priority in PRIORITY_NAMES}
+        self._waited = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.flood_waits = 0
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+
+        priority = _priority.get()
+        for attempt in range(self.MAX_RETRIES):
+            await self.acquire(priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.flood_waits += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning(f"Flood limit on {type(method).__name__}, outbound paused for {e.retry_after}s")
+                if attempt == self.MAX_RETRIES - 1:
+                    raise
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        """Ждет своей очереди и токена лимита"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+
+        future = asyncio.get_running_loop().create_future()
+        queued = time.monotonic()
+        heapq.heappush(self._heap, (priority, next(self._sequence), future))
+        self._wakeup.set()
+        await future
+        self._sent[priority] += 1
+        self._waited[priority] += time.monotonic() - queued
+
+    async def _dispatch(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            paused = self._paused_until - time.monotonic()
+            if paused > 0:
+                await asyncio.sleep(paused)
+                continue
+
+            priority, _, future = self._heap[0]
+            if future.done():
+                # Ожидающий отменен
+                heapq.heappop(self._heap)
+                continue
+
+            wait = self.bucket.try_take(0 if priority == INTERACTIVE else self.reserve)
+            if not wait:
+                heapq.heappop(self._heap)
+                future.set_result(None)
+                continue
+
+            # Ждем токен, но просыпаемся раньше, если пришел запрос важнее
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, dict]:
+        """Глубина очереди, отправлено и среднее ожидание по классам"""
+        queued = {priority: 0 for priority in PRIORITY_NAMES}
+        for priority, _, future in self._heap:
+            if not future.done():
+                queued[priority] += 1
+        return {
+            name: {
+                'queued': queued[priority],
+                'sent': self._sent[priority],
+                'avg_wait_ms': self._waited[priority] * 1000 / self._sent[priority] if self._sent[priority] else 0.0,
+            }
+            for priority, name in PRIORITY_NAMES.items()
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for _, _, future in self._heap:
+            future.cancel()
+        self._heap.clear()
+
+
+outbound = OutboundScheduler()
@@ -0,0 +1,195 @@
+import heapq
+import logging
+import multiprocessing
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Состояние воркера: профили, собранные из общей памяти один раз на процесс
+_worker_profiles = None
+
+
+def _split_items(value) -> List[str]:
+    return [item.strip().lower() for item in (value or '').split(',') if item.strip()]
+
+
+def _encode_ids(values: List[List[str]], vocabulary: Dict[str, int]) -> Tuple[array, array]:
+    """Списки токенов -> CSR (offsets, ids) с общим словарем"""
+    offsets = array('i', [0])
+    ids = array('i')
+    for items in values:
+        ids.extend(sorted({vocabulary.setdefault(item, len(vocabulary)) for item in items}))
+        offsets.append(len(ids))
+    return offsets, ids
+
+
+class SharedProfiles:
+    """Профили для скоринга в общей памяти: воркеры читают их без pickle на каждую задачу.
+
+    Все поля хранятся массивами int32: город и возраст по строке, интересы,
+    цели и история пар - в CSR-формате (offsets + ids).
+    """
+
+    FIELDS = (
+        'cities', 'ages',
+        'interest_offsets', 'interest_ids',
+        'goal_offsets', 'goal_ids',
+        'history_offsets', 'history_ids',
+    )
+
+    def __init__(self, users: List[dict], previous_pairs: set):
+        self.user_ids = [user['user_id'] for user in users]
+        positions = {user_id: i for i, user_id in enumerate(self.user_ids)}
+
+        cities = {}
+        arrays = {
+            'cities': array('i', [
+                cities.setdefault(user['city'].lower().strip(), len(cities)) if user.get('city') else -1
+                for user in users
+            ]),
+            'ages': array('i', [user.get('age') or 0 for user in users]),
+        }
+        arrays['interest_offsets'], arrays['interest_ids'] = _encode_ids(
+            [_split_items(user.get('interests')) for user in users], {}
+        )
+        arrays['goal_offsets'], arrays['goal_ids'] = _encode_ids(
+            [_split_items(user.get('goals')) for user in users], {}
+        )
+
+        history = [[] for _ in users]
+        for user1_id, user2_id in previous_pairs:
+            if user1_id in positions and user2_id in positions:
+                history[positions[user1_id]].append(positions[user2_id])
+                history[positions[user2_id]].append(positions[user1_id])
+        arrays['history_offsets'] = array('i', [0])
+        arrays['history_ids'] = array('i')
+        for partners in history:
+            arrays['history_ids'].extend(partners)
+            arrays['history_offsets'].append(len(arrays['history_ids']))
+
+        self._blocks = {}
+        for field in self.FIELDS:
+            data = arrays[field].tobytes()
+            # Пустой блок общей памяти создать нельзя, минимум - один int32
+            block = shared_memory.SharedMemory(create=True, size=max(len(data), arrays[field].itemsize))
+            block.buf[:len(data)] = data
+            self._blocks[field] = block
+
+    @property
+    def names(self) -> Dict[str, str]:
+        return {field: block.name for field, block in self._blocks.items()}
+
+    def close(self):
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self._blocks = {}
+
+
+def _attach_profiles(names: Dict[str, str], count: int):
+    """Инициализатор воркера: подключается к общей памяти и собирает множества"""
+    global _worker_profiles
+
+    blocks = {field: shared_memory.SharedMemory(name=name) for field, name in names.items()}
+    views = {field: block.buf.cast('i') for field, block in blocks.items()}
+
+    def sets(offsets, ids):
+        return [frozenset(ids[offsets[i]:offsets[i + 1]]) for i in range(count)]
+
+    _worker_profiles = {
+        'cities': list(views['cities'][:count]),
+        'ages': list(views['ages'][:count]),
+        'interests': sets(views['interest_offsets'], views['interest_ids']),
+        'goals': sets(views['goal_offsets'], views['goal_ids']),
+        'history': sets(views['history_offsets'], views['history_ids']),
+    }
+
+    # Данные скопированы в процесс - отпускаем буферы
+    for view in views.values():
+        view.release()
+    for block in blocks.values():
+        block.close()
+
+
+def _score_block(rows: Tuple[int, int], top_k: int) -> List[Tuple[int, List[Tuple[int, int]]]]:
+    """Считает блок строк матрицы баллов и возвращает top-K по каждой строке.
+
+    Формула повторяет MatchMaker.calculate_match_score.
+    """
+    profiles = _worker_profiles
+    cities, ages = profiles['cities'], profiles['ages']
+    interests, goals, history = profiles['interests'], profiles['goals'], profiles['history']
+    count = len(cities)
+
+    result = []
+    for row in range(*rows):
+        city, age = cities[row], ages[row]
+        row_interests, row_goals, row_history = interests[row], goals[row], history[row]
+
+        scored = []
+        for col in range(count):
+            if col == row or col in row_history:
+                continue
+
+            score = 10
+            if city >= 0 and city == cities[col]:
+                score += 30
+            if row_interests:
+                score += len(row_interests & interests[col]) * 15
+            if row_goals:
+                score += len(row_goals & goals[col]) * 10
+            if age and ages[col]:
+                age_diff = abs(age - ages[col])
+                if age_diff <= 5:
+                    score += 20
+                elif age_diff <= 10:
+                    score += 10
+            scored.append((score, col))
+
+        result.append((row, [(col, score) for score, col in heapq.nlargest(top_k, scored)]))
+    return result
+
+
+def score_top_k(users: List[dict], previous_pairs: set, top_k: int,
+                workers: int = None, block_size: int = 256) -> Dict[int, List[Tuple[int, int]]]:
+    """Top-K партнеров для каждого пользователя, посчитанные в пуле процессов.
+
+    Возвращает user_id -> [(partner_id, score)] по убыванию баллов; пары из
+    previous_pairs пропускаются.
+    """
+    if len(users) < 2:
+        return {}
+
+    workers = workers or os.cpu_count() or 1
+    profiles = SharedProfiles(users, previous_pairs)
+    count = len(users)
+
+    try:
+        # Бот многопоточный (соединения SQLite, сессия aiohttp, очередь отправки):
+        # fork такого процесса может зависнуть на унаследованной блокировке
+        # forkserver и воркеры импортируют main.py как __mp_main__ - поэтому main.py
+        # при импорте ничего не создает (см. create_dispatcher)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('forkserver'),
+            initializer=_attach_profiles,
+            initargs=(profiles.names, count)
+        ) as executor:
+            blocks = [(start, min(start + block_size, count)) for start in range(0, count, block_size)]
+            futures = [executor.submit(_score_block, rows, top_k) for rows in blocks]
+
+            top = {}
+            for future in futures:
+                for row, partners in future.result():
+                    top[profiles.user_ids[row]] = [
+                        (profiles.user_ids[col], score) for col, score in partners
+                    ]
+    finally:
+        profiles.close()
+
+    logger.info(f"Parallel scoring finished for {count} users on {workers} workers")
+    return top
@@ -0,0 +1,91 @@
+import random
+import sys
+from typing import Iterable, Iterator, List
+
+
+class UserRecord:
+    """Компактная запись пользователя для раунда мэтчинга: только нужные колонки.
+
+    Поддерживает чтение как dict (user['city'], user.get('age')), поэтому
+    подходит для calculate_match_score и остального кода мэтчинга.
+    """
+
+    __slots__ = ('user_id', 'age', 'city', 'interests', 'goals', 'candidates_stale', 'fatigue')
+
+    COLUMNS = __slots__
+
+    def __init__(self, user_id, age, city, interests, goals, candidates_stale, fatigue=0.0):
+        self.user_id = user_id
+        self.age = age
+        # Города повторяются у тысяч пользователей - храним одну копию строки
+        self.city = sys.intern(city) if city else city
+        self.interests = interests
+        self.goals = goals
+        self.candidates_stale = candidates_stale
+        self.fatigue = fatigue
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        return f"UserRecord(user_id={self.user_id})"
+
+
+class MatchingSnapshot:
+    """Снимок активных пользователей для раунда с битовой маской уже занятых.
+
+    Занятые пользователи не удаляются из списка, а отмечаются в маске, поэтому
+    раунд не пересобирает списки на каждом шаге.
+    """
+
+    __slots__ = ('users', '_positions', '_matched')
+
+    def __init__(self, rows: Iterable[tuple]):
+        self.users: List[UserRecord] = [UserRecord(*row) for row in rows]
+        self._reindex()
+
+    def _reindex(self):
+        self._positions = {user.user_id: i for i, user in enumerate(self.users)}
+        self._matched = bytearray(len(self.users))
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def __iter__(self) -> Iterator[UserRecord]:
+        return iter(self.users)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._positions
+
+    def get(self, user_id: int, default=None):
+        position = self._positions.get(user_id)
+        return self.users[position] if position is not None else default
+
+    def shuffle(self):
+        """Перемешивает порядок обхода (маска при этом сбрасывается).
+
+        Менее уставшие пользователи выбирают партнеров первыми.
+        """
+        random.shuffle(self.users)
+        self.users.sort(key=lambda user: round(user.fatigue or 0.0, 1))
+        self._reindex()
+
+    def mark_matched(self, user_id: int):
+        position = self._positions.get(user_id)
+        if position is not None:
+            self._matched[position] = 1
+
+    def is_matched(self, user_id: int) -> bool:
+        position = self._positions.get(user_id)
+        return position is not None and bool(self._matched[position])
+
+    def unmatched(self) -> Iterator[UserRecord]:
+        """Свободные пользователи без копирования списка"""
+        matched = self._matched
+        return (user for i, user in enumerate(self.users) if not matched[i])
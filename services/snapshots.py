@@ -0,0 +1,133 @@
+import asyncio
+import datetime
+import glob
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from config import Config
+from database import Database
+from storage import release_backend
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotManager:
+    """Горячие копии БД и чтение тяжелой аналитики из последней копии.
+
+    Копия снимается online backup API SQLite без остановки бота и кладется
+    в BACKUP_DIR с меткой времени; хранятся последние BACKUP_KEEP копий, из
+    них же можно восстановить базу (backup_db.py restore). Выгрузки,
+    статистика и отладка админки читают последнюю копию в режиме только
+    для чтения и не конкурируют с записью пользователей.
+    """
+
+    def __init__(self, db: Database, directory: str = None, interval: float = None,
+                 keep: int = None, pages: int = None):
+        self.db = db
+        self.directory = directory or Config.BACKUP_DIR
+        self.interval = interval if interval is not None else Config.BACKUP_INTERVAL_MINUTES * 60
+        self.keep = keep or Config.BACKUP_KEEP
+        self.pages = pages or Config.BACKUP_PAGES_PER_STEP
+
+        self._reader: Optional[Database] = None
+        self._reader_path: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_duration: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.db.backend.supports_backup
+
+    def _prefix(self) -> str:
+        return os.path.splitext(os.path.basename(self.db.backend.path))[0]
+
+    def snapshots(self) -> list:
+        """Файлы копий, от старых к новым"""
+        if not self.enabled:
+            return []
+        return sorted(glob.glob(os.path.join(self.directory, f"{self._prefix()}-*.db")), key=os.path.getmtime)
+
+    def latest(self) -> Optional[str]:
+        files = self.snapshots()
+        return files[-1] if files else None
+
+    def take(self) -> Optional[str]:
+        """Снимает копию; возвращает путь к файлу или None при ошибке"""
+        if not self.enabled:
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, f"{self._prefix()}-{stamp}.db")
+        # Две копии за одну секунду (например, страховочная перед restore)
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f"{self._prefix()}-{stamp}-{suffix}.db")
+            suffix += 1
+        partial = path + '.partial'
+        started = time.perf_counter()
+        try:
+            self.db.backend.backup(partial, self.pages)
+            # Недописанная копия не должна попасть в список
+            os.replace(partial, path)
+        except Exception as e:
+            logger.error(f"Error taking database snapshot: {e}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            return None
+
+        self.last_duration = time.perf_counter() - started
+        self._rotate()
+        logger.info(f"Database snapshot {path} taken in {self.last_duration:.2f}s")
+        return path
+
+    def _rotate(self):
+        for path in self.snapshots()[:-self.keep]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error(f"Error removing old snapshot {path}: {e}")
+
+    def reader(self) -> Database:
+        """База для тяжелого чтения: последняя копия, а если копий нет - рабочая БД"""
+        path = self.latest()
+        if path is None:
+            return self.db
+
+        if path != self._reader_path:
+            if self._reader_path is not None:
+                release_backend(self._reader.db_path)
+            self._reader = Database(f"{Path(path).resolve().as_uri()}?mode=ro", read_only=True)
+            self._reader_path = path
+        return self._reader
+
+    def snapshot_time(self, reader: Database) -> Optional[datetime.datetime]:
+        """Время снятия копии, из которой читает reader (None - рабочая БД)"""
+        if reader is self.db or self._reader_path is None:
+            return None
+        return datetime.datetime.fromtimestamp(os.path.getmtime(self._reader_path))
+
+    async def _run(self):
+        while True:
+            await asyncio.to_thread(self.take)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Запускает периодическое копирование в текущем event loop"""
+        if self._task is None and self.enabled and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._reader is not None:
+            release_backend(self._reader.db_path)
+            self._reader = self._reader_path = None
@@ -0,0 +1,152 @@
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from aiogram import __version__ as aiogram_version
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.methods import (
+    AnswerCallbackQuery, GetUpdates, SendAudio, SendChatAction, SendDocument,
+    SendMediaGroup, SendPhoto, SendVideo,
+)
+from aiohttp import ClientSession, TraceConfig
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+
+from config import Config
+
+# Классы методов API по ожидаемой длительности запроса
+FAST_METHODS = (AnswerCallbackQuery, SendChatAction)
+UPLOAD_METHODS = (SendDocument, SendPhoto, SendVideo, SendAudio, SendMediaGroup)
+
+# Сколько последних замеров держать для перцентиля
+LATENCY_SAMPLES = 500
+
+
+def method_class(method) -> str:
+    if isinstance(method, GetUpdates):
+        return 'updates'
+    if isinstance(method, FAST_METHODS):
+        return 'fast'
+    if isinstance(method, UPLOAD_METHODS):
+        return 'upload'
+    return 'default'
+
+
+class TelegramSession(AiohttpSession):
+    """HTTP-сессия бота с настраиваемым пулом соединений и замерами.
+
+    Одна ClientSession и один TCPConnector живут весь срок работы бота:
+    соединения к API держатся keep-alive и переиспользуются, DNS кэшируется,
+    поэтому массовые отправки не платят за новое TCP/TLS-рукопожатие на
+    каждое сообщение. Таймауты задаются по классу метода, адрес API можно
+    заменить на локальный Bot API сервер (BOT_API_URL).
+    """
+
+    def __init__(self, api_url: str = None, **kwargs):
+        api_url = Config.BOT_API_URL if api_url is None else api_url
+        if api_url:
+            kwargs.setdefault('api', TelegramAPIServer.from_base(api_url, is_local=Config.BOT_API_LOCAL))
+        super().__init__(**kwargs)
+
+        self._connector_init.update(
+            limit=Config.BOT_CONNECTION_LIMIT,
+            limit_per_host=Config.BOT_CONNECTION_LIMIT,
+            keepalive_timeout=Config.BOT_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=Config.BOT_DNS_CACHE_TTL,
+        )
+        self.timeouts = {
+            'fast': Config.BOT_TIMEOUT_FAST,
+            'default': Config.BOT_TIMEOUT_DEFAULT,
+            'upload': Config.BOT_TIMEOUT_UPLOAD,
+        }
+
+        self._latency: Dict[str, dict] = {}
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_lookups = 0
+
+    def _trace_config(self) -> TraceConfig:
+        trace = TraceConfig()
+
+        async def on_create(session, context, params):
+            self.connections_created += 1
+
+        async def on_reuse(session, context, params):
+            self.connections_reused += 1
+
+        async def on_dns_miss(session, context, params):
+            self.dns_lookups += 1
+
+        trace.on_connection_create_end.append(on_create)
+        trace.on_connection_reuseconn.append(on_reuse)
+        trace.on_dns_cache_miss.append(on_dns_miss)
+        return trace
+
+    async def create_session(self) -> ClientSession:
+        if self._should_reset_connector:
+            await self.close()
+
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{aiogram_version}"},
+                trace_configs=[self._trace_config()],
+            )
+            self._should_reset_connector = False
+
+        return self._session
+
+    async def make_request(self, bot, method, timeout: Optional[int] = None):
+        kind = method_class(method)
+        if timeout is None:
+            timeout = self.timeouts.get(kind)
+
+        started = time.monotonic()
+        failed = False
+        try:
+            return await super().make_request(bot, method, timeout=timeout)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Long polling висит по замыслу, в задержки его не считаем
+            if kind != 'updates':
+                self._record(kind, time.monotonic() - started, failed)
+
+    def _record(self, kind: str, elapsed: float, failed: bool):
+        entry = self._latency.setdefault(kind, {
+            'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0,
+            'samples': deque(maxlen=LATENCY_SAMPLES),
+        })
+        entry['count'] += 1
+        entry['errors'] += failed
+        entry['total'] += elapsed
+        entry['max'] = max(entry['max'], elapsed)
+        entry['samples'].append(elapsed)
+
+    def stats(self) -> dict:
+        """Задержки по классам методов и переиспользование соединений"""
+        latency = {}
+        for kind, entry in self._latency.items():
+            samples = sorted(entry['samples'])
+            latency[kind] = {
+                'count': entry['count'],
+                'errors': entry['errors'],
+                'avg_ms': entry['total'] * 1000 / entry['count'],
+                'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+                'max_ms': entry['max'] * 1000,
+            }
+
+        connector = self._session.connector if self._session is not None and not self._session.closed else None
+        requests = self.connections_created + self.connections_reused
+        return {
+            'latency': latency,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+            'reuse_rate': self.connections_reused / requests if requests else 0.0,
+            'dns_lookups': self.dns_lookups,
+            'pool_limit': self._connector_init['limit'],
+            'idle_connections': sum(len(conns) for conns in connector._conns.values()) if connector is not None else 0,
+            'api': self.api.base.split('/bot')[0],
+        }
@@ -0,0 +1,25 @@
+from typing import Dict
+
+from storage.base import StorageBackend
+from storage.sqlite import SQLiteBackend
+
+_backends: Dict[str, StorageBackend] = {}
+
+
+def get_backend(url: str) -> StorageBackend:
+    """Бэкенд по адресу хранилища, один на процесс: postgresql://... или путь к файлу SQLite"""
+    if url not in _backends:
+        if url.startswith(('postgres://', 'postgresql://')):
+            from storage.postgres import PostgresBackend
+            _backends[url] = PostgresBackend(url)
+        else:
+            _backends[url] = SQLiteBackend(url)
+    return _backends[url]
+
+
+def release_backend(url: str):
+    """Закрывает бэкенд и убирает его из реестра (например, устаревший снимок)"""
+    backend = _backends.pop(url, None)
+    if backend is not None:
+        backend.shutdown()
+
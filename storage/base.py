@@ -0,0 +1,145 @@
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+
+class QueryMetrics:
+    """Счетчики запросов на процесс: число вызовов и суммарное время по тексту запроса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = defaultdict(int)
+        self._seconds = defaultdict(float)
+
+    @staticmethod
+    def statement_key(sql: str) -> str:
+        return ' '.join(sql.split())[:80]
+
+    def record(self, sql: str, seconds: float):
+        key = self.statement_key(sql)
+        with self._lock:
+            self._calls[key] += 1
+            self._seconds[key] += seconds
+
+    def top(self, limit: int = 5) -> List[Dict]:
+        """Самые дорогие запросы по суммарному времени"""
+        with self._lock:
+            items = sorted(self._seconds.items(), key=lambda item: item[1], reverse=True)[:limit]
+            return [
+                {'statement': key, 'calls': self._calls[key], 'total_ms': seconds * 1000}
+                for key, seconds in items
+            ]
+
+    def totals(self) -> Dict:
+        with self._lock:
+            return {'calls': sum(self._calls.values()), 'total_ms': sum(self._seconds.values()) * 1000}
+
+
+query_metrics = QueryMetrics()
+
+
+def dict_row(cursor, row: tuple) -> dict:
+    """row_factory: строка как dict, имена колонок считаются один раз на запрос"""
+    return dict(zip(cursor.fields, row))
+
+
+class StorageBackend:
+    """Хранилище Database: соединения и то, чем диалекты SQL отличаются.
+
+    Database пишет переносимый SQL (плейсхолдеры ? и :name, ON CONFLICT,
+    RETURNING), а схему, полнотекстовый поиск и архив спрашивает у бэкенда.
+    Соединение - одно на поток; его close() только завершает транзакцию,
+    shutdown() закрывает по-настоящему.
+    """
+
+    name = None
+    supports_backup = False
+
+    def __init__(self, url: str):
+        self.url = url
+        self._local = threading.local()
+
+    def connection(self):
+        """Соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        return conn
+
+    def close_connection(self):
+        """Закрывает соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.shutdown()
+            self._local.conn = None
+
+    def connect(self):
+        raise NotImplementedError
+
+    def shutdown(self):
+        """Освобождает ресурсы бэкенда (пул соединений)"""
+        self.close_connection()
+
+    # === SCHEMA ===
+    def prepare(self, cursor):
+        """Создает серверные объекты, нужные запросам (функции fatigue_decay, casefold)"""
+
+    def adapt_ddl(self, sql: str) -> str:
+        """DDL в синтаксисе SQLite -> DDL этого диалекта"""
+        return sql
+
+    def table_exists(self, cursor, table: str) -> bool:
+        raise NotImplementedError
+
+    def table_columns(self, cursor, table: str, schema: str = None) -> Dict[str, str]:
+        """Колонки таблицы в порядке объявления: {имя: тип}"""
+        raise NotImplementedError
+
+    def reset_sequence(self, cursor, table: str, column: str = 'id'):
+        """Продолжает автоинкремент после вставки строк с явными id"""
+
+    def backup(self, path: str, pages: int = -1):
+        """Онлайн-копия базы в файл path, без остановки записи"""
+        raise NotImplementedError(f"{self.name} storage does not support online backup")
+
+    # === SEARCH ===
+    @staticmethod
+    def search_tokens(query: str) -> List[str]:
+        return re.findall(r"\w+", (query or '').lower())
+
+    def create_search_index(self, cursor, fields: tuple):
+        raise NotImplementedError
+
+    def search_query(self, query: str) -> Optional[str]:
+        """Поисковый запрос: все слова, каждое как префикс; None, если слов нет"""
+        raise NotImplementedError
+
+    def search_users_sql(self, filters: str) -> str:
+        """SELECT u.* ... по релевантности; параметры: поисковый запрос и LIMIT"""
+        raise NotImplementedError
+
+    # === MAINTENANCE ===
+    def storage_stats(self, cursor) -> Dict:
+        """Размер базы: size_bytes, free_bytes (None - неизвестно), fragmentation в процентах"""
+        raise NotImplementedError
+
+    def optimize(self, cursor):
+        """Обновляет статистику планировщика запросов"""
+        raise NotImplementedError
+
+    def vacuum(self, cursor, pages: int = 0):
+        """Возвращает место после удалений; pages - предел страниц за раз (0 - без предела)"""
+        raise NotImplementedError
+
+    def integrity_check(self, cursor) -> Optional[List[str]]:
+        """Ошибки целостности ([] - все в порядке, None - проверка не поддерживается)"""
+        return None
+
+    # === ARCHIVE ===
+    def attach_archive(self, cursor):
+        """Делает доступной схему archive для помесячных архивных таблиц"""
+        raise NotImplementedError
+
+    def detach_archive(self, cursor):
+        pass
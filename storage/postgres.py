@@ -0,0 +1,281 @@
+import re
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+from config import Config
+from storage.base import StorageBackend, query_metrics
+
+try:
+    from psycopg.pq import TransactionStatus
+    from psycopg_pool import ConnectionPool
+except ImportError:  # PostgreSQL - необязательная зависимость
+    ConnectionPool = None
+
+
+_SQL_TOKEN = re.compile(r"'(?:[^']|'')*'|::|\?|:(\w+)|%")
+_WRITE_STATEMENT = re.compile(r"\s*(INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+_DDL_REPLACEMENTS = (
+    (re.compile(r"\bINTEGER PRIMARY KEY AUTOINCREMENT\b", re.IGNORECASE), "BIGSERIAL PRIMARY KEY"),
+    # Telegram user_id не помещается в 32 бита
+    (re.compile(r"\bINTEGER\b", re.IGNORECASE), "BIGINT"),
+    (re.compile(r"\bREAL\b", re.IGNORECASE), "DOUBLE PRECISION"),
+    (re.compile(r"\s*WITHOUT ROWID", re.IGNORECASE), ""),
+    # SQLite внешние ключи не проверяет (PRAGMA foreign_keys выключен) - ведем себя так же
+    (re.compile(r",\s*FOREIGN KEY\s*\([^)]*\)\s*REFERENCES\s+\w+\s*\([^)]*\)", re.IGNORECASE), ""),
+)
+
+
+@lru_cache(maxsize=1024)
+def to_pyformat(sql: str) -> str:
+    """Плейсхолдеры sqlite3 (? и :name) -> psycopg (%s и %(name)s), % экранируется"""
+    def replace(match):
+        token = match.group(0)
+        if token == '?':
+            return '%s'
+        if token == '%':
+            return '%%'
+        if match.group(1):
+            return f'%({match.group(1)})s'
+        return token.replace('%', '%%')
+    return _SQL_TOKEN.sub(replace, sql)
+
+
+class PostgresCursor:
+    """Курсор с интерфейсом sqlite3: row_factory, fields, fetchone/fetchall"""
+
+    row_factory = None
+    lastrowid = None
+
+    def __init__(self, connection: 'PostgresConnection'):
+        self.connection = connection
+        self._cursor = None
+        self._fields = None
+
+    def execute(self, sql, parameters=()):
+        self._fields = None
+        self._cursor = self.connection.for_statement(sql).cursor()
+        started = time.perf_counter()
+        try:
+            self._cursor.execute(to_pyformat(sql), parameters)
+        finally:
+            query_metrics.record(sql, time.perf_counter() - started)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._fields = None
+        self._cursor = self.connection.for_statement(sql).cursor()
+        started = time.perf_counter()
+        try:
+            self._cursor.executemany(to_pyformat(sql), list(seq_of_parameters))
+        finally:
+            query_metrics.record(sql, time.perf_counter() - started)
+        return self
+
+    @property
+    def description(self):
+        return self._cursor.description if self._cursor else None
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount if self._cursor else -1
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            self._fields = tuple(column.name for column in self._cursor.description)
+        return self._fields
+
+    def _row(self, row):
+        return self.row_factory(self, row) if self.row_factory and row is not None else row
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size: int = 1) -> list:
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self) -> list:
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class PostgresConnection:
+    """Соединение потока поверх пула, ведет себя как sqlite3.Connection.
+
+    Транзакция открывается перед первым INSERT/UPDATE/DELETE, как в sqlite3,
+    поэтому чтение не держит соединение в транзакции. close() откатывает
+    незавершенную транзакцию и возвращает соединение в пул; следующий
+    запрос возьмет соединение из пула заново.
+    """
+
+    def __init__(self, pool: 'ConnectionPool'):
+        self._pool = pool
+        self._conn = None
+
+    def for_statement(self, sql: str):
+        if self._conn is None:
+            self._conn = self._pool.getconn()
+        if not self.in_transaction and _WRITE_STATEMENT.match(sql):
+            self._conn.execute("BEGIN")
+        return self._conn
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._conn is not None and self._conn.info.transaction_status != TransactionStatus.IDLE
+
+    def cursor(self) -> PostgresCursor:
+        return PostgresCursor(self)
+
+    def execute(self, sql, parameters=()) -> PostgresCursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters) -> PostgresCursor:
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if self.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def close(self):
+        if self._conn is None:
+            return
+        try:
+            if not self._conn.closed:
+                self.rollback()
+        finally:
+            # Сломанное соединение пул отбросит сам
+            conn, self._conn = self._conn, None
+            self._pool.putconn(conn)
+
+    shutdown = close
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+
+class PostgresBackend(StorageBackend):
+    """PostgreSQL через пул соединений psycopg; url - postgresql://..."""
+
+    name = 'postgres'
+
+    def __init__(self, url: str):
+        if ConnectionPool is None:
+            raise RuntimeError("PostgreSQL storage requires psycopg and psycopg_pool: pip install 'psycopg[binary]' psycopg_pool")
+        super().__init__(url)
+        self.pool = ConnectionPool(
+            url, min_size=1, max_size=Config.DATABASE_POOL_SIZE,
+            kwargs={'autocommit': True}, check=ConnectionPool.check_connection,
+            open=True
+        )
+        self._search_vector = None
+
+    def connect(self) -> PostgresConnection:
+        return PostgresConnection(self.pool)
+
+    def shutdown(self):
+        super().shutdown()
+        self.pool.close()
+
+    def prepare(self, cursor):
+        """SQL-функции, которые в SQLite регистрируются из Python"""
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION fatigue_decay(score DOUBLE PRECISION, updated TEXT, moment TEXT)
+            RETURNS DOUBLE PRECISION LANGUAGE SQL IMMUTABLE AS $$
+                SELECT CASE
+                    WHEN score IS NULL OR score = 0 OR updated IS NULL OR updated = '' THEN COALESCE(score, 0)
+                    ELSE score * power(0.5, GREATEST(
+                        EXTRACT(EPOCH FROM moment::timestamp - updated::timestamp)::float8 / 86400, 0
+                    ) / {float(Config.FATIGUE_HALF_LIFE_DAYS)})
+                END
+            $$
+        ''')
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION casefold(value TEXT)
+            RETURNS TEXT LANGUAGE SQL IMMUTABLE AS $$ SELECT lower(btrim(value)) $$
+        ''')
+
+    def adapt_ddl(self, sql: str) -> str:
+        for pattern, replacement in _DDL_REPLACEMENTS:
+            sql = pattern.sub(replacement, sql)
+        return sql
+
+    def table_exists(self, cursor, table: str) -> bool:
+        cursor.execute('''
+            SELECT 1 FROM information_schema.tables
+            WHERE table_schema = current_schema() AND table_name = ?
+        ''', (table,))
+        return cursor.fetchone() is not None
+
+    def table_columns(self, cursor, table: str, schema: str = None) -> Dict[str, str]:
+        cursor.execute('''
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = COALESCE(?, current_schema()) AND table_name = ?
+            ORDER BY ordinal_position
+        ''', (schema, table))
+        return dict(cursor.fetchall())
+
+    def reset_sequence(self, cursor, table: str, column: str = 'id'):
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(?, ?), COALESCE(MAX({column}), 0) + 1, false) FROM {table}",
+            (table, column)
+        )
+
+    def create_search_index(self, cursor, fields: tuple):
+        """GIN-индекс по выражению tsvector: отдельная колонка и триггеры не нужны"""
+        self._search_vector = "to_tsvector('simple', {})".format(
+            " || ' ' || ".join(f"coalesce({field}, '')" for field in fields)
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_users_search ON users USING GIN ({self._search_vector})")
+
+    def search_query(self, query: str) -> Optional[str]:
+        """'Иван мос' -> 'иван:* & мос:*'"""
+        tokens = self.search_tokens(query)
+        return ' & '.join(f"{token}:*" for token in tokens) or None
+
+    def search_users_sql(self, filters: str) -> str:
+        return f'''
+            SELECT u.* FROM users u, to_tsquery('simple', ?) AS query
+            WHERE {self._search_vector} @@ query {filters}
+            ORDER BY ts_rank({self._search_vector}, query) DESC
+            LIMIT ?
+        '''
+
+    def storage_stats(self, cursor) -> Dict:
+        """Размер базы и доля мертвых строк, которые ждут VACUUM"""
+        cursor.execute('''
+            SELECT pg_database_size(current_database()),
+                   COALESCE(SUM(n_dead_tup), 0), COALESCE(SUM(n_live_tup + n_dead_tup), 0)
+            FROM pg_stat_user_tables
+        ''')
+        size, dead, total = cursor.fetchone()
+        return {
+            'size_bytes': size,
+            'free_bytes': None,
+            'fragmentation': round(100 * float(dead) / float(total), 1) if total else 0.0,
+        }
+
+    def optimize(self, cursor):
+        cursor.execute("ANALYZE")
+
+    def vacuum(self, cursor, pages: int = 0):
+        # Обычный VACUUM не блокирует запись; место отдается под новые строки
+        cursor.execute("VACUUM")
+
+    def attach_archive(self, cursor):
+        """Архивные таблицы живут в схеме archive той же базы"""
+        cursor.execute("CREATE SCHEMA IF NOT EXISTS archive")
@@ -0,0 +1,209 @@
+import datetime
+import logging
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from config import Config
+from storage.base import StorageBackend, query_metrics
+
+logger = logging.getLogger(__name__)
+
+# Значение PRAGMA auto_vacuum
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def fatigue_decay(score, updated, now):
+    """Усталость с экспоненциальным затуханием на момент now (SQL-функция)"""
+    if not score or not updated:
+        return score or 0.0
+    days = (datetime.datetime.fromisoformat(now) - datetime.datetime.fromisoformat(updated)).total_seconds() / 86400
+    return score * 0.5 ** (max(days, 0) / Config.FATIGUE_HALF_LIFE_DAYS)
+
+
+def casefold(value):
+    return value.strip().casefold() if value else value
+
+
+class RepositoryCursor(sqlite3.Cursor):
+    """Курсор с замером времени запросов и кэшем имен колонок для dict_row"""
+
+    _fields = None
+
+    def execute(self, sql, parameters=()):
+        self._fields = None
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            query_metrics.record(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._fields = None
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            query_metrics.record(sql, time.perf_counter() - started)
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            self._fields = tuple(column[0] for column in self.description)
+        return self._fields
+
+
+class RepositoryConnection(sqlite3.Connection):
+    """Долгоживущее соединение потока.
+
+    close() не закрывает соединение, а только откатывает незавершенную
+    транзакцию: код вида get_connection() ... close() продолжает работать,
+    а подготовленные запросы остаются в кэше sqlite3 между вызовами.
+    """
+
+    def cursor(self, factory=RepositoryCursor):
+        return super().cursor(factory)
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def shutdown(self):
+        super().close()
+
+
+class SQLiteBackend(StorageBackend):
+    """Файл SQLite; url - путь к файлу (можно с префиксом sqlite:///) или URI file:...?mode=ro"""
+
+    name = 'sqlite'
+    supports_backup = True
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        self.path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+
+    def connect(self) -> RepositoryConnection:
+        conn = sqlite3.connect(
+            self.path, factory=RepositoryConnection,
+            cached_statements=Config.SQLITE_STATEMENT_CACHE,
+            uri=self.path.startswith('file:')
+        )
+        conn.create_function("fatigue_decay", 3, fatigue_decay, deterministic=True)
+        conn.create_function("casefold", 1, casefold, deterministic=True)
+        return conn
+
+    def prepare(self, cursor):
+        # Действует только для новой базы (до первой таблицы); старую переводит vacuum()
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    def backup(self, path: str, pages: int = -1):
+        """Копия через online backup API: по pages страниц за шаг.
+
+        Между шагами база открыта для записи; если ее изменило другое
+        соединение, SQLite сам продолжит копирование с учетом изменений.
+        """
+        source = self.connect()
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target, pages=pages, sleep=0.01)
+        finally:
+            target.close()
+            source.shutdown()
+
+    def table_exists(self, cursor, table: str) -> bool:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone() is not None
+
+    def table_columns(self, cursor, table: str, schema: str = None) -> Dict[str, str]:
+        cursor.execute(f"PRAGMA {schema or 'main'}.table_info({table})")
+        return {column[1]: column[2] for column in cursor.fetchall()}
+
+    def create_search_index(self, cursor, fields: tuple):
+        """FTS5-индекс users_fts по полям поиска.
+
+        Индекс внешний (content='users'), синхронизируется триггерами; при
+        первом создании строится по существующим пользователям.
+        """
+        index_created = not self.table_exists(cursor, 'users_fts')
+        columns = ', '.join(fields)
+        new_values = ', '.join(f"new.{field}" for field in fields)
+        old_values = ', '.join(f"old.{field}" for field in fields)
+
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                {columns}, content='users', content_rowid='user_id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+                INSERT INTO users_fts (rowid, {columns}) VALUES (new.user_id, {new_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+                INSERT INTO users_fts (users_fts, rowid, {columns}) VALUES ('delete', old.user_id, {old_values});
+            END
+        ''')
+        # Только поисковые поля: last_active и счетчики индекс не трогают
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF {columns} ON users BEGIN
+                INSERT INTO users_fts (users_fts, rowid, {columns}) VALUES ('delete', old.user_id, {old_values});
+                INSERT INTO users_fts (rowid, {columns}) VALUES (new.user_id, {new_values});
+            END
+        ''')
+
+        if index_created:
+            cursor.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+
+    def search_query(self, query: str) -> Optional[str]:
+        """'Иван мос' -> '"иван"* "мос"*'"""
+        tokens = self.search_tokens(query)
+        return ' '.join(f'"{token}"*' for token in tokens) or None
+
+    def search_users_sql(self, filters: str) -> str:
+        return f'''
+            SELECT u.* FROM users_fts
+            JOIN users u ON u.user_id = users_fts.rowid
+            WHERE users_fts MATCH ? {filters}
+            ORDER BY bm25(users_fts)
+            LIMIT ?
+        '''
+
+    def storage_stats(self, cursor) -> Dict:
+        page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+        page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+        freelist = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        return {
+            'size_bytes': page_size * page_count,
+            'free_bytes': page_size * freelist,
+            'fragmentation': round(100 * freelist / page_count, 1) if page_count else 0.0,
+        }
+
+    def optimize(self, cursor):
+        # PRAGMA optimize анализирует только таблицы с устаревшей статистикой;
+        # если ANALYZE не запускался ни разу, статистики нет совсем
+        if not self.table_exists(cursor, 'sqlite_stat1'):
+            cursor.execute("ANALYZE")
+        cursor.execute("PRAGMA optimize")
+
+    def vacuum(self, cursor, pages: int = 0):
+        """Incremental vacuum; база без auto_vacuum один раз переводится полным VACUUM"""
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            logger.info(f"Switching {self.path} to incremental auto_vacuum (full VACUUM)")
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+            return
+        # Каждый шаг прагмы освобождает одну страницу, а execute() делает один шаг;
+        # executescript() выполняет ее до конца
+        cursor.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+
+    def integrity_check(self, cursor) -> Optional[List[str]]:
+        problems = [row[0] for row in cursor.execute("PRAGMA quick_check").fetchall()]
+        return [] if problems == ['ok'] else problems
+
+    def attach_archive(self, cursor):
+        cursor.execute("ATTACH DATABASE ? AS archive", (Config.ARCHIVE_DB_PATH,))
+
+    def detach_archive(self, cursor):
+        cursor.execute("DETACH DATABASE archive")
@@ -0,0 +1,29 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Модули handlers создают Database() при импорте - направляем ее и архив во временный каталог,
+# чтобы тесты не трогали random_coffee.db рабочего каталога
+_workdir = tempfile.mkdtemp(prefix='coffee-tests-')
+os.environ['DATABASE_URL'] = os.path.join(_workdir, 'handlers.db')
+os.environ['ARCHIVE_DB_PATH'] = os.path.join(_workdir, 'archive.db')
+os.environ['BACKUP_DIR'] = os.path.join(_workdir, 'backups')
+
+from config import Config  # noqa: E402
+from database import Database  # noqa: E402
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Пустая база SQLite на тест"""
+    monkeypatch.setattr(Config, 'ARCHIVE_DB_PATH', str(tmp_path / 'archive.db'))
+    database = Database(str(tmp_path / 'test.db'))
+    yield database
+    database.backend.shutdown()
+
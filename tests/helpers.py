@@ -0,0 +1,27 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database
+
+
+def add_users(db: Database, user_ids, pool: str = None, **profile):
+    """Пользователи с заполненным профилем"""
+    for user_id in user_ids:
+        assert db.add_user(user_id, f"user{user_id}", pool=pool)
+        assert db.update_user_profile(user_id, **{
+            'name': f"User {user_id}", 'city': 'Москва', 'age': 30,
+            'interests': 'python, кофе', 'goals': 'новые знакомства',
+            **profile,
+        })
+
+
+def run_concurrently(calls):
+    """Запускает вызовы одновременно из разных потоков (у каждого свое соединение)"""
+    barrier = threading.Barrier(len(calls))
+
+    def run(call):
+        barrier.wait()
+        return call()
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        return list(executor.map(run, calls))
@@ -0,0 +1,35 @@
+from tests.helpers import add_users, run_concurrently
+
+
+def match_id_between(db, user_id):
+    return db.get_match_inbox(user_id)[0]['match_id']
+
+
+def test_acceptance_event_fires_once_under_concurrency(db):
+    add_users(db, [1, 2])
+    assert db.create_match(1, 2, 50, [])
+    match_id = match_id_between(db, 1)
+
+    results = run_concurrently([
+        lambda: db.update_match_acceptance(match_id, 1, True),
+        lambda: db.update_match_acceptance(match_id, 2, True),
+    ])
+
+    assert all(result is not None for result in results)
+    assert sum(result['both_accepted'] for result in results) == 1
+    assert db.get_match(match_id)['status'] == 'accepted'
+    assert db.get_user(1)['matches_accepted'] == db.get_user(2)['matches_accepted'] == 1
+    # Мэтч закрыт - повторное нажатие ничего не меняет
+    assert db.update_match_acceptance(match_id, 1, True) is None
+
+
+def test_acceptance_ignores_outsiders_and_closed_matches(db):
+    add_users(db, [1, 2, 3])
+    assert db.create_match(1, 2, 50, [])
+    match_id = match_id_between(db, 1)
+
+    assert db.update_match_acceptance(match_id, 3, True) is None
+    rejected = db.update_match_acceptance(match_id, 1, False)
+    assert rejected and not rejected['both_accepted']
+    assert db.update_match_status(match_id, 'rejected', 1)
+    assert db.update_match_acceptance(match_id, 2, True) is None
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+from database import Database
+from services.action_log import ActionLogWriter
+
+
+def test_failed_writes_keep_events_up_to_limit():
+    written = []
+    available = False
+
+    def write_rows(rows):
+        if available:
+            written.extend(rows)
+        return available
+
+    writer = ActionLogWriter(write_rows, batch_size=100, max_pending=5, flush_interval=60)
+    for i in range(8):
+        writer.add((i, 'test', None, ''))
+
+    # БД недоступна: самые старые события остаются, лишние сосчитаны как потерянные
+    assert writer.pending == 5
+    assert writer.dropped_total == 3
+    available = True
+    assert writer.flush() == 5
+    assert [row[0] for row in written] == [0, 1, 2, 3, 4]
+
+
+def test_read_only_database_ignores_actions(db):
+    reader = Database(f"{Path(db.db_path).resolve().as_uri()}?mode=ro", read_only=True)
+    reader.log_user_action(1, 'test')
+    assert reader.action_log is None
@@ -0,0 +1,15 @@
+from handlers import admin
+from tests.helpers import add_users
+
+
+def test_users_page_escapes_query_and_profile_fields(db, monkeypatch):
+    monkeypatch.setattr(admin, 'db', db)
+    add_users(db, [1], name="<Ann & Co>", city="<b>Москва</b>")
+
+    text, _ = admin.render_users_page("<Ann")
+    assert "«&lt;Ann»" in text
+    assert "&lt;Ann &amp; Co&gt;" in text
+    assert "&lt;b&gt;Москва&lt;/b&gt;" in text
+
+    text, _ = admin.render_users_page("<nobody & co")
+    assert "«&lt;nobody &amp; co»" in text
@@ -0,0 +1,39 @@
+from tests.helpers import add_users, run_concurrently
+
+
+def test_matches_count_counts_pairings_not_successes(db):
+    add_users(db, [1, 2, 3])
+    assert db.create_match(1, 2, 50, [])
+    assert db.create_match(1, 3, 50, [])
+
+    user = db.get_user(1)
+    assert (user['matches_count'], user['matches_accepted'], user['matches_successful']) == (2, 0, 0)
+
+    match_id = [m['match_id'] for m in db.get_match_inbox(1) if m['partner']['user_id'] == 2][0]
+    db.update_match_acceptance(match_id, 1, True)
+    db.update_match_acceptance(match_id, 2, True)
+    assert db.set_match_success(match_id, True)
+    # Повторная оценка не засчитывается
+    assert not db.set_match_success(match_id, True)
+
+    user = db.get_user(1)
+    assert (user['matches_count'], user['matches_accepted'], user['matches_successful']) == (2, 1, 1)
+    assert db.get_user(3)['matches_successful'] == 0
+
+
+def test_counters_match_rows_after_concurrent_writes(db):
+    user_ids = list(range(1, 21))
+    add_users(db, user_ids)
+    pairs = [(a, b) for a in user_ids for b in user_ids if a < b][:60]
+
+    assert all(run_concurrently([lambda pair=pair: db.create_match(*pair, 50, []) for pair in pairs]))
+    matches = db.get_matches_for_export()
+    successful_ids = {m['id'] for m in matches[:10]}
+    # Каждую оценку присылают оба участника одновременно - засчитывается одна
+    run_concurrently([lambda match_id=match_id: db.set_match_success(match_id, True) for match_id in successful_ids] * 2)
+
+    for user_id in user_ids:
+        user = db.get_user(user_id)
+        involved = [m for m in matches if user_id in (m['user1_id'], m['user2_id'])]
+        assert user['matches_count'] == len(involved)
+        assert user['matches_successful'] == sum(1 for m in involved if m['id'] in successful_ids)
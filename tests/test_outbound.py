@@ -0,0 +1,82 @@
+import asyncio
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from services.outbound import BULK, INTERACTIVE, TRANSACTIONAL, OutboundScheduler, send_priority
+
+
+class FakeApi:
+    """make_request без сети: запоминает порядок отправки, может ответить flood wait"""
+
+    def __init__(self, flood_waits=0):
+        self.sent = []
+        self.flood_waits = flood_waits
+
+    async def __call__(self, bot, method):
+        if self.flood_waits:
+            self.flood_waits -= 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+        self.sent.append(method.text)
+        return True
+
+
+def send(scheduler, api, text, priority=INTERACTIVE):
+    with send_priority(priority):
+        return asyncio.create_task(scheduler(api, None, SendMessage(chat_id=1, text=text)))
+
+
+def test_interactive_overtakes_queued_bulk():
+    async def scenario():
+        scheduler = OutboundScheduler(rate=20, burst=1, reserve=0)
+        api = FakeApi()
+        tasks = [send(scheduler, api, f"bulk{i}", BULK) for i in range(4)]
+        while not api.sent:
+            await asyncio.sleep(0.01)
+        tasks.append(send(scheduler, api, "answer"))
+        tasks.append(send(scheduler, api, "accepted", TRANSACTIONAL))
+        await asyncio.gather(*tasks)
+        stats = scheduler.stats()
+        await scheduler.close()
+        return api.sent, stats
+
+    sent, stats = asyncio.run(scenario())
+    assert sent == ["bulk0", "answer", "accepted", "bulk1", "bulk2", "bulk3"]
+    assert [stats[name]['sent'] for name in ('interactive', 'transactional', 'bulk')] == [1, 1, 4]
+    assert all(class_stats['queued'] == 0 for class_stats in stats.values())
+
+
+def test_reserve_is_kept_for_interactive():
+    async def scenario():
+        scheduler = OutboundScheduler(rate=2, burst=3, reserve=2)
+        api = FakeApi()
+        bulk = [send(scheduler, api, f"bulk{i}", BULK) for i in range(2)]
+        await asyncio.sleep(0.1)
+        # Вторая массовая отправка ждет: оставшиеся токены - резерв ответов
+        assert api.sent == ["bulk0"]
+        assert scheduler.stats()['bulk']['queued'] == 1
+        await asyncio.wait_for(send(scheduler, api, "answer"), 0.1)
+        await scheduler.close()
+        for task in bulk:
+            task.cancel()
+        return api.sent
+
+    assert asyncio.run(scenario()) == ["bulk0", "answer"]
+
+
+def test_flood_wait_pauses_queue_and_retries():
+    async def scenario():
+        scheduler = OutboundScheduler(rate=100, burst=10, reserve=0)
+        api = FakeApi(flood_waits=1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(send(scheduler, api, "first"), send(scheduler, api, "second", BULK))
+        elapsed = loop.time() - started
+        await scheduler.close()
+        return api.sent, scheduler.flood_waits, elapsed
+
+    sent, flood_waits, elapsed = asyncio.run(scenario())
+    assert sorted(sent) == ["first", "second"]
+    assert flood_waits == 1
+    # Повтор ушел только после retry_after
+    assert elapsed >= 0.9
@@ -0,0 +1,40 @@
+from tests.helpers import add_users
+
+
+def walk_forward(db, limit):
+    ids, after_id = [], None
+    while True:
+        page = db.get_active_users_page(after_id=after_id, limit=limit)
+        ids.extend(u['user_id'] for u in page['items'])
+        if not page['has_next']:
+            return ids
+        after_id = page['items'][-1]['user_id']
+
+
+def test_keyset_pages_cover_every_user_once(db):
+    add_users(db, range(1, 24))
+
+    assert walk_forward(db, 5) == list(range(1, 24))
+
+    ids = []
+    page = db.get_active_users_page(before_id=24, limit=5)
+    while True:
+        ids[:0] = [u['user_id'] for u in page['items']]
+        if not page['has_prev']:
+            break
+        before_id = page['items'][0]['user_id']
+        page = db.get_active_users_page(before_id=before_id, limit=5)
+    assert ids == list(range(1, 24))
+
+
+def test_keyset_pages_stable_when_rows_change_between_pages(db):
+    add_users(db, range(10, 30))
+
+    first = db.get_active_users_page(limit=5)
+    # Изменения до курсора не сдвигают следующие страницы (в отличие от OFFSET)
+    add_users(db, [1, 2])
+    db.set_user_active(10, False)
+    second = db.get_active_users_page(after_id=first['items'][-1]['user_id'], limit=5)
+
+    assert [u['user_id'] for u in first['items']] == [10, 11, 12, 13, 14]
+    assert [u['user_id'] for u in second['items']] == [15, 16, 17, 18, 19]
@@ -0,0 +1,49 @@
+import random
+import subprocess
+import sys
+
+from benchmark_matching import generate_users
+from config import Config
+from database import Database
+from services.matcher import MatchMaker
+
+
+def fill_synthetic(db, count):
+    for profile in generate_users(count):
+        user_id = profile.pop('user_id')
+        assert db.add_user(user_id, f"user{user_id}")
+        assert db.update_user_profile(user_id, **profile)
+
+
+def round_summary(db):
+    matches = db.get_matches_for_export()
+    return len(matches), sum(m['is_forced'] for m in matches), sum(m['match_score'] for m in matches)
+
+
+def test_parallel_round_matches_exact_round(tmp_path, monkeypatch):
+    """Параллельный скоринг top-K не должен уводить пользователей в случайные пары"""
+    monkeypatch.setattr(Config, 'MATCHING_TOP_K', 3)
+    monkeypatch.setattr(Config, 'MATCHING_WORKERS', 2)
+    summaries = {}
+    for parallel in (False, True):
+        db = Database(str(tmp_path / f"parallel-{parallel}.db"))
+        fill_synthetic(db, 200)
+        random.seed(7)
+        MatchMaker(db).run_matching_round(force_all=False, incremental=False,
+                                          approximate=False, parallel=parallel, pool=Config.DEFAULT_POOL)
+        summaries[parallel] = round_summary(db)
+        db.backend.shutdown()
+
+    exact_count, exact_forced, exact_score = summaries[False]
+    parallel_count, parallel_forced, parallel_score = summaries[True]
+    assert parallel_count == exact_count == 100
+    assert parallel_forced == exact_forced == 0
+    # Ничьи по баллам разрешаются по-разному, поэтому сумма может чуть отличаться
+    assert parallel_score >= exact_score * 0.98
+
+
+def test_importing_main_has_no_side_effects():
+    """Процессы скоринга импортируют main.py: без роутеров, Database() и соединений"""
+    code = "import sys, main; print(sorted(m for m in ('database', 'handlers') if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
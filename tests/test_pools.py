@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from config import Config
+from services.matcher import MatchMaker
+from tests.helpers import add_users
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_pools_never_mix(db, monkeypatch, parallel):
+    monkeypatch.setattr(Config, 'MATCHING_WORKERS', 2)
+    add_users(db, range(1, 9))
+    add_users(db, range(11, 15), pool='other')
+    match_maker = MatchMaker(db)
+
+    created = match_maker.run_matching_round(force_all=False, incremental=False,
+                                             approximate=False, parallel=parallel)
+
+    pools = {user['user_id']: user['pool'] for user in db.get_all_active_users()}
+    matches = db.get_matches_for_export()
+    assert created == len(matches) == 6
+    for match in matches:
+        assert pools[match['user1_id']] == pools[match['user2_id']] == match['pool']
+    assert match_maker.last_pool_sizes == {Config.DEFAULT_POOL: 8, 'other': 4}
+
+
+def test_incremental_round_and_manual_match_respect_pools(db):
+    add_users(db, range(1, 5))
+    add_users(db, range(11, 13), pool='other')
+    match_maker = MatchMaker(db)
+
+    assert match_maker.run_incremental_round() == 3
+    pools = {user['user_id']: user['pool'] for user in db.get_all_active_users()}
+    assert all(pools[m['user1_id']] == pools[m['user2_id']] for m in db.get_matches_for_export())
+
+    db.cleanup_matches()
+    assert not match_maker.create_specific_match(1, 11)
+    # Переход в другой пул: старые кандидаты пользователя больше не используются
+    assert db.set_user_pool(1, 'other')
+    assert 1 not in db.get_match_candidates(Config.DEFAULT_POOL)
+    assert match_maker.create_specific_match(1, 11)
+
+
+def test_pool_rounds_async_report_each_pool(db):
+    add_users(db, range(1, 7))
+    add_users(db, range(11, 15), pool='other')
+    add_users(db, [21], pool='solo')
+    match_maker = MatchMaker(db)
+
+    results = asyncio.run(match_maker.run_pool_rounds_async(force_all=False, incremental=False, parallel=False))
+
+    assert results == {Config.DEFAULT_POOL: 3, 'other': 2, 'solo': 0}
+    assert match_maker.last_pool_sizes == {Config.DEFAULT_POOL: 6, 'other': 4, 'solo': 1}
+    # Раунд в одном пуле не смешивает свой размер с прошлыми результатами
+    db.cleanup_matches()
+    match_maker.run_matching_round(force_all=True, pool='other')
+    assert match_maker.last_pool_sizes == {'other': 4}
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from check_storage import CHECKS, fill_users
+from config import Config
+from database import Database
+
+# Проверки check_storage.py как тесты: на SQLite всегда, на PostgreSQL - если задан
+# TEST_DATABASE_URL (пустая база). Проверки идут по порядку на одной базе.
+BACKENDS = ['sqlite'] + (['postgres'] if os.getenv('TEST_DATABASE_URL') else [])
+
+
+@pytest.fixture(scope='module', params=BACKENDS)
+def storage(request, tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp(request.param)
+    archive_path = Config.ARCHIVE_DB_PATH
+    Config.ARCHIVE_DB_PATH = str(tmp_path / 'archive.db')
+
+    url = os.environ['TEST_DATABASE_URL'] if request.param == 'postgres' else str(tmp_path / 'check.db')
+    database = Database(url)
+    if database.get_user_stats().get('total_users'):
+        pytest.fail("TEST_DATABASE_URL должен указывать на пустую базу")
+    fill_users(database)
+    yield database
+
+    database.backend.shutdown()
+    Config.ARCHIVE_DB_PATH = archive_path
+
+
+@pytest.mark.parametrize('check', CHECKS, ids=[check.__name__ for check in CHECKS])
+def test_storage_check(storage, check):
+    check(storage)
@@ -0,0 +1,28 @@
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError,
+    TelegramNotFound, TelegramRetryAfter, TelegramServerError,
+)
+
+# Результаты доставки сообщения пользователю
+DELIVERED = 'sent'
+UNREACHABLE = 'blocked'   # заблокировал бота / удалил аккаунт - писать бессмысленно
+RETRY = 'retry'           # лимит Telegram или временный сбой - можно повторить
+FAILED = 'failed'         # прочие ошибки конкретного сообщения
+
+_UNREACHABLE_MARKERS = (
+    'chat not found', 'user not found', 'user is deactivated',
+    'bot was blocked', 'bot can\'t initiate conversation', 'peer_id_invalid',
+)
+
+
+def classify_delivery_error(error: Exception) -> str:
+    """Относит ошибку отправки к одному из исходов: UNREACHABLE, RETRY или FAILED"""
+    if isinstance(error, TelegramForbiddenError):
+        return UNREACHABLE
+    if isinstance(error, (TelegramRetryAfter, TelegramNetworkError, TelegramServerError)):
+        return RETRY
+    if isinstance(error, (TelegramBadRequest, TelegramNotFound)):
+        message = str(error).lower()
+        if any(marker in message for marker in _UNREACHABLE_MARKERS):
+            return UNREACHABLE
+    return FAILED
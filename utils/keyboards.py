@@ -129,6 +129,16 @@ def get_admin_matching_inline():
         ]
     )
 
+def get_admin_pools_inline(action: str, pool_sizes: dict):
+    """Выбор пула для раунда: action - callback запуска, к нему добавляется :пул"""
+    buttons = [
+        [InlineKeyboardButton(text=f"🏘 {pool} ({size})", callback_data=f"{action}:{pool}")]
+        for pool, size in pool_sizes.items()
+    ]
+    buttons.append([InlineKeyboardButton(text="🌐 Все пулы параллельно", callback_data=f"{action}:*")])
+    buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="admin_matching")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
 def get_admin_management_inline():
     """Меню управления"""
     return InlineKeyboardMarkup(
@@ -151,6 +161,39 @@ def get_admin_management_inline():
         ]
     )
 
+def get_admin_pagination_inline(prefix: str, first_id: int, last_id: int, has_prev: bool, has_next: bool,
+                                back_callback: str, search: bool = False, query: str = None):
+    """Листание страниц админ-списка: prefix:prev:<первый id> / prefix:next:<последний id>"""
+    keyboard = []
+    navigation = []
+    if has_prev and first_id is not None:
+        navigation.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}:prev:{first_id}"))
+    if has_next and last_id is not None:
+        navigation.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=f"{prefix}:next:{last_id}"))
+    if navigation:
+        keyboard.append(navigation)
+
+    if search:
+        search_row = [InlineKeyboardButton(text="🔎 Поиск", callback_data=f"{prefix}_search")]
+        if query:
+            search_row.append(InlineKeyboardButton(text="✖️ Сбросить поиск", callback_data=prefix))
+        keyboard.append(search_row)
+
+    keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data=back_callback)])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def get_admin_user_choice_inline(users: list):
+    """Результаты поиска пользователей: по кнопке на каждого"""
+    keyboard = [
+        [InlineKeyboardButton(
+            text=f"{user.get('name') or 'No name'} (@{user.get('username') or '—'}, {user.get('city') or '—'})",
+            callback_data=f"admin_pick_user:{user['user_id']}"
+        )]
+        for user in users
+    ]
+    keyboard.append([InlineKeyboardButton(text="🔙 В админ-панель", callback_data="admin_main")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
 def get_back_to_admin_inline():
     """Кнопка возврата в админ-панель"""
     return InlineKeyboardMarkup(
@@ -237,8 +280,64 @@ def get_admin_settings_inline():
                 InlineKeyboardButton(text="🔧 Настройки БД", callback_data="admin_db_settings"),
                 InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")
             ],
+            [
+                InlineKeyboardButton(text="💾 Резервная копия", callback_data="admin_backup")
+            ],
             [
                 InlineKeyboardButton(text="🔙 Назад", callback_data="admin_management")
             ]
         ]
-    )
\ No newline at end of file
+    )
+
+def get_admin_db_inline():
+    """Кнопки экрана БД"""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text="🛠 Обслуживание сейчас", callback_data="admin_db_maintenance"),
+                InlineKeyboardButton(text="🔄 Обновить структуру", callback_data="admin_db_migrate")
+            ],
+            [
+                InlineKeyboardButton(text="🔙 Назад", callback_data="admin_settings")
+            ]
+        ]
+    )
+
+# ===== РАССЫЛКА =====
+
+def get_broadcast_segments_inline():
+    """Выбор аудитории рассылки"""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text="👥 Все", callback_data="admin_broadcast_segment:all"),
+                InlineKeyboardButton(text="🟢 Активные", callback_data="admin_broadcast_segment:active")
+            ],
+            [
+                InlineKeyboardButton(text="🏙 По городу", callback_data="admin_broadcast_segment:city"),
+                InlineKeyboardButton(text="📝 Незаполненные", callback_data="admin_broadcast_segment:incomplete")
+            ],
+            [
+                InlineKeyboardButton(text="🔙 Назад", callback_data="admin_management")
+            ]
+        ]
+    )
+
+def get_broadcast_confirm_inline():
+    """Подтверждение рассылки"""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ Отправить", callback_data="admin_broadcast_confirm"),
+                InlineKeyboardButton(text="❌ Отмена", callback_data="admin_main")
+            ]
+        ]
+    )
+
+def get_broadcast_progress_inline(broadcast_id: int, running: bool):
+    """Прогресс рассылки: обновить / остановить"""
+    keyboard = [[InlineKeyboardButton(text="🔄 Обновить", callback_data=f"admin_broadcast_progress:{broadcast_id}")]]
+    if running:
+        keyboard[0].append(InlineKeyboardButton(text="⏹ Остановить", callback_data=f"admin_broadcast_stop:{broadcast_id}"))
+    keyboard.append([InlineKeyboardButton(text="🔙 В админ-панель", callback_data="admin_main")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -0,0 +1,27 @@
+import json
+
+
+def render_match_proposal(partner: dict, common_interests: str = None, is_forced: bool = False) -> str:
+    """Текст предложения мэтча с карточкой собеседника"""
+    common_text = "случайное знакомство"
+    if common_interests:
+        try:
+            interests = json.loads(common_interests)
+            if interests and interests != ["случайное знакомство"]:
+                common_text = ", ".join(interests)
+        except (TypeError, ValueError):
+            pass
+
+    forced_text = " 🎯" if is_forced else ""
+
+    return (
+        f"🎯 Найден потенциальный собеседник{forced_text}!\n\n"
+        f"👤 Имя: {partner['name']}\n"
+        f"🏙 Город: {partner.get('city', 'не указан')}\n"
+        f"💼 Профессия: {partner.get('profession', 'не указана')}\n"
+        f"🎯 Цели: {partner.get('goals', 'не указаны')}\n"
+        f"📝 О себе: {partner.get('about', 'не указано')}\n\n"
+        f"✨ Совпадения: {common_text}\n"
+        f"🔗 Предпочтительный канал для связи: {partner.get('contact_preference', 'не указаны')}\n\n"
+        f"Изучите информацию и LinkedIn профиль, затем примите решение:"
+    )
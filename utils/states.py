@@ -15,5 +15,7 @@ class RegistrationStates(StatesGroup):
 
 class AdminStates(StatesGroup):
     waiting_broadcast_message = State()
+    waiting_broadcast_city = State()
     waiting_manual_match_user1 = State()
     waiting_manual_match_user2 = State()
+    waiting_user_search = State()